@@ -0,0 +1,617 @@
+# ==================================================================================
+# File: benchmark.py
+#
+# Desc: Call Routing project benchmark suite. Generates synthetic carrier route
+#       and phone number files at the README scenario sizes, then runs every
+#       CallRoutes backend through load time, single lookup latency percentiles,
+#       bulk throughput and memory, writing a machine readable JSON report.
+#       Each backend is run in its own process so that memory figures are not
+#       polluted by the other backends. A threaded stress run checks lookups
+#       keep their throughput, and their answers, while carriers reload.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from random import Random
+from itertools import cycle
+import subprocess
+import argparse
+import platform
+import threading
+import json
+import time
+import sys
+import os
+import solution
+import trie_solution
+import frontcoded_solution
+import lazy_solution
+import mm_solution
+import sqlite_solution
+import snapshot_solution
+import parallel_loader
+try:
+    import numpy_solution
+except ImportError:
+    numpy_solution = None
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# map of backend name to CallRoutes class, for the backends that load
+# carriers one at a time through add_route_costs
+BACKENDS = {
+    "dict": solution.CallRoutes,
+    "trie": trie_solution.CallRoutes,
+    "frontcoded": frontcoded_solution.CallRoutes,
+    "lazy": lazy_solution.CallRoutes,
+}
+if numpy_solution is not None:
+    BACKENDS["numpy"] = numpy_solution.CallRoutes
+
+# every backend the suite can run
+ALL_BACKENDS = list(BACKENDS) + ["snapshot", "mmap", "sqlite"]
+
+# README scenarios as a list of carrier route counts and a number count
+SCENARIOS = {
+    "scenario-1": {"carriers": [100000], "numbers": 1},
+    "scenario-2": {"carriers": [100000], "numbers": 1000},
+    "scenario-3": {"carriers": [10000000] * 5, "numbers": 10000},
+}
+
+# directory in the data directory that generated files are written to
+BENCH_DIR = "bench"
+
+# country codes with relative traffic weights for generated data
+COUNTRY_CODES = [("1", 30), ("44", 8), ("33", 5), ("49", 6), ("81", 5),
+                 ("86", 10), ("91", 10), ("7", 3), ("61", 3), ("55", 4),
+                 ("52", 4), ("34", 3), ("39", 3), ("234", 2), ("971", 2),
+                 ("380", 1), ("852", 1)]
+
+
+# ----------------------------------------------------------------------------------
+# Memory Usage Function
+# ----------------------------------------------------------------------------------
+def get_rss():
+    """Get current (not peak) resident memory usage in mb. Falls back to
+    peak usage where /proc is not available.
+    Runtime: Θ(1) Space: Θ(1)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / float(1 << 20), 2)
+    except (OSError, ValueError):
+        return solution.get_mem()
+
+
+# ----------------------------------------------------------------------------------
+# Data Generator Functions
+# ----------------------------------------------------------------------------------
+def _country_code(rng):
+    """Return a country code drawn by traffic weight."""
+    return rng.choices([code for code, _ in COUNTRY_CODES],
+                       [weight for _, weight in COUNTRY_CODES])[0]
+
+
+def generate_routes(file_name, count, seed=0):
+    """Write count routes in the carrier route file format to file_name
+    in the data directory, with a hierarchy of country, area and local
+    prefixes and per country cost levels. Return the file name.
+    Runtime: Θ(n) Space: Θ(1)."""
+    rng = Random(seed)
+    base_costs = {code: rng.uniform(0.005, 0.15) for code, _ in COUNTRY_CODES}
+    with open(solution.data_path(file_name), 'w') as route_costs_file:
+        lines = []
+        for _ in range(count):
+            code = _country_code(rng)
+            # mostly area and exchange level prefixes, some country wide
+            extra = rng.choice((0, 1, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 8))
+            digits = "%0*d" % (extra, rng.randrange(10 ** extra)) \
+                if extra else ""
+            cost = base_costs[code] * rng.uniform(0.5, 1.5)
+            lines.append("+{}{},{}\n".format(
+                code, digits, round(cost, rng.choice((2, 3, 4)))))
+            if len(lines) >= 100000:
+                route_costs_file.write("".join(lines))
+                lines = []
+        route_costs_file.write("".join(lines))
+    return file_name
+
+
+def generate_numbers(file_name, count, seed=0, miss_rate=0.1):
+    """Write count normalized phone numbers to file_name in the data
+    directory. About miss_rate of them use a country code no generated
+    route covers. Return the file name.
+    Runtime: Θ(n) Space: Θ(1)."""
+    rng = Random(seed)
+    with open(solution.data_path(file_name), 'w') as numbers_file:
+        lines = []
+        for _ in range(count):
+            code = "0" if rng.random() < miss_rate else _country_code(rng)
+            length = 11 - len(code) + rng.randrange(3)
+            lines.append("+{}{}\n".format(
+                code, "%0*d" % (length, rng.randrange(10 ** length))))
+        numbers_file.write("".join(lines))
+    return file_name
+
+
+def scenario_files(scenario, scale=1.0, seed=0):
+    """Return (carrier_route_costs, numbers_file) for a scenario, generating
+    any files that do not exist yet. Route counts are multiplied by scale.
+    Runtime: Θ(n) Space: Θ(1)."""
+    os.makedirs(solution.data_path(BENCH_DIR), exist_ok=True)
+    spec = SCENARIOS[scenario]
+    carrier_route_costs = []
+    for index, count in enumerate(spec["carriers"]):
+        count = max(1, int(count * scale))
+        file_name = "{}/route-costs-{}-{}.txt".format(
+            BENCH_DIR, count, seed + index)
+        if not os.path.isfile(solution.data_path(file_name)):
+            generate_routes(file_name, count, seed + index)
+        carrier_route_costs.append(
+            ("carrier{}".format(chr(ord("A") + index)), file_name))
+    numbers_file = "{}/phone-numbers-{}-{}.txt".format(
+        BENCH_DIR, spec["numbers"], seed)
+    if not os.path.isfile(solution.data_path(numbers_file)):
+        generate_numbers(numbers_file, spec["numbers"], seed)
+    return carrier_route_costs, numbers_file
+
+
+# ----------------------------------------------------------------------------------
+# Benchmark Functions
+# ----------------------------------------------------------------------------------
+def load_backend(backend, carrier_route_costs, numbers_file, tag="bench"):
+    """Create and load a CallRoutes instance of any backend. Files the
+    backend persists are named after tag and replaced on every call.
+    Runtime: Θ(n) Space: Θ(n)."""
+    if backend in BACKENDS:
+        calls = BACKENDS[backend]()
+        for carrier, file_name in carrier_route_costs:
+            calls.add_route_costs(carrier, file_name)
+        return calls
+    if backend == "mmap":
+        return mm_solution.CallRoutes(numbers_file, *carrier_route_costs)
+    if backend == "sqlite":
+        db_file_name = "{}/{}.db".format(BENCH_DIR, tag)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.isfile(solution.data_path(db_file_name + suffix)):
+                os.remove(solution.data_path(db_file_name + suffix))
+        return sqlite_solution.CallRoutes(numbers_file, *carrier_route_costs,
+                                          db_file_name=db_file_name)
+    if backend == "snapshot":
+        snapshot_file_name = "{}/{}.snap".format(BENCH_DIR, tag)
+        snapshot_solution.compile_snapshot(snapshot_file_name,
+                                           *carrier_route_costs)
+        return snapshot_solution.CallRoutes(snapshot_file_name)
+    raise ValueError("unknown backend {}".format(backend))
+
+
+def lookup_all(calls, numbers):
+    """Resolve numbers with the backend's bulk path if it has one, or one
+    at a time otherwise.
+    Runtime: Θ(m) Space: Θ(m)."""
+    if hasattr(calls, "lookup_many"):
+        return calls.lookup_many(numbers)
+    return [(number, calls.get_best_route(number)) for number in numbers]
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    """Return a dictionary of percentile to milliseconds over samples in
+    seconds.
+    Runtime: Θ(n log n) Space: Θ(n)."""
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {"p{}".format(point): round(
+        samples[min(len(samples) - 1, int(len(samples) * point / 100))]
+        * 1000, 4) for point in points}
+
+
+def measure(backend, carrier_route_costs, numbers_file, samples=1000,
+            tag="bench"):
+    """Load carriers into backend and return a dictionary of load time,
+    memory, single lookup latency percentiles over up to samples numbers
+    and bulk throughput over every number in numbers_file.
+    Runtime: Θ(n + m) Space: Θ(n)."""
+    with open(solution.data_path(numbers_file)) as f:
+        numbers = f.read().splitlines()
+    base_rss = get_rss()
+
+    start = time.perf_counter()
+    calls = load_backend(backend, carrier_route_costs, numbers_file, tag)
+    load_time = time.perf_counter() - start
+    rss = get_rss()
+
+    latencies = []
+    for number in numbers[:samples]:
+        start = time.perf_counter()
+        calls.get_best_route(number)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    lookup_all(calls, numbers)
+    bulk_time = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_time, 4),
+        "index_rss_mb": round(rss - base_rss, 2),
+        "rss_mb": rss,
+        "peak_rss_mb": solution.get_mem(),
+        "latency_ms": percentiles(latencies),
+        "lookups": len(numbers),
+        "bulk_seconds": round(bulk_time, 4),
+        "lookups_per_second": round(len(numbers) / bulk_time, 1)
+        if bulk_time else None,
+    }
+
+
+def run_isolated(backend, carrier_route_costs, numbers_file, samples=1000,
+                 tag="bench"):
+    """Run measure in a fresh interpreter and return its results.
+    Runtime: Θ(n + m) Space: Θ(1)."""
+    command = [sys.executable, os.path.abspath(__file__), "run",
+               "--backend", backend, "--numbers", numbers_file,
+               "--samples", str(samples), "--tag", tag]
+    for carrier, file_name in carrier_route_costs:
+        command += ["--carrier", "{}={}".format(carrier, file_name)]
+    output = subprocess.check_output(command)
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def run_suite(scenarios, backends, scale=1.0, samples=1000, seed=0):
+    """Run every backend through every scenario and return the report.
+    Runtime: Θ(n + m) Space: Θ(1)."""
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "seed": seed,
+        "scenarios": [],
+    }
+    for scenario in scenarios:
+        carrier_route_costs, numbers_file = scenario_files(
+            scenario, scale, seed)
+        results = []
+        for backend in backends:
+            results.append(run_isolated(backend, carrier_route_costs,
+                                        numbers_file, samples, scenario))
+        report["scenarios"].append({
+            "name": scenario,
+            "carriers": carrier_route_costs,
+            "numbers": numbers_file,
+            "results": results,
+        })
+    return report
+
+
+def verify(baseline, candidate, carrier_route_costs, numbers_file):
+    """Load carriers into two backends, resolve numbers_file in bulk with
+    each and return a dictionary with the number of mismatched costs and
+    the bulk lookup speedup of candidate over baseline.
+    Runtime: Θ(n + m) Space: Θ(n + m)."""
+    with open(solution.data_path(numbers_file)) as f:
+        numbers = f.read().splitlines()
+    timings = {}
+    results = {}
+    for backend in (baseline, candidate):
+        calls = load_backend(backend, carrier_route_costs, numbers_file,
+                             "verify")
+        start = time.perf_counter()
+        results[backend] = lookup_all(calls, numbers)
+        timings[backend] = time.perf_counter() - start
+
+    # costs are compared numerically, as backends differ in cost types
+    def cost(result):
+        return float(result[1][1] if isinstance(result[1], tuple)
+                     else result[1])
+
+    mismatches = sum(1 for left, right in zip(results[baseline],
+                                              results[candidate])
+                     if cost(left) != cost(right))
+    return {
+        "baseline": baseline,
+        "candidate": candidate,
+        "lookups": len(numbers),
+        "mismatches": mismatches,
+        "baseline_seconds": round(timings[baseline], 4),
+        "candidate_seconds": round(timings[candidate], 4),
+        "speedup": round(timings[baseline] / timings[candidate], 2),
+    }
+
+
+def compare_loads(carrier_route_costs, workers=None):
+    """Read carriers' route costs files one at a time and with the parallel
+    loader and return a dictionary with both times, the speedup and the
+    number of carriers whose routes differ.
+    Runtime: Θ(n) Space: Θ(n)."""
+    calls = solution.CallRoutes()
+    start = time.perf_counter()
+    expected = {carrier: calls._read_route_costs(file_name)
+                for carrier, file_name in carrier_route_costs}
+    sequential = time.perf_counter() - start
+    start = time.perf_counter()
+    results = parallel_loader.read_route_costs_parallel(carrier_route_costs,
+                                                        workers)
+    parallel = time.perf_counter() - start
+    return {
+        "carriers": len(carrier_route_costs),
+        "routes": sum(len(costs) for costs in expected.values()),
+        "workers": workers or os.cpu_count(),
+        "mismatched_carriers": sum(1 for carrier in expected
+                                   if results[carrier] != expected[carrier]),
+        "sequential_seconds": round(sequential, 4),
+        "parallel_seconds": round(parallel, 4),
+        "speedup": round(sequential / parallel, 2),
+    }
+
+
+def count_probes(carrier_route_costs, numbers_file):
+    """Resolve every number in numbers_file against each carrier and
+    return a dictionary of the mean index probes per lookup: trying every
+    prefix length, trying only the lengths a carrier has (dict backend),
+    and only those that also pass the Bloom filter (mmap backend).
+    Runtime: Θ(n + mck) Space: Θ(n + m)."""
+    with open(solution.data_path(numbers_file)) as f:
+        numbers = f.read().splitlines()
+    calls = load_backend("dict", carrier_route_costs, numbers_file)
+    mapped = load_backend("mmap", carrier_route_costs, numbers_file)
+    every_length = lengths = bloom = hits = 0
+    for number in numbers:
+        matched = False
+        for costs in calls.routes.values():
+            for index in range(len(number), 1, -1):
+                every_length += 1
+                if number[:index] in costs:
+                    break
+            cost, probes = calls._probe(costs, number)
+            lengths += probes
+            matched = matched or cost is not None
+        for route in mapped.routes.values():
+            for index in route.lengths:
+                if index <= len(number) and \
+                        number[:index].encode() in route.bloom:
+                    bloom += 1
+                    if route.find(number[:index]) is not None:
+                        break
+        hits += matched
+    return {
+        "lookups": len(numbers),
+        "hit_rate": round(hits / len(numbers), 3),
+        "probes_per_lookup": {
+            "every_length": round(every_length / len(numbers), 2),
+            "length_filter": round(lengths / len(numbers), 2),
+            "length_and_bloom_filter": round(bloom / len(numbers), 2),
+        },
+    }
+
+
+def _reloader(backend, calls, carrier_route_costs, tag="stress"):
+    """Return a function that reloads the next carrier of a loaded backend
+    from its file each time it is called, publishing it the way that
+    backend does: a new index swapped in, a remapped file, a recompiled
+    snapshot or a rewritten table.
+    Runtime: Θ(1) Space: Θ(1)."""
+    carriers = cycle(carrier_route_costs)
+    if backend in BACKENDS:
+        return lambda: calls.add_route_costs(*next(carriers))
+    if backend == "mmap":
+        return lambda: calls.load_route_costs(*next(carriers))
+    if backend == "sqlite":
+        return lambda: calls._bulk_load(calls.db_conn, [next(carriers)])
+
+    def reload_snapshot():
+        snapshot_solution.compile_snapshot("{}/{}.snap".format(
+            BENCH_DIR, tag), *carrier_route_costs)
+        calls.reload()
+    return reload_snapshot
+
+
+def stress(backend, carrier_route_costs, numbers_file, threads=4,
+           seconds=10.0, interval=0.5, window=0.5):
+    """Resolve numbers_file one number at a time from threads reader
+    threads for seconds, while this thread reloads a carrier every interval
+    seconds over the second half of the run. Return a dictionary of reads
+    per second in each window of window seconds, the mean rate before and
+    during reloads, reload times, and any lookups that raised or answered
+    differently from before the run, which a torn read would.
+    Runtime: Θ(n + m) Space: Θ(n + m)."""
+    with open(solution.data_path(numbers_file)) as f:
+        numbers = f.read().splitlines()
+    calls = load_backend(backend, carrier_route_costs, numbers_file,
+                         "stress")
+    expected = {number: calls.get_best_route(number) for number in numbers}
+    reload = _reloader(backend, calls, carrier_route_costs, "stress")
+
+    windows = int(seconds / window) + 1
+    counts = [[0] * windows for _ in range(threads)]
+    mismatches = [0] * threads
+    errors = []
+    start = time.perf_counter()
+    end = start + seconds
+
+    def read(thread_id):
+        clock = time.perf_counter
+        slots = counts[thread_id]
+        index = thread_id
+        try:
+            while True:
+                now = clock()
+                if now >= end:
+                    return
+                number = numbers[index % len(numbers)]
+                index += threads
+                if calls.get_best_route(number) != expected[number]:
+                    mismatches[thread_id] += 1
+                slots[int((now - start) / window)] += 1
+        except Exception as error:
+            errors.append(repr(error))
+
+    readers = [threading.Thread(target=read, args=(thread_id,))
+               for thread_id in range(threads)]
+    for reader in readers:
+        reader.start()
+
+    # readers run alone for the first half, then alongside reloads
+    reloads = []
+    time.sleep(seconds / 2)
+    while time.perf_counter() < end:
+        began = time.perf_counter()
+        reload()
+        reloads.append(time.perf_counter() - began)
+        time.sleep(interval)
+    for reader in readers:
+        reader.join()
+
+    # the final window is partial, so it is left out
+    rates = [round(sum(column) / window, 1)
+             for column in zip(*counts)][:int(seconds / window)]
+    half = len(rates) // 2
+    return {
+        "backend": backend,
+        "threads": threads,
+        "reads_per_second": rates,
+        "quiet_reads_per_second": round(sum(rates[:half]) / half, 1)
+        if half else None,
+        "reload_reads_per_second": round(
+            sum(rates[half:]) / (len(rates) - half), 1)
+        if len(rates) > half else None,
+        "min_reload_window_ratio": round(
+            min(rates[half:]) / (sum(rates[:half]) / half), 3)
+        if half and any(rates[:half]) and len(rates) > half else None,
+        "reloads": len(reloads),
+        "mean_reload_seconds": round(sum(reloads) / len(reloads), 4)
+        if reloads else None,
+        "mismatches": sum(mismatches),
+        "errors": errors,
+    }
+
+
+def _carriers(values):
+    """Parse NAME=FILE command line values into carrier tuples."""
+    return [tuple(value.split("=", 1)) for value in values]
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark route index backends.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser(
+        "generate",
+        help="generate route and number files in the data directory")
+    generate.add_argument("--routes", type=int, nargs="*",
+                          default=[100000, 10000000])
+    generate.add_argument("--numbers", type=int, nargs="*",
+                          default=[1000, 10000])
+    generate.add_argument("--seed", type=int, default=0)
+
+    suite = commands.add_parser(
+        "suite", help="run backends through README scenarios")
+    suite.add_argument("--scenario", action="append",
+                       choices=sorted(SCENARIOS))
+    suite.add_argument("--backend", action="append", choices=ALL_BACKENDS)
+    suite.add_argument("--scale", type=float, default=1.0,
+                       help="multiply scenario route counts by this")
+    suite.add_argument("--samples", type=int, default=1000,
+                       help="numbers timed individually for latency")
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--report", help="write the JSON report here")
+
+    run = commands.add_parser(
+        "run", help="measure one backend in this process")
+    run.add_argument("--backend", choices=ALL_BACKENDS, required=True)
+    run.add_argument("--carrier", action="append", required=True,
+                     metavar="NAME=FILE")
+    run.add_argument("--numbers", required=True)
+    run.add_argument("--samples", type=int, default=1000)
+    run.add_argument("--tag", default="bench")
+
+    check = commands.add_parser(
+        "verify", help="check two backends give identical bulk results "
+                       "and report the speedup")
+    check.add_argument("baseline", choices=ALL_BACKENDS)
+    check.add_argument("candidate", choices=ALL_BACKENDS)
+    check.add_argument("--carrier", action="append", required=True,
+                       metavar="NAME=FILE")
+    check.add_argument("--numbers", required=True)
+
+    loads = commands.add_parser(
+        "loads", help="compare sequential and parallel route file loads")
+    loads.add_argument("--carrier", action="append", required=True,
+                       metavar="NAME=FILE")
+    loads.add_argument("--workers", type=int)
+
+    probes = commands.add_parser(
+        "probes", help="report index probes per lookup with and without "
+                       "the prefix filters")
+    probes.add_argument("--carrier", action="append", required=True,
+                        metavar="NAME=FILE")
+    probes.add_argument("--numbers", required=True)
+
+    load = commands.add_parser(
+        "stress", help="measure threaded lookup throughput while carriers "
+                       "reload")
+    load.add_argument("--backend", choices=ALL_BACKENDS, default="dict")
+    load.add_argument("--carrier", action="append", required=True,
+                      metavar="NAME=FILE")
+    load.add_argument("--numbers", required=True)
+    load.add_argument("--threads", type=int, default=4)
+    load.add_argument("--seconds", type=float, default=10.0)
+    load.add_argument("--interval", type=float, default=0.5,
+                      help="pause between reloads")
+    load.add_argument("--window", type=float, default=0.5,
+                      help="seconds per throughput sample")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        os.makedirs(solution.data_path(BENCH_DIR), exist_ok=True)
+        for count in args.routes:
+            print(generate_routes("{}/route-costs-{}-{}.txt".format(
+                BENCH_DIR, count, args.seed), count, args.seed))
+        for count in args.numbers:
+            print(generate_numbers("{}/phone-numbers-{}-{}.txt".format(
+                BENCH_DIR, count, args.seed), count, args.seed))
+
+    elif args.command == "suite":
+        report = run_suite(args.scenario or sorted(SCENARIOS),
+                           args.backend or ALL_BACKENDS, args.scale,
+                           args.samples, args.seed)
+        output = json.dumps(report, indent=2)
+        if args.report:
+            with open(args.report, 'w') as report_file:
+                report_file.write(output + "\n")
+        print(output)
+
+    elif args.command == "run":
+        # machine readable results on the last line for run_isolated
+        print(json.dumps(measure(args.backend, _carriers(args.carrier),
+                                 args.numbers, args.samples, args.tag)))
+
+    elif args.command == "verify":
+        print(json.dumps(verify(args.baseline, args.candidate,
+                                _carriers(args.carrier), args.numbers),
+                         indent=2))
+
+    elif args.command == "loads":
+        print(json.dumps(compare_loads(_carriers(args.carrier), args.workers),
+                         indent=2))
+
+    elif args.command == "probes":
+        print(json.dumps(count_probes(_carriers(args.carrier), args.numbers),
+                         indent=2))
+
+    elif args.command == "stress":
+        print(json.dumps(stress(args.backend, _carriers(args.carrier),
+                                args.numbers, args.threads, args.seconds,
+                                args.interval, args.window), indent=2))
@@ -0,0 +1,309 @@
+# ==================================================================================
+# File: callroute.py
+#
+# Desc: Call Routing project batch command line and library API. Loads carrier
+#       route costs into any backend and streams number,cost results for a phone
+#       numbers file without prompting, so it can run under a batch scheduler
+#       or a profiler. The same entry points are importable:
+#
+#         calls = callroute.open_routes([("A", "a.txt")], backend="trie")
+#         calls.lookup_many(["+4412345"])
+#         callroute.lookup([("A", "a.txt")], "numbers.txt", "costs.txt")
+#
+#       Usage:
+#         python callroute.py lookup --carrier A=path --numbers path --out path
+#             [--backend trie|dict|frontcoded|numpy|lazy|mmap|sqlite|snapshot]
+#             [--workers N]
+#         python callroute.py compile --carrier A=path --snapshot path
+#         python callroute.py convert route-costs.txt route-costs.parquet
+#
+#       Carrier files may be columnar route decks (.parquet, .arrow, .npy,
+#       .npz) with the numpy backend, and an --out file with one of those
+#       extensions gets columnar results, see columnar_io.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import argparse
+import sys
+import time
+import solution
+import trie_solution
+import frontcoded_solution
+import lazy_solution
+import mm_solution
+import sqlite_solution
+import snapshot_solution
+import stream_lookup
+import parallel_lookup
+try:
+    import numpy_solution
+except ImportError:
+    numpy_solution = None
+else:
+    import columnar_io
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# map of backend name to CallRoutes class, for the backends that load
+# carriers one at a time through add_route_costs
+LOADED_BACKENDS = {
+    "dict": solution.CallRoutes,
+    "trie": trie_solution.CallRoutes,
+    "frontcoded": frontcoded_solution.CallRoutes,
+    "lazy": lazy_solution.CallRoutes,
+}
+if numpy_solution is not None:
+    LOADED_BACKENDS["numpy"] = numpy_solution.CallRoutes
+
+# every backend name accepted by open_routes
+BACKENDS = sorted(list(LOADED_BACKENDS) + ["mmap", "sqlite", "snapshot"])
+
+# default files the sqlite and snapshot backends persist to
+DB_FILE_NAME = "costs_data.db"
+SNAPSHOT_FILE_NAME = "routes.snap"
+
+
+# ----------------------------------------------------------------------------------
+# Library Functions
+# ----------------------------------------------------------------------------------
+def open_routes(carrier_route_costs, backend="trie", db_file_name=DB_FILE_NAME,
+                snapshot_file_name=SNAPSHOT_FILE_NAME, index_cache_dir=None,
+                prune=False):
+    """Create a backend loaded with carrier_route_costs, a list of
+    ('carrier name', 'file name') tuples, and return it. Every backend has
+    lookup_many, get_costs and get_best_route. The in memory backends
+    keep built indexes in index_cache_dir if it is given, so unchanged
+    carriers load without parsing. The sqlite backend keeps its database
+    in db_file_name and only reloads carriers whose files changed. The
+    snapshot backend recompiles snapshot_file_name if the carriers given
+    changed, or maps the existing one if none are given. Columnar route
+    decks need the numpy backend. prune drops redundant routes at load or
+    snapshot compile time, see route_prune; the mmap, sqlite and lazy
+    backends do not prune. The lazy backend loads each carrier's country
+    code shards on demand and keeps no index cache.
+    Runtime: Θ(n) Space: Θ(n)."""
+    if backend != "numpy" and any(is_columnar(file_name) for _, file_name
+                                  in carrier_route_costs):
+        raise ValueError("columnar route decks need the numpy backend")
+    if prune and backend in ("mmap", "sqlite", "lazy"):
+        raise ValueError("the {} backend does not prune".format(backend))
+    if backend in LOADED_BACKENDS:
+        calls = LOADED_BACKENDS[backend]()
+        if index_cache_dir is not None:
+            calls.enable_index_cache(index_cache_dir)
+        if prune:
+            calls.enable_pruning()
+        for carrier, file_name in carrier_route_costs:
+            calls.add_route_costs(carrier, file_name)
+        return calls
+    if backend == "mmap":
+        return mm_solution.CallRoutes(None, *carrier_route_costs)
+    if backend == "sqlite":
+        return sqlite_solution.CallRoutes(None, *carrier_route_costs,
+                                          db_file_name=db_file_name)
+    if backend == "snapshot":
+        if carrier_route_costs:
+            snapshot_solution.ensure_snapshot(snapshot_file_name,
+                                              *carrier_route_costs,
+                                              prune=prune)
+        return snapshot_solution.CallRoutes(snapshot_file_name)
+    raise ValueError("unknown backend {}, expected one of {}".format(
+        backend, ", ".join(BACKENDS)))
+
+
+def lookup(carrier_route_costs, numbers_file_name, out_file_name,
+           backend="trie", workers=None, checkpoint_file_name=None,
+           chunk_size=stream_lookup.CHUNK_SIZE, **options):
+    """Resolve every number in numbers_file_name against carrier_route_costs
+    and stream number,cost lines to out_file_name, see
+    stream_lookup.stream_to_file, or columnar results if out_file_name has
+    a columnar extension, see columnar_io.stream_to_columns. With more than
+    one worker the lookups run in worker processes sharing a compiled
+    snapshot, which requires the snapshot backend. options are passed on to
+    open_routes. Return the number of results written.
+    Runtime: Θ(n + m) Space: Θ(n + chunk_size)."""
+    if is_columnar(out_file_name) and checkpoint_file_name is not None:
+        raise ValueError("columnar results cannot be checkpointed")
+    if workers is not None and workers > 1:
+        if backend != "snapshot":
+            raise ValueError("workers share a compiled snapshot, use the "
+                             "snapshot backend")
+        snapshot_file_name = options.get("snapshot_file_name",
+                                         SNAPSHOT_FILE_NAME)
+        if carrier_route_costs:
+            snapshot_solution.ensure_snapshot(
+                snapshot_file_name, *carrier_route_costs,
+                prune=options.get("prune", False))
+        with parallel_lookup.ParallelLookup(snapshot_file_name,
+                                            workers) as calls:
+            return write_results(calls, numbers_file_name, out_file_name,
+                                 checkpoint_file_name, chunk_size)
+    calls = open_routes(carrier_route_costs, backend, **options)
+    return write_results(calls, numbers_file_name, out_file_name,
+                         checkpoint_file_name, chunk_size)
+
+
+def write_results(calls, numbers_file_name, out_file_name,
+                  checkpoint_file_name=None,
+                  chunk_size=stream_lookup.CHUNK_SIZE):
+    """Resolve every number in numbers_file_name with calls and write the
+    results to out_file_name, as columns if it has a columnar extension and
+    as number,cost lines otherwise. Return the number of results written.
+    Runtime: Θ(n) Space: Θ(chunk_size)."""
+    if is_columnar(out_file_name):
+        return columnar_io.stream_to_columns(calls, numbers_file_name,
+                                             out_file_name, chunk_size)
+    return stream_lookup.stream_to_file(calls, numbers_file_name,
+                                        out_file_name, checkpoint_file_name,
+                                        chunk_size)
+
+
+def convert_deck(in_file_name, out_file_name):
+    """Convert a route deck between formats, such as a text route costs
+    file to Parquet, by the extensions of the file names. Duplicate
+    prefixes keep their lowest cost. Return the number of routes written.
+    Runtime: Θ(n log n) Space: Θ(n)."""
+    if numpy_solution is None:
+        raise ValueError("converting route decks needs numpy")
+    calls = numpy_solution.CallRoutes()
+    costs_index = calls._read_route_costs(in_file_name)
+    if is_columnar(out_file_name):
+        columnar_io.write_deck(out_file_name, *costs_index.columns())
+    else:
+        with open(solution.data_path(out_file_name), 'w') as f:
+            f.write("".join("{},{}\n".format(prefix, solution.cost_dollars(
+                cost)) for prefix, cost in costs_index.items()))
+    return len(costs_index)
+
+
+def is_columnar(file_name):
+    """Return True if file_name has a columnar file extension.
+    Runtime: Θ(1) Space: Θ(1)."""
+    return numpy_solution is not None and \
+        columnar_io.file_format(file_name) is not None
+
+
+def parse_carriers(carriers):
+    """Parse NAME=FILE command line arguments into a list of
+    ('carrier name', 'file name') tuples.
+    Runtime: Θ(c) Space: Θ(c)."""
+    carrier_route_costs = []
+    for carrier in carriers:
+        name, sep, file_name = carrier.partition("=")
+        if not sep or not name or not file_name:
+            raise ValueError("expected NAME=FILE, got {}".format(carrier))
+        carrier_route_costs.append((name, file_name))
+    return carrier_route_costs
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+def main(argv=None):
+    """Run the command line interface. Return the process exit status."""
+    parser = argparse.ArgumentParser(
+        description="Batch call route cost lookups.")
+    parser.add_argument("--data-dir", default=".",
+                        help="directory relative carrier, database and "
+                             "snapshot file names are resolved against")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    lookup_command = commands.add_parser(
+        "lookup", help="write number,cost lines for a phone numbers file")
+    lookup_command.add_argument("--carrier", action="append", default=[],
+                                metavar="NAME=FILE",
+                                help="carrier route costs file")
+    lookup_command.add_argument("--numbers", required=True,
+                                help="phone numbers file, one number per line")
+    lookup_command.add_argument("--out", required=True, help="output file")
+    lookup_command.add_argument("--backend", choices=BACKENDS, default="trie")
+    lookup_command.add_argument("--workers", type=int, default=None,
+                                help="worker processes, snapshot backend only")
+    lookup_command.add_argument("--db", default=DB_FILE_NAME,
+                                help="sqlite backend database file")
+    lookup_command.add_argument("--snapshot", default=SNAPSHOT_FILE_NAME,
+                                help="snapshot backend file")
+    lookup_command.add_argument("--index-cache", metavar="DIR",
+                                help="cache built indexes of the in memory "
+                                     "backends in this directory")
+    lookup_command.add_argument("--prune", action="store_true",
+                                help="drop routes costing the same as their "
+                                     "nearest shorter route at load")
+    lookup_command.add_argument("--checkpoint", metavar="FILE",
+                                help="checkpoint file to resume an "
+                                     "interrupted run")
+    lookup_command.add_argument("--chunk-size", type=int,
+                                default=stream_lookup.CHUNK_SIZE)
+
+    compile_command = commands.add_parser(
+        "compile", help="compile carrier route costs files into a snapshot")
+    compile_command.add_argument("--carrier", action="append", required=True,
+                                 metavar="NAME=FILE",
+                                 help="carrier route costs file")
+    compile_command.add_argument("--snapshot", default=SNAPSHOT_FILE_NAME,
+                                 help="snapshot file to write")
+    compile_command.add_argument("--prune", action="store_true",
+                                 help="leave out routes costing the same as "
+                                      "their nearest shorter route")
+
+    convert_command = commands.add_parser(
+        "convert", help="convert a route deck between text and columnar "
+                        "formats by file extension")
+    convert_command.add_argument("input", help="route deck to read")
+    convert_command.add_argument("output", help="route deck to write")
+
+    args = parser.parse_args(argv)
+    solution.DATA_DIR = args.data_dir
+    start = time.time()
+    if args.command == "convert":
+        try:
+            count = convert_deck(args.input, args.output)
+        except ValueError as e:
+            parser.error(str(e))
+        print("Converted {:,} routes in {} seconds.".format(
+            count, round(time.time()-start, 4)), file=sys.stderr)
+        return 0
+
+    try:
+        carrier_route_costs = parse_carriers(args.carrier)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.command == "compile":
+        records, pruned = snapshot_solution.ensure_snapshot(
+            args.snapshot, *carrier_route_costs, force=True, prune=args.prune)
+        print("Compiled {} with {:,} routes ({:,} pruned) in {} "
+              "seconds.".format(args.snapshot, records, pruned,
+                                round(time.time()-start, 4)), file=sys.stderr)
+        return 0
+
+    if args.workers is not None and args.workers > 1 and \
+            args.backend != "snapshot":
+        parser.error("--workers needs --backend snapshot")
+    if args.prune and args.backend in ("mmap", "sqlite", "lazy"):
+        parser.error("--prune is not supported by --backend " + args.backend)
+    if args.index_cache is not None and args.backend == "lazy":
+        parser.error("--index-cache is not supported by --backend lazy")
+    if args.checkpoint is not None and is_columnar(args.out):
+        parser.error("--checkpoint needs a text --out file")
+    if args.backend != "numpy" and any(is_columnar(file_name) for _, file_name
+                                       in carrier_route_costs):
+        parser.error("columnar route decks need --backend numpy")
+    count = lookup(carrier_route_costs, args.numbers, args.out, args.backend,
+                   args.workers, args.checkpoint, args.chunk_size,
+                   db_file_name=args.db, snapshot_file_name=args.snapshot,
+                   index_cache_dir=args.index_cache, prune=args.prune)
+    print("Wrote {:,} route costs in {} seconds.".format(
+        count, round(time.time()-start, 4)), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+# ==================================================================================
+# File: columnar_io.py
+#
+# Desc: Call Routing project columnar import and export. Route decks can be read
+#       from Parquet, Arrow IPC (Feather) or NumPy .npy/.npz files straight into
+#       NumPy arrays, with no Python object per route, and bulk lookup results
+#       can be written out in the same formats for analytics. Decks hold a
+#       prefix column, either '+' prefixed strings or the integer digits after
+#       the '+' (with an optional length column of digit counts), and either a
+#       cost_micros column of integer micro-dollars or a cost column of dollars.
+#       Parquet and Arrow need pyarrow, the NumPy formats only need NumPy.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import os
+import numpy as np
+import solution
+import stream_lookup
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# map of file extension to columnar format, any other file is a text deck
+FORMATS = {
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".npy": "npy",
+    ".npz": "npz",
+}
+
+# formats that need pyarrow
+ARROW_FORMATS = ("parquet", "arrow")
+
+# dtype of the structured array a .npy route deck holds
+NPY_DECK_DTYPE = np.dtype([("prefix", np.int64), ("length", np.int64),
+                           ("cost_micros", np.int64)])
+
+# 10 ** i for every i whose power fits in an int64, so a key's digit count
+# is the number of powers at or below it
+POWERS_OF_TEN = np.power(np.int64(10), np.arange(19, dtype=np.int64))
+
+
+# ----------------------------------------------------------------------------------
+# Format Functions
+# ----------------------------------------------------------------------------------
+def file_format(file_name):
+    """Return the columnar format of file_name by its extension, or None
+    if it is a text file.
+    Runtime: Θ(1) Space: Θ(1)"""
+    return FORMATS.get(os.path.splitext(file_name)[1].lower())
+
+
+def _require_format(file_name):
+    """Return the columnar format of file_name, raising ValueError if it
+    is not columnar or needs pyarrow and pyarrow is not installed.
+    Runtime: Θ(1) Space: Θ(1)"""
+    kind = file_format(file_name)
+    if kind is None:
+        raise ValueError("{} is not a columnar file, expected one of "
+                         "{}".format(file_name, ", ".join(sorted(FORMATS))))
+    if kind in ARROW_FORMATS and pa is None:
+        raise ValueError("reading and writing {} files needs pyarrow".format(
+            kind))
+    return kind
+
+
+# ----------------------------------------------------------------------------------
+# Route Deck Functions
+# ----------------------------------------------------------------------------------
+def _deck_arrays(prefixes, lengths, costs, cost_micros):
+    """Return (keys, lengths, costs) int64 arrays in the form
+    VectorRouteIndex.from_arrays takes, from integer prefix digits, digit
+    counts (or None to count the digits of each prefix) and either dollar
+    costs or micro-dollar costs (the other being None).
+    Runtime: Θ(n) Space: Θ(n)"""
+    keys = np.asarray(prefixes, dtype=np.int64)
+    if lengths is None:
+        # prefixes never start with a 0 digit, so the digit count of
+        # the key is the digit count of the prefix. Counted in integers,
+        # as log10 rounds up just below a power of ten
+        lengths = np.searchsorted(POWERS_OF_TEN, np.maximum(keys, 1),
+                                  side='right').astype(np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64) + 1
+    if cost_micros is None:
+        cost_micros = np.rint(np.asarray(costs, dtype=np.float64) *
+                              solution.MICROS)
+    return keys, lengths, np.asarray(cost_micros, dtype=np.int64)
+
+
+def _table_arrays(table):
+    """Return (keys, lengths, costs) int64 arrays of a pyarrow Table route
+    deck. String prefixes are split into digit counts and integer keys with
+    pyarrow compute kernels, never one row at a time.
+    Runtime: Θ(n) Space: Θ(n)"""
+    names = table.column_names
+    prefixes = table.column("prefix")
+    lengths = None
+    if pa.types.is_string(prefixes.type) or \
+            pa.types.is_large_string(prefixes.type):
+        lengths = pc.subtract(pc.utf8_length(prefixes), 1).to_numpy()
+        prefixes = pc.cast(pc.utf8_slice_codeunits(prefixes, 1), pa.int64())
+    elif "length" in names:
+        lengths = table.column("length").to_numpy()
+    if "cost_micros" in names:
+        return _deck_arrays(prefixes.to_numpy(), lengths, None,
+                            table.column("cost_micros").to_numpy())
+    costs = pc.cast(table.column("cost"), pa.float64())
+    return _deck_arrays(prefixes.to_numpy(), lengths, costs.to_numpy(), None)
+
+
+def read_deck_columns(file_name):
+    """Read a columnar route deck and return (keys, lengths, costs) int64
+    arrays of integer encoded prefixes, prefix lengths including the '+'
+    and costs in micro-dollars, see VectorRouteIndex.from_arrays. Arrow and
+    .npy files are memory mapped rather than read.
+    Runtime: Θ(n) Space: Θ(n)"""
+    kind = _require_format(file_name)
+    path = solution.data_path(file_name)
+    if kind == "parquet":
+        return _table_arrays(pq.read_table(path, memory_map=True))
+    if kind == "arrow":
+        with pa.memory_map(path) as source:
+            return _table_arrays(pa.ipc.open_file(source).read_all())
+    if kind == "npy":
+        deck = np.load(path, mmap_mode='r')
+        return _deck_arrays(deck["prefix"], deck["length"], None,
+                            deck["cost_micros"])
+    with np.load(path) as deck:
+        return _deck_arrays(
+            deck["prefix"], deck["length"] if "length" in deck else None,
+            deck["cost"] if "cost" in deck else None,
+            deck["cost_micros"] if "cost_micros" in deck else None)
+
+
+def write_deck(file_name, keys, lengths, costs):
+    """Write a route deck of integer encoded prefixes, prefix lengths
+    including the '+' and costs in micro-dollars, as returned by
+    VectorRouteIndex.columns, to a columnar file in the format of its
+    extension.
+    Runtime: Θ(n) Space: Θ(n)"""
+    kind = _require_format(file_name)
+    path = solution.data_path(file_name)
+    keys = np.asarray(keys, dtype=np.int64)
+    digits = np.asarray(lengths, dtype=np.int64) - 1
+    costs = np.asarray(costs, dtype=np.int64)
+    if kind == "npy":
+        deck = np.empty(len(keys), dtype=NPY_DECK_DTYPE)
+        deck["prefix"], deck["length"], deck["cost_micros"] = \
+            keys, digits, costs
+        # np.save appends .npy to names without it, write through a file
+        with open(path, 'wb') as f:
+            np.save(f, deck)
+        return
+    if kind == "npz":
+        with open(path, 'wb') as f:
+            np.savez(f, prefix=keys, length=digits, cost_micros=costs)
+        return
+    table = pa.table({"prefix": keys, "length": digits.astype(np.int8),
+                      "cost_micros": costs})
+    if kind == "parquet":
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+# ----------------------------------------------------------------------------------
+# ResultsWriter (Class)
+# ----------------------------------------------------------------------------------
+class ResultsWriter(object):
+    """Writes bulk lookup results as number and cost columns, cost in
+    dollars and 0 where no carrier has a route, like the text output.
+    Parquet and Arrow results are written one record batch per chunk, so
+    memory stays bounded; the NumPy formats are written on close."""
+
+    # ------------------------------------------------------------------------------
+    # ResultsWriter - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, file_name):
+        """Create a new ResultsWriter writing to file_name in the format of
+        its extension."""
+        self.kind = _require_format(file_name)
+        self.path = file_name
+        self.count = 0
+        self._numbers = []
+        self._costs = []
+        self._writer = None
+        self._sink = None
+        if self.kind in ARROW_FORMATS:
+            schema = pa.schema([("number", pa.string()),
+                                ("cost", pa.float64())])
+            if self.kind == "parquet":
+                self._writer = pq.ParquetWriter(self.path, schema)
+            else:
+                self._sink = pa.OSFile(self.path, 'wb')
+                self._writer = pa.ipc.new_file(self._sink, schema)
+
+    # ------------------------------------------------------------------------------
+    # ResultsWriter - Public Methods
+    # ------------------------------------------------------------------------------
+    def write(self, results):
+        """Write a chunk of (number, cost) tuples, as returned by
+        lookup_many.
+        Runtime: Θ(m) Space: Θ(m)"""
+        if not results:
+            return
+        numbers, costs = zip(*results)
+        self.count += len(numbers)
+        if self._writer is None:
+            self._numbers.append(np.array(numbers, dtype=str))
+            self._costs.append(np.array(costs, dtype=np.float64))
+            return
+        self._writer.write_batch(pa.record_batch(
+            [pa.array(numbers, pa.string()), pa.array(costs, pa.float64())],
+            names=["number", "cost"]))
+
+    def close(self):
+        """Finish the file.
+        Runtime: Θ(m) Space: Θ(m)"""
+        if self._writer is not None:
+            self._writer.close()
+            if self._sink is not None:
+                self._sink.close()
+            return
+        numbers = np.concatenate(self._numbers) if self._numbers \
+            else np.zeros(0, dtype=str)
+        costs = np.concatenate(self._costs) if self._costs \
+            else np.zeros(0, dtype=np.float64)
+        with open(self.path, 'wb') as f:
+            if self.kind == "npz":
+                np.savez(f, number=numbers, cost=costs)
+            else:
+                results = np.empty(len(numbers), dtype=[
+                    ("number", numbers.dtype), ("cost", np.float64)])
+                results["number"], results["cost"] = numbers, costs
+                np.save(f, results)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ----------------------------------------------------------------------------------
+# Bulk Lookup Function
+# ----------------------------------------------------------------------------------
+def stream_to_columns(calls, numbers_file_name, out_file_name,
+                      chunk_size=stream_lookup.CHUNK_SIZE):
+    """Resolve every number in numbers_file_name with calls.lookup_many a
+    chunk at a time and write the results to out_file_name in the columnar
+    format of its extension. Return the number of results written.
+    Runtime: Θ(n) Space: Θ(chunk_size), Θ(n) for the NumPy formats"""
+    with ResultsWriter(out_file_name) as writer:
+        for _, results in stream_lookup.stream_costs(calls, numbers_file_name,
+                                                     chunk_size=chunk_size):
+            writer.write(results)
+    return writer.count
@@ -0,0 +1,285 @@
+# ==================================================================================
+# File: frontcoded_solution.py
+#
+# Desc: Call Routing project prefix compressed solution file. Route decks are
+#       highly redundant, most prefixes share their country and area stems with
+#       their neighbours in sorted order. Each carrier's sorted prefixes are
+#       front coded in blocks: the first prefix of a block is kept whole in a
+#       small directory, and every other one as the length it shares with the
+#       previous prefix plus its remaining digits, all in one bytes object.
+#       A lookup bisects the directory and decodes a single block, and a small
+#       cache of decoded blocks serves the busiest stems. Costs are ids into a
+#       table of the carrier's distinct costs, so most carriers need one or
+#       two bytes per route for them.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from bisect import bisect_left, bisect_right
+from array import array
+import solution
+from prefix_filter import length_mask, mask_lengths
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# prefixes per front coded block, trading directory size against the
+# number of prefixes a lookup decodes
+BLOCK_SIZE = 16
+
+# longest prefix a block can hold, as lengths are stored in one byte
+MAX_PREFIX_LENGTH = 255
+
+# decoded blocks kept per carrier, so numbers in busy country and area
+# stems search already decoded prefixes
+BLOCK_CACHE_SIZE = 1024
+
+
+# ----------------------------------------------------------------------------------
+# Front Coding Function
+# ----------------------------------------------------------------------------------
+def _common_length(a, b):
+    """Return the length of the longest common prefix of a and b.
+    Runtime: Θ(k) Space: Θ(1)."""
+    limit = min(len(a), len(b))
+    length = 0
+    while length < limit and a[length] == b[length]:
+        length += 1
+    return length
+
+
+# ----------------------------------------------------------------------------------
+# FrontCodedRoutes (Class)
+# ----------------------------------------------------------------------------------
+class FrontCodedRoutes(object):
+
+    # ------------------------------------------------------------------------------
+    # FrontCodedRoutes - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, costs):
+        """Create a new FrontCodedRoutes from a dictionary mapping route
+        prefixes to costs in micro-dollars.
+        Runtime: Θ(n log n) Space: Θ(n)."""
+        prefixes = sorted(costs)
+        if prefixes and max(map(len, prefixes)) > MAX_PREFIX_LENGTH:
+            raise ValueError("prefixes longer than {} characters cannot be "
+                             "front coded".format(MAX_PREFIX_LENGTH))
+
+        # prefix lengths present, longest first
+        self.lengths = mask_lengths(length_mask(prefixes))
+
+        # distinct costs, and the id of each route's cost in sorted
+        # prefix order in the smallest array type that holds them
+        self.cost_table = array('l', sorted(set(costs.values())))
+        cost_ids = {cost: index for index, cost in enumerate(self.cost_table)}
+        typecode = 'B' if len(cost_ids) <= 1 << 8 else \
+            'H' if len(cost_ids) <= 1 << 16 else 'I'
+        self.cost_ids = array(typecode, [cost_ids[costs[prefix]]
+                                         for prefix in prefixes])
+
+        # the first prefix of every block, and the offset of the rest of
+        # each block in data, with a final offset marking the end
+        self.heads = []
+        self.offsets = array('Q')
+        data = bytearray()
+        for start in range(0, len(prefixes), BLOCK_SIZE):
+            previous = prefixes[start].encode()
+            self.heads.append(previous)
+            self.offsets.append(len(data))
+            for prefix in prefixes[start + 1:start + BLOCK_SIZE]:
+                prefix = prefix.encode()
+                shared = _common_length(previous, prefix)
+                data.append(shared)
+                data.append(len(prefix) - shared)
+                data += prefix[shared:]
+                previous = prefix
+        self.offsets.append(len(data))
+        self.data = bytes(data)
+
+        # block number -> decoded prefixes of recently searched blocks
+        self._blocks = {}
+
+    # ------------------------------------------------------------------------------
+    # FrontCodedRoutes - Intended Private Methods
+    # ------------------------------------------------------------------------------
+    def _decode_block(self, block, cache=True):
+        """Return the sorted list of bytes prefixes in a block, caching it
+        unless cache is False. The cache is emptied when full rather than
+        tracking recency, which keeps hits to a single dictionary probe.
+        Runtime: Θ(b) Space: Θ(b)."""
+        data = self.data
+        current = self.heads[block]
+        prefixes = [current]
+        position = self.offsets[block]
+        end = self.offsets[block + 1]
+        while position < end:
+            shared = data[position]
+            size = data[position + 1]
+            position += 2
+            current = current[:shared] + data[position:position + size]
+            position += size
+            prefixes.append(current)
+        if cache:
+            if len(self._blocks) >= BLOCK_CACHE_SIZE:
+                self._blocks.clear()
+            self._blocks[block] = prefixes
+        return prefixes
+
+    def __getstate__(self):
+        """Return the state to pickle, without the decoded block cache.
+        Runtime: Θ(1) Space: Θ(1)."""
+        state = self.__dict__.copy()
+        state['_blocks'] = {}
+        return state
+
+    # ------------------------------------------------------------------------------
+    # FrontCodedRoutes - Public Methods
+    # ------------------------------------------------------------------------------
+    def find(self, key):
+        """Return the cost in micro-dollars of the route whose prefix is
+        key, a bytes prefix, or None if there is none. Only the one block
+        that can hold key is decoded, or taken from the decoded block
+        cache, and searched.
+        Runtime: Θ(log n + b) Space: Θ(b)."""
+        block = bisect_right(self.heads, key) - 1
+        if block < 0:
+            return None
+        prefixes = self._blocks.get(block)
+        if prefixes is None:
+            prefixes = self._decode_block(block)
+        index = bisect_left(prefixes, key)
+        if index < len(prefixes) and prefixes[index] == key:
+            return self.cost_table[self.cost_ids[block * BLOCK_SIZE + index]]
+        return None
+
+    def longest_route(self, number):
+        """Return a tuple of the length of the longest route prefix of
+        number and its cost in micro-dollars, or None if no route matches.
+        Runtime: Θ(l (log n + b)) Space: Θ(1)."""
+        size = len(number)
+        key = number.encode()
+        for length in self.lengths:
+            if length <= size:
+                cost = self.find(key[:length])
+                if cost is not None:
+                    return length, cost
+        return None
+
+    def items(self):
+        """Yield (prefix, cost) for every route in sorted prefix order.
+        Runtime: Θ(n) Space: Θ(b)."""
+        cost_table = self.cost_table
+        cost_ids = self.cost_ids
+        index = 0
+        for block in range(len(self.heads)):
+            for prefix in self._decode_block(block, cache=False):
+                yield prefix.decode(), cost_table[cost_ids[index]]
+                index += 1
+
+    def __len__(self):
+        """Return the number of routes.
+        Runtime: Θ(1) Space: Θ(1)."""
+        return len(self.cost_ids)
+
+
+# ----------------------------------------------------------------------------------
+# CallRoutes (Class)
+# ----------------------------------------------------------------------------------
+class CallRoutes(solution.CallRoutes):
+    """CallRoutes that stores each carrier's routes front coded in a
+    FrontCodedRoutes, for many carriers per host."""
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Intended Private Methods
+    # ------------------------------------------------------------------------------
+
+    def _read_route_costs(self, file_name):
+        """Read route costs file into a FrontCodedRoutes and return the
+        result.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        return FrontCodedRoutes(
+            solution.CallRoutes._read_route_costs(self, file_name))
+
+    def _build_index(self, costs_dict):
+        """Return a FrontCodedRoutes built from a dictionary of prefix to
+        cost.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        return FrontCodedRoutes(costs_dict)
+
+    def _apply_delta(self, costs_index, changes):
+        """Return a new FrontCodedRoutes with changes applied, re-encoded
+        from the current routes without re-reading the carrier's file.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        costs = dict(costs_index.items())
+        for prefix, cost in changes.items():
+            if cost is None:
+                costs.pop(prefix, None)
+            else:
+                costs[prefix] = cost
+        return FrontCodedRoutes(costs)
+
+    def _match(self, costs_index, number):
+        """Return the cost of the longest prefix of number in costs_index,
+        or None if no prefix matches.
+        Runtime: Θ(l (log n + b)) Space: Θ(1)."""
+        route = costs_index.longest_route(number)
+        if route is None:
+            return None
+        return route[1]
+
+    def _match_route(self, costs_index, number):
+        """Return a tuple of the length of the longest prefix of number in
+        costs_index and its cost, or None if no prefix matches.
+        Runtime: Θ(l (log n + b)) Space: Θ(1)."""
+        return costs_index.longest_route(number)
+
+    def _probe(self, costs_index, number):
+        """Return a tuple of the cost of the longest prefix of number in
+        costs_index (or None) and the number of prefixes probed.
+        Runtime: Θ(l (log n + b)) Space: Θ(1)."""
+        size = len(number)
+        key = number.encode()
+        probes = 0
+        for length in costs_index.lengths:
+            if length <= size:
+                probes += 1
+                cost = costs_index.find(key[:length])
+                if cost is not None:
+                    return cost, probes
+        return None, probes
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Public Methods
+    # ------------------------------------------------------------------------------
+
+    def lookup_many(self, numbers):
+        """Return a list of (number, cost) tuples in input order, where cost
+        is the least cost in dollars over all carriers or 0 if no carrier
+        has a route. Each number is searched in the compressed indexes
+        directly, as sorted copies of the routes would undo the savings.
+        Runtime: Θ(cml (log n + b)) Space: Θ(m)."""
+        routes = list(self.routes.values())
+        results = []
+        for number in numbers:
+            best = None
+            for costs_index in routes:
+                cost = self._match(costs_index, number)
+                if cost is not None and (best is None or cost < best):
+                    best = cost
+            results.append((number, 0 if best is None
+                            else solution.cost_dollars(best)))
+        return results
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+if __name__ == '__main__':
+
+    # create new class instance and run the main menu
+    solution.run_menu(CallRoutes())
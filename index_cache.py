@@ -0,0 +1,224 @@
+# ==================================================================================
+# File: index_cache.py
+#
+# Desc: Call Routing project persistent index cache. Each carrier's built index
+#       is pickled to disk together with the size, mtime and content hash of
+#       the route costs file it was built from, so a restart with unchanged
+#       rate decks loads indexes instead of parsing files. A file whose size and
+#       mtime still match is trusted without reading it; one that was merely
+#       touched is rehashed and, if its content is unchanged, still served from
+#       the cache. Anything else is a miss, so stale routes are never served.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from hashlib import blake2b
+import pickle
+import json
+import os
+import solution
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# directory in the data directory the cache is kept in
+CACHE_DIR = "index-cache"
+
+# manifest of cached entries and the source files they were built from
+MANIFEST = "manifest.json"
+
+# bumped whenever the cached format changes, invalidating every entry
+FORMAT = 2
+
+# size in bytes of each read while hashing a file
+HASH_BLOCK_SIZE = 1 << 20
+
+
+# ----------------------------------------------------------------------------------
+# Fingerprint Functions
+# ----------------------------------------------------------------------------------
+def content_hash(path):
+    """Return the hex digest of the content of the file at path.
+    Runtime: Θ(n) Space: Θ(1)"""
+    digest = blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path):
+    """Return a dictionary of the size, mtime and content hash of the file
+    at path.
+    Runtime: Θ(n) Space: Θ(1)"""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "hash": content_hash(path)}
+
+
+def is_unchanged(path, recorded):
+    """Return True if the file at path has the content described by
+    recorded, a fingerprint taken earlier, or None if it was never taken.
+    Runtime: Θ(1) if untouched, otherwise Θ(n) Space: Θ(1)"""
+    if recorded is None:
+        return False
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != recorded["size"]:
+        return False
+    if stat.st_mtime_ns == recorded["mtime_ns"]:
+        return True
+    return content_hash(path) == recorded["hash"]
+
+
+# ----------------------------------------------------------------------------------
+# IndexCache (Class)
+# ----------------------------------------------------------------------------------
+class IndexCache(object):
+
+    # ------------------------------------------------------------------------------
+    # IndexCache - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, cache_dir=CACHE_DIR):
+        """Create a new IndexCache kept in cache_dir, resolved against the
+        data directory, creating it if needed."""
+        self.cache_dir = solution.data_path(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.manifest_file_name = os.path.join(self.cache_dir, MANIFEST)
+        self.manifest = self._read_manifest()
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------------------
+    # IndexCache - Intended Private Methods
+    # ------------------------------------------------------------------------------
+    def _read_manifest(self):
+        """Return the manifest, or an empty one if it is missing, unreadable
+        or written by a different format.
+        Runtime: Θ(e) Space: Θ(e)"""
+        try:
+            with open(self.manifest_file_name) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("format") != FORMAT:
+            return {}
+        return manifest.get("entries", {})
+
+    def _write_manifest(self):
+        """Replace the manifest file atomically.
+        Runtime: Θ(e) Space: Θ(e)"""
+        tmp_file_name = self.manifest_file_name + '.tmp'
+        with open(tmp_file_name, 'w') as f:
+            json.dump({"format": FORMAT, "entries": self.manifest}, f,
+                      indent=1, sort_keys=True)
+        os.replace(tmp_file_name, self.manifest_file_name)
+
+    def _key(self, kind, file_name):
+        """Return the manifest key of an index of kind built from
+        file_name.
+        Runtime: Θ(1) Space: Θ(1)"""
+        return "{}|{}".format(kind, os.path.abspath(
+            solution.data_path(file_name)))
+
+    # ------------------------------------------------------------------------------
+    # IndexCache - Public Methods
+    # ------------------------------------------------------------------------------
+    def load(self, kind, file_name):
+        """Return the cached index of kind built from file_name, or None if
+        there is none or file_name has changed since it was built. kind
+        names the backend, as each builds a different index.
+        Runtime: Θ(n) Space: Θ(n)"""
+        entry = self.manifest.get(self._key(kind, file_name))
+        path = solution.data_path(file_name)
+        if entry is None or not is_unchanged(path, entry["source"]):
+            self.misses += 1
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, entry["file"]),
+                      'rb') as f:
+                index = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+                ImportError):
+            self.misses += 1
+            return None
+        mtime_ns = os.stat(path).st_mtime_ns
+        if entry["source"]["mtime_ns"] != mtime_ns:
+            # touched but unchanged, remember the new mtime so the next
+            # load takes the fast path
+            entry["source"] = dict(entry["source"], mtime_ns=mtime_ns)
+            self._write_manifest()
+        self.hits += 1
+        return index
+
+    def save(self, kind, file_name, index, source=None):
+        """Cache index, of kind, as built from file_name. source is the
+        fingerprint of file_name taken before the index was built, so a
+        file changed while building is never recorded as its source; if
+        None the file's current state is recorded.
+        Runtime: Θ(n) Space: Θ(n)"""
+        key = self._key(kind, file_name)
+        cache_file_name = blake2b(key.encode(), digest_size=16).hexdigest() \
+            + '.pickle'
+        tmp_file_name = os.path.join(self.cache_dir, cache_file_name + '.tmp')
+        with open(tmp_file_name, 'wb') as f:
+            pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file_name, os.path.join(self.cache_dir,
+                                               cache_file_name))
+        self.manifest[key] = {
+            "source": source or fingerprint(solution.data_path(file_name)),
+            "file": cache_file_name,
+        }
+        self._write_manifest()
+
+    def is_current(self, kind, file_name, carrier_route_costs, options=None):
+        """Return True if file_name, an artifact of kind such as a snapshot,
+        exists and was recorded as built from exactly carrier_route_costs
+        in their current state, with the same options.
+        Runtime: Θ(c), or Θ(n) for touched files Space: Θ(c)"""
+        entry = self.manifest.get(self._key(kind, file_name))
+        if entry is None or not os.path.isfile(solution.data_path(file_name)):
+            return False
+        if entry.get("options") != options:
+            return False
+        if entry["carriers"] != [[carrier, os.path.abspath(
+                solution.data_path(source))]
+                for carrier, source in carrier_route_costs]:
+            return False
+        return all(is_unchanged(solution.data_path(source), recorded)
+                   for (_, source), recorded in zip(carrier_route_costs,
+                                                    entry["sources"]))
+
+    def record(self, kind, file_name, carrier_route_costs, sources=None,
+               options=None):
+        """Record that file_name, an artifact of kind, was built from
+        carrier_route_costs with options, a JSON serializable dictionary of
+        build settings, see is_current. sources are the fingerprints of the
+        carrier files taken before it was built, or None to record their
+        current state.
+        Runtime: Θ(n) Space: Θ(c)"""
+        if sources is None:
+            sources = [fingerprint(solution.data_path(source))
+                       for _, source in carrier_route_costs]
+        self.manifest[self._key(kind, file_name)] = {
+            "carriers": [[carrier, os.path.abspath(solution.data_path(source))]
+                         for carrier, source in carrier_route_costs],
+            "sources": sources,
+            "options": options,
+        }
+        self._write_manifest()
+
+    def stats(self):
+        """Return a dictionary of cache counters.
+        Runtime: Θ(1) Space: Θ(1)"""
+        return {"entries": len(self.manifest), "hits": self.hits,
+                "misses": self.misses}
@@ -0,0 +1,464 @@
+# ==================================================================================
+# File: lazy_solution.py
+#
+# Desc: Call Routing project lazy sharded solution file. Most traffic goes to a
+#       handful of country codes, so loading every route of every carrier up
+#       front wastes startup time and memory on routes that are never looked
+#       up. Each carrier's route file is split once into one shard file per
+#       country code, kept beside the data until the route file changes, and a
+#       shard is only read the first time a number in its country is looked up.
+#       Loaded shards of every carrier share a memory budget, and the least
+#       recently used are evicted to stay within it, so resident memory follows
+#       the working set rather than the size of the rate decks.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from collections import OrderedDict
+from hashlib import blake2b
+import threading
+import shutil
+import json
+import sys
+import os
+import solution
+import index_cache
+from prefix_filter import RouteDict
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# directory in the data directory shard files are kept in
+SHARD_DIR = "shards"
+
+# manifest of a route file's shards and the source they were split from
+MANIFEST = "manifest.json"
+
+# bumped whenever the shard format changes, so every file is split again
+FORMAT = 1
+
+# default bytes of loaded shards kept across all carriers
+MEMORY_BUDGET = 256 << 20
+
+# routes buffered while splitting before they are appended to shard files
+FLUSH_ROUTES = 100000
+
+# country codes are prefix free: 1 and 7 are one digit, these are two
+# digits, and every other code is three digits
+TWO_DIGIT_CODES = frozenset((
+    "20", "27", "30", "31", "32", "33", "34", "36", "39", "40", "41", "43",
+    "44", "45", "46", "47", "48", "49", "51", "52", "53", "54", "55", "56",
+    "57", "58", "60", "61", "62", "63", "64", "65", "66", "81", "82", "84",
+    "86", "90", "91", "92", "93", "94", "95", "98"))
+
+
+# ----------------------------------------------------------------------------------
+# Country Code Function
+# ----------------------------------------------------------------------------------
+def country_code(number):
+    """Return the '+' prefixed country code that a number or route prefix
+    starts with, or None if it is too short to hold a whole one.
+    Runtime: Θ(1) Space: Θ(1)"""
+    if number[1:2] in ("1", "7"):
+        length = 2
+    elif number[1:3] in TWO_DIGIT_CODES:
+        length = 3
+    else:
+        length = 4
+    return number[:length] if len(number) >= length else None
+
+
+# ----------------------------------------------------------------------------------
+# Shard File Functions
+# ----------------------------------------------------------------------------------
+def _read_shard(path):
+    """Read a shard file of prefix,micro-dollar lines into a RouteDict,
+    keeping the lowest cost of duplicate prefixes.
+    Runtime: Θ(n) Space: Θ(n)"""
+    results = RouteDict()
+    interned = {}
+    with open(path) as shard_file:
+        for line in shard_file:
+            prefix, cost = line.split(',')
+            cost = int(cost)
+            cost = interned.setdefault(cost, cost)
+            if prefix not in results or cost < results[prefix]:
+                results[prefix] = cost
+    return results.index_lengths()
+
+
+def _shard_size(costs):
+    """Return an estimate of the bytes a loaded shard holds: the
+    dictionary, its prefixes and its distinct costs.
+    Runtime: Θ(n) Space: Θ(1)"""
+    return sys.getsizeof(costs) + sum(map(sys.getsizeof, costs)) + \
+        sum(map(sys.getsizeof, set(costs.values())))
+
+
+def _read_manifest(manifest_file_name):
+    """Return a shard manifest, or None if it is missing, unreadable or
+    written by a different format.
+    Runtime: Θ(s) Space: Θ(s)"""
+    try:
+        with open(manifest_file_name) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != FORMAT:
+        return None
+    return manifest
+
+
+def split_routes(file_name, shard_dir=SHARD_DIR):
+    """Split a route costs file into one shard file per country code in
+    shard_dir, in the data directory, unless it was already split from the
+    file as it is now. Routes too short to hold a whole country code are
+    kept in the manifest rather than a shard, as they apply to several.
+    Return a tuple of the directory the file's shards are in and their
+    manifest. Shards split from an earlier version of the file are kept
+    until the next split, for lookups still reading them.
+    Runtime: Θ(1) if already split, otherwise Θ(n) Space: Θ(s), or
+    Θ(largest shard) to split"""
+    path = solution.data_path(file_name)
+    root = os.path.join(solution.data_path(shard_dir), blake2b(
+        os.path.abspath(path).encode(), digest_size=16).hexdigest())
+    manifest_file_name = os.path.join(root, MANIFEST)
+    previous = _read_manifest(manifest_file_name)
+    if previous is not None and \
+            index_cache.is_unchanged(path, previous["source"]):
+        return root, previous
+
+    # fingerprint the source before splitting, so a file changed while
+    # splitting is split again next time
+    source = index_cache.fingerprint(path)
+    version_dir = os.path.join(root, source["hash"])
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.makedirs(version_dir)
+
+    # append routes to their shard a buffer at a time, so splitting
+    # never holds the whole file
+    short = {}
+    pending = {}
+    buffered = 0
+    with open(path) as route_costs_file:
+        for line in route_costs_file:
+            prefix, cost = line.strip().split(',')
+            cost = solution.parse_cost(cost)
+            code = country_code(prefix)
+            if code is None:
+                if prefix not in short or cost < short[prefix]:
+                    short[prefix] = cost
+                continue
+            pending.setdefault(code, []).append(
+                "{},{}\n".format(prefix, cost))
+            buffered += 1
+            if buffered >= FLUSH_ROUTES:
+                _flush_shards(version_dir, pending)
+                pending = {}
+                buffered = 0
+    _flush_shards(version_dir, pending)
+
+    # drop duplicate prefixes a shard at a time, counting its routes
+    shards = {}
+    for shard_file_name in os.listdir(version_dir):
+        shard_path = os.path.join(version_dir, shard_file_name)
+        costs = _read_shard(shard_path)
+        with open(shard_path, 'w') as shard_file:
+            shard_file.write("".join("{},{}\n".format(prefix, cost)
+                                     for prefix, cost in costs.items()))
+        shards[os.path.splitext(shard_file_name)[0]] = len(costs)
+
+    manifest = {"format": FORMAT, "source": source, "short": short,
+                "shards": shards}
+    tmp_file_name = manifest_file_name + '.tmp'
+    with open(tmp_file_name, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file_name, manifest_file_name)
+
+    # keep this version and the one lookups may still be reading
+    keep = {MANIFEST, source["hash"]}
+    if previous is not None:
+        keep.add(previous["source"]["hash"])
+    for name in os.listdir(root):
+        if name not in keep and os.path.isdir(os.path.join(root, name)):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return root, manifest
+
+
+def _flush_shards(version_dir, pending):
+    """Append buffered route lines to their country code's shard file.
+    Runtime: Θ(n) Space: Θ(1)"""
+    for code, lines in pending.items():
+        with open(os.path.join(version_dir, code[1:] + ".txt"),
+                  'a') as shard_file:
+            shard_file.write("".join(lines))
+
+
+# ----------------------------------------------------------------------------------
+# ShardPool (Class)
+# ----------------------------------------------------------------------------------
+class ShardPool(object):
+    """Loaded shards of every carrier, least recently used first, evicted
+    once their estimated size exceeds a memory budget. A loaded shard is
+    never changed, so a lookup still searching one that is evicted simply
+    finishes with it."""
+
+    # ------------------------------------------------------------------------------
+    # ShardPool - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, memory_budget=MEMORY_BUDGET):
+        """Create a new ShardPool keeping at most memory_budget bytes of
+        shards loaded, though always the most recently used one.
+        Runtime: Θ(1) Space: Θ(1)"""
+        self.memory_budget = memory_budget
+        self.shards = OrderedDict()
+        self.used = 0
+        self.lock = threading.Lock()
+
+        # counters
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------------------
+    # ShardPool - Public Methods
+    # ------------------------------------------------------------------------------
+    def get(self, path):
+        """Return the RouteDict of the shard file at path, reading it if it
+        is not loaded and evicting the least recently used shards if that
+        takes the pool over budget. The lock is not held while reading, so
+        lookups in loaded shards never wait on a load.
+        Runtime: Θ(1), or Θ(n) to load Space: Θ(n)"""
+        with self.lock:
+            entry = self.shards.get(path)
+            if entry is not None:
+                self.hits += 1
+                self.shards.move_to_end(path)
+                return entry[0]
+        costs = _read_shard(path)
+        size = _shard_size(costs)
+        with self.lock:
+            entry = self.shards.get(path)
+            if entry is not None:
+                # another thread loaded it meanwhile
+                return entry[0]
+            self.shards[path] = (costs, size)
+            self.used += size
+            self.loads += 1
+            while self.used > self.memory_budget and len(self.shards) > 1:
+                _, (_, evicted) = self.shards.popitem(last=False)
+                self.used -= evicted
+                self.evictions += 1
+        return costs
+
+    def stats(self):
+        """Return a dictionary of loaded shards, their estimated bytes, the
+        budget and counters.
+        Runtime: Θ(1) Space: Θ(1)"""
+        with self.lock:
+            return {
+                "shards": len(self.shards),
+                "bytes": self.used,
+                "memory_budget": self.memory_budget,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+# ----------------------------------------------------------------------------------
+# ShardedRoutes (Class)
+# ----------------------------------------------------------------------------------
+class ShardedRoutes(object):
+
+    # ------------------------------------------------------------------------------
+    # ShardedRoutes - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, file_name, pool, shard_dir=SHARD_DIR):
+        """Create a new ShardedRoutes over a route costs file, splitting it
+        into shards if needed, see split_routes. Shards are loaded through
+        pool on first use.
+        Runtime: Θ(s), or Θ(n) to split Space: Θ(s)"""
+        root, manifest = split_routes(file_name, shard_dir)
+        self.shard_dir = os.path.join(root, manifest["source"]["hash"])
+        self.pool = pool
+
+        # routes shorter than a country code are always resident
+        self.short = RouteDict(manifest["short"]).index_lengths()
+
+        # country code digits -> number of routes in its shard
+        self.shards = manifest["shards"]
+
+    # ------------------------------------------------------------------------------
+    # ShardedRoutes - Intended Private Methods
+    # ------------------------------------------------------------------------------
+    def _shard_path(self, digits):
+        """Return the path of the shard of a country code's digits.
+        Runtime: Θ(1) Space: Θ(1)"""
+        return os.path.join(self.shard_dir, digits + ".txt")
+
+    # ------------------------------------------------------------------------------
+    # ShardedRoutes - Public Methods
+    # ------------------------------------------------------------------------------
+    def shard(self, code):
+        """Return the RouteDict of a '+' prefixed country code's routes,
+        loading it if needed, or None if there are none.
+        Runtime: Θ(1), or Θ(n) to load Space: Θ(1)"""
+        if code[1:] not in self.shards:
+            return None
+        return self.pool.get(self._shard_path(code[1:]))
+
+    def longest_route(self, number):
+        """Return a tuple of the length of the longest route prefix of
+        number and its cost in micro-dollars, or None if no route matches.
+        Only the shard of the number's country code is searched, then the
+        routes shorter than a country code.
+        Runtime: Θ(k), or Θ(n) to load the shard Space: Θ(1)"""
+        size = len(number)
+        code = country_code(number)
+        shard = None if code is None else self.shard(code)
+        for costs in (shard, self.short):
+            if costs is None:
+                continue
+            for index in costs.lengths:
+                if index <= size and number[:index] in costs:
+                    return index, costs[number[:index]]
+        return None
+
+    def items(self):
+        """Yield (prefix, cost) for every route, reading shards without
+        loading them into the pool.
+        Runtime: Θ(n) Space: Θ(largest shard)"""
+        yield from self.short.items()
+        for digits in self.shards:
+            yield from _read_shard(self._shard_path(digits)).items()
+
+    def __len__(self):
+        """Return the number of routes.
+        Runtime: Θ(s) Space: Θ(1)"""
+        return len(self.short) + sum(self.shards.values())
+
+
+# ----------------------------------------------------------------------------------
+# CallRoutes (Class)
+# ----------------------------------------------------------------------------------
+class CallRoutes(solution.CallRoutes):
+    """CallRoutes that splits each carrier's routes into country code
+    shards and loads a shard only when a number in it is looked up."""
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Constructor
+    # ------------------------------------------------------------------------------
+
+    def __init__(self, memory_budget=MEMORY_BUDGET, shard_dir=SHARD_DIR):
+        """Create a new CallRoutes instance keeping at most memory_budget
+        bytes of shards loaded across all carriers, with shard files kept
+        in shard_dir in the data directory.
+        Runtime: Θ(1) Space: Θ(1)."""
+        solution.CallRoutes.__init__(self)
+        self.shard_dir = shard_dir
+        self.shards = ShardPool(memory_budget)
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Intended Private Methods
+    # ------------------------------------------------------------------------------
+
+    def _read_route_costs(self, file_name):
+        """Return a ShardedRoutes over route costs file, which reads none
+        of its shards.
+        Runtime: Θ(s), or Θ(n) to split Space: Θ(s)"""
+        return ShardedRoutes(file_name, self.shards, self.shard_dir)
+
+    def _apply_delta(self, costs_index, changes):
+        """Raise ValueError, as shards are split from the carrier's file
+        and a delta would have to rewrite them; reload the carrier instead.
+        Runtime: Θ(1) Space: Θ(1)"""
+        raise ValueError("lazy carriers cannot take route deltas, update "
+                         "the route costs file and reload it")
+
+    def _match(self, costs_index, number):
+        """Return the cost of the longest prefix of number in costs_index,
+        or None if no prefix matches.
+        Runtime: Θ(k) Space: Θ(1)."""
+        route = costs_index.longest_route(number)
+        if route is None:
+            return None
+        return route[1]
+
+    def _match_route(self, costs_index, number):
+        """Return a tuple of the length of the longest prefix of number in
+        costs_index and its cost, or None if no prefix matches.
+        Runtime: Θ(k) Space: Θ(1)."""
+        return costs_index.longest_route(number)
+
+    def _probe(self, costs_index, number):
+        """Return a tuple of the cost of the longest prefix of number in
+        costs_index (or None) and None, as the probes span a shard and the
+        short routes.
+        Runtime: Θ(k) Space: Θ(1)."""
+        return self._match(costs_index, number), None
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Public Methods
+    # ------------------------------------------------------------------------------
+
+    def enable_pruning(self):
+        """Raise ValueError, as shards are not pruned.
+        Runtime: Θ(1) Space: Θ(1)."""
+        raise ValueError("lazy carriers are not pruned")
+
+    def enable_index_cache(self, cache_dir=index_cache.CACHE_DIR):
+        """Raise ValueError, as shard files already persist each carrier's
+        split routes and are only read on demand.
+        Runtime: Θ(1) Space: Θ(1)."""
+        raise ValueError("lazy carriers keep shard files rather than an "
+                         "index cache")
+
+    def add_route_costs_parallel(self, carrier_route_costs, workers=None):
+        """Load several carriers' route costs files as ShardedRoutes, one
+        after another, as splitting a file only streams it into shards and
+        parses nothing a worker pool could share out. workers is ignored.
+        carrier_route_costs is a list of ('carrier name', 'file name')
+        tuples.
+        Runtime: Θ(cs), or Θ(n) to split Space: Θ(cs)."""
+        for carrier, file_name in carrier_route_costs:
+            self.add_route_costs(carrier, file_name)
+
+    def get_shard_stats(self):
+        """Return a dictionary of loaded shards, their estimated bytes, the
+        memory budget and shard hit, load and eviction counts.
+        Runtime: Θ(1) Space: Θ(1)."""
+        return self.shards.stats()
+
+    def lookup_many(self, numbers):
+        """Return a list of (number, cost) tuples in input order, where cost
+        is the least cost in dollars over all carriers or 0 if no carrier
+        has a route. Country codes are prefix free, so in sorted order the
+        numbers of each shard are adjacent, and resolving the batch that way
+        a carrier at a time loads each shard at most once even when the
+        batch's shards do not all fit in the memory budget.
+        Runtime: Θ(m log m + cmk) Space: Θ(m)."""
+        order = sorted(range(len(numbers)), key=numbers.__getitem__)
+        best = [None] * len(numbers)
+        for costs_index in self.routes.values():
+            for index in order:
+                cost = self._match(costs_index, numbers[index])
+                if cost is not None and (best[index] is None or
+                                         cost < best[index]):
+                    best[index] = cost
+        return [(number, 0 if cost is None else solution.cost_dollars(cost))
+                for number, cost in zip(numbers, best)]
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+if __name__ == '__main__':
+
+    # create new class instance and run the main menu
+    solution.run_menu(CallRoutes())
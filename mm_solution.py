@@ -2,7 +2,12 @@
 # File: mm_solution.py
 #
 # Desc: Call Routing project memory map solution file. This solution is ideal
-#       for fast startup with relatively fast lookup for a single number.
+#       for fast startup with relatively fast lookup for a single number. Each
+#       route file gets a sidecar index of line offsets sorted by prefix, built
+#       on first use and mapped afterwards, so lookups are a binary search of
+#       the mapped file anchored at line starts. The sidecar also holds the
+#       prefix lengths present and a Bloom filter of prefixes, so most probes
+#       that cannot match never touch the file.
 #
 # Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
 # ==================================================================================
@@ -10,11 +15,138 @@
 # ----------------------------------------------------------------------------------
 # Imports
 # ----------------------------------------------------------------------------------
+from bisect import bisect_left
 from random import randint
+from array import array
+import struct
 import time
 import resource
 import platform
 import mmap
+import os
+import re
+from route_cache import LookupCache, MISSING
+from solution import parse_cost, cost_dollars, data_path
+from prefix_filter import BloomFilter, length_mask, mask_lengths
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# sidecar index header: magic, source file size, source file mtime in ns,
+# prefix length mask, route count and Bloom filter size in bytes, followed
+# by one unsigned 64 bit line offset per route sorted by prefix, then the
+# Bloom filter
+INDEX_HEADER = struct.Struct('<8sQQQQQ')
+INDEX_MAGIC = b'CRIDX\x00\x00\x02'
+INDEX_SUFFIX = '.idx'
+
+# a route line: the prefix is anchored at the start of a line
+ROUTE_LINE = re.compile(rb'^([^,\n]+),', re.MULTILINE)
+
+
+# ----------------------------------------------------------------------------------
+# RouteFile (Class)
+# ----------------------------------------------------------------------------------
+class RouteFile(object):
+    """A mapped route costs file together with its mapped sidecar index of
+    line offsets sorted by prefix. Indexing a RouteFile returns the prefix
+    of the i-th route in sorted order, so bisect can search it directly."""
+
+    def __init__(self, file_name):
+        """Map file_name and its sidecar index, building the index if it is
+        missing or was built from a different version of the file.
+        Runtime: Θ(1), or Θ(n log n) to build the index Space: Θ(1)"""
+        self.file = open(file_name, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, prot=mmap.PROT_READ)
+        stat = os.fstat(self.file.fileno())
+        index_file_name = file_name + INDEX_SUFFIX
+        if not self._index_is_current(index_file_name, stat):
+            self._build_index(index_file_name, stat)
+        self.index_file = open(index_file_name, 'rb')
+        self.index_mm = mmap.mmap(self.index_file.fileno(), 0,
+                                  prot=mmap.PROT_READ)
+        _, _, _, mask, count, bloom_size = INDEX_HEADER.unpack_from(
+            self.index_mm, 0)
+        self.lengths = mask_lengths(mask)
+        view = memoryview(self.index_mm)
+        bloom_offset = INDEX_HEADER.size + count * 8
+        self.offsets = view[INDEX_HEADER.size:bloom_offset].cast('Q')
+        self.bloom = BloomFilter(view[bloom_offset:bloom_offset + bloom_size])
+        view.release()
+
+    def _index_is_current(self, index_file_name, stat):
+        """Return True if index_file_name was built from this version of
+        the route file.
+        Runtime: Θ(1) Space: Θ(1)"""
+        try:
+            with open(index_file_name, 'rb') as f:
+                header = f.read(INDEX_HEADER.size)
+        except OSError:
+            return False
+        return len(header) == INDEX_HEADER.size and INDEX_HEADER.unpack(
+            header)[:3] == (INDEX_MAGIC, stat.st_size, stat.st_mtime_ns)
+
+    def _build_index(self, index_file_name, stat):
+        """Write the sidecar index of line offsets sorted by prefix, with
+        the prefix length mask and Bloom filter.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        entries = sorted((match.group(1), match.start())
+                         for match in ROUTE_LINE.finditer(self.mm))
+        offsets = array('Q', [entry[1] for entry in entries])
+        bloom = BloomFilter.create(len(entries))
+        for entry in entries:
+            bloom.add(entry[0])
+        mask = length_mask([entry[0] for entry in entries])
+        tmp_file_name = index_file_name + '.tmp'
+        with open(tmp_file_name, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size,
+                                      stat.st_mtime_ns, mask, len(offsets),
+                                      len(bloom.bits)))
+            f.write(offsets.tobytes())
+            f.write(bloom.bits)
+        os.replace(tmp_file_name, index_file_name)
+
+    def __getitem__(self, index):
+        """Return the prefix of the index-th route in sorted order.
+        Runtime: Θ(1) Space: Θ(1)"""
+        offset = self.offsets[index]
+        return self.mm[offset:self.mm.find(b',', offset)]
+
+    def __len__(self):
+        """Return the number of routes.
+        Runtime: Θ(1) Space: Θ(1)"""
+        return len(self.offsets)
+
+    def find(self, prefix):
+        """Return the lowest cost in micro-dollars of prefix, or None if
+        it is not a route.
+        Runtime: Θ(log n) Space: Θ(1)"""
+        key = prefix.encode()
+        if key not in self.bloom:
+            return None
+        index = bisect_left(self, key)
+        best = None
+        # duplicate prefixes sit next to each other
+        while index < len(self.offsets) and self[index] == key:
+            offset = self.offsets[index] + len(key) + 1
+            end = self.mm.find(b'\n', offset)
+            cost = parse_cost(self.mm[offset:end if end != -1 else None])
+            if best is None or cost < best:
+                best = cost
+            index += 1
+        return best
+
+    def close(self):
+        """Release the mapped index and file.
+        Runtime: Θ(1) Space: Θ(1)"""
+        self.offsets.release()
+        self.bloom.bits.release()
+        self.index_mm.close()
+        self.index_file.close()
+        self.mm.close()
+        self.file.close()
 
 
 # ----------------------------------------------------------------------------------
@@ -26,9 +158,14 @@ class CallRoutes(object):
     # CallRoutes - Constructor
     # ------------------------------------------------------------------------------
     def __init__(self, numbers_file_name, *carrier_route_costs):
-        """Create a new CallRoutes instance. numbers_file_name should be
-        a fully qualified file name. carrier_route_costs is a variadic parameter,
-        each of which should be a tuple of ('carrier name', 'file name')."""
+        """Create a new CallRoutes instance. numbers_file_name optionally
+        names a phone numbers file to read, or is None. carrier_route_costs
+        is a variadic parameter, each of which should be a tuple of
+        ('carrier name', 'file name')."""
+
+        # optional cache of resolved numbers and prefix probes,
+        # see enable_cache
+        self.cache = None
 
         # for each carrier_route_costs argument(variadic), allocate
         # the file in memory as a mmap
@@ -37,7 +174,9 @@ class CallRoutes(object):
 
         # set numbers to list of numbers from specified file
         # **this is an expensive operation** but it's the best we can do
-        self.numbers = self._read_numbers(numbers_file_name)
+        self.numbers = []
+        if numbers_file_name is not None:
+            self.numbers = self._read_numbers(numbers_file_name)
 
     # ------------------------------------------------------------------------------
     # CallRoutes - Destructor
@@ -46,43 +185,99 @@ class CallRoutes(object):
         """Frees allocated mmap's from memory and closes opened files
         before instance destruction."""
         for route in self.routes.values():
-            route[0].close()
-            route[1].close()
+            route.close()
 
     # ------------------------------------------------------------------------------
     # CallRoutes - Intended Private Methods
     # ------------------------------------------------------------------------------
     def _read_routes(self, file_name):
-        """Read route costs file into memory. Return a tuple of mmap
-        and open file reference.
-        Runtime: Θ(1) Space: Θ(n)"""
-        f = open('data/' + file_name)
-        mm = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
-        return (mm, f)
+        """Map a route costs file and its sorted sidecar index into
+        memory. Return a RouteFile.
+        Runtime: Θ(1) Space: Θ(1)"""
+        return RouteFile(data_path(file_name))
 
     def _read_numbers(self, file_name):
         """Read phone numbers into a list and return the result.
         Runtime: Θ(n) Space: Θ(n)"""
-        with open('data/'+file_name) as f:
+        with open(data_path(file_name)) as f:
             return f.read().splitlines()
 
     # ------------------------------------------------------------------------------
     # CallRoutes - Public Methods
     # ------------------------------------------------------------------------------
     def get_costs(self, phone_number):
-        """Return the carrier costs for a specified phone number.
-        Runtime: Θ(n) Space: Θ(n)"""
+        """Return the carrier costs for a specified phone number as a
+        dictionary of carrier to cost in dollars.
+        Runtime: Θ(ck log n) Space: Θ(c)"""
+        cache = self.cache
+        if cache is not None:
+            cached = cache.get_number(phone_number)
+            if cached is not MISSING:
+                return dict(cached)
+            generation = cache.generation
         results = {}
+        size = len(phone_number)
         for carrier in self.routes.items():
-            for i in range(len(phone_number), 1, -1):
-                mm = carrier[1][0]
-                cost_idx = mm.find((phone_number[:i]+",").encode())
-                if cost_idx != -1:
-                    mm.seek(cost_idx)
-                    line = mm.readline().decode().strip().split(',')
-                    results[carrier[0]] = line[1]
-                    mm.seek(0)
+            for i in carrier[1].lengths:
+                if i > size:
+                    continue
+                prefix = phone_number[:i]
+                # each probe touches the mapped pages of a binary
+                # search, so remember both hits and misses per
+                # carrier prefix
+                cost = MISSING if cache is None else \
+                    cache.get_prefix(carrier[0], prefix)
+                if cost is MISSING:
+                    cost = carrier[1].find(prefix)
+                    if cache is not None:
+                        cache.put_prefix(carrier[0], prefix, cost,
+                                         generation)
+                if cost is not None:
+                    results[carrier[0]] = cost_dollars(cost)
                     break
+        if cache is not None:
+            cache.put_number(phone_number, tuple(results.items()),
+                             generation)
+        return results
+
+    def load_route_costs(self, carrier, file_name):
+        """Map a carrier's route costs file, replacing the carrier's
+        previous file if it was already loaded. A new routes dictionary is
+        swapped in, and the previous mapping is left for the garbage
+        collector rather than closed, so lookups still searching it from
+        other threads finish undisturbed.
+        Runtime: Θ(1) Space: Θ(n)"""
+        routes = dict(self.routes)
+        routes[carrier] = self._read_routes(file_name)
+        self.routes = routes
+        if self.cache is not None:
+            self.cache.invalidate(carrier)
+
+    def enable_cache(self, size=100000, prefix_size=100000):
+        """Cache up to size resolved numbers and prefix_size per carrier
+        prefix probes in front of get_costs. Cached entries for a carrier
+        are invalidated when it is reloaded through load_route_costs.
+        Runtime: Θ(1) Space: Θ(size + prefix_size)"""
+        self.cache = LookupCache(size, prefix_size)
+
+    def get_best_route(self, phone_number):
+        """Return (carrier, cost) of the least cost route for a specified
+        phone number, or 0 if no carrier has a route for it.
+        Runtime: Θ(n) Space: Θ(n)"""
+        costs = self.get_costs(phone_number)
+        if not costs:
+            return 0
+        return min(costs.items(), key=lambda route: route[1])
+
+    def lookup_many(self, numbers):
+        """Return a list of (number, cost) tuples in input order, where cost
+        is the least cost in dollars over all carriers or 0 if no carrier
+        has a route.
+        Runtime: Θ(mck log n) Space: Θ(m)"""
+        results = []
+        for number in numbers:
+            costs = self.get_costs(number)
+            results.append((number, min(costs.values()) if costs else 0))
         return results
 
     def yield_costs(self):
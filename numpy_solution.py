@@ -0,0 +1,381 @@
+# ==================================================================================
+# File: numpy_solution.py
+#
+# Desc: Call Routing project vectorized solution file. Route prefixes are encoded
+#       as integers and grouped by length into sorted NumPy arrays, so a whole
+#       batch of phone numbers is resolved with one np.searchsorted call per
+#       prefix length instead of one dictionary probe per number per length.
+#       Route decks may also be columnar files, see columnar_io, which load
+#       straight into the sorted arrays. Requires NumPy.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import re
+import numpy as np
+import solution
+import columnar_io
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# cost returned for numbers with no matching route
+NO_COST = -1
+
+# longest number, '+' included, whose digits fit in an int64 key. Route
+# prefixes are at most this long, so only this much of a number can match
+MAX_LENGTH = 19
+
+# the '+' and leading digits of a number that a route prefix can match, as
+# routes are a '+' and ASCII digits
+LEADING_DIGITS = re.compile(r'\+[0-9]{{1,{}}}'.format(MAX_LENGTH - 1))
+
+
+# ----------------------------------------------------------------------------------
+# VectorRouteIndex (Class)
+# ----------------------------------------------------------------------------------
+class VectorRouteIndex(object):
+
+    # ------------------------------------------------------------------------------
+    # VectorRouteIndex - Constructor
+    # ------------------------------------------------------------------------------
+
+    def __init__(self, costs):
+        """Create a new VectorRouteIndex from a dictionary mapping route
+        prefixes (a '+' followed by digits) to costs in micro-dollars.
+        Raise ValueError if a prefix is longer than MAX_LENGTH.
+        Runtime: Θ(n log n) Space: Θ(n)."""
+        check_prefixes(costs)
+        routes = [(prefix, cost) for prefix, cost in costs.items()
+                  if len(prefix) > 1]
+        self._index_arrays(
+            np.array([int(prefix[1:]) for prefix, _ in routes],
+                     dtype=np.int64),
+            np.array([len(prefix) for prefix, _ in routes], dtype=np.int64),
+            np.array([cost for _, cost in routes], dtype=np.int64))
+
+    @classmethod
+    def from_arrays(cls, keys, lengths, costs):
+        """Create a new VectorRouteIndex straight from parallel arrays of
+        integer encoded prefixes (the digits after the '+'), prefix lengths
+        including the '+', and costs in micro-dollars, such as the columns
+        of a columnar route deck, without a Python object per route.
+        Duplicate prefixes keep their lowest cost. Raise ValueError if a
+        prefix is longer than MAX_LENGTH.
+        Runtime: Θ(n log n) Space: Θ(n)."""
+        keys = np.asarray(keys, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        check_lengths(keys, lengths)
+        index = cls.__new__(cls)
+        index._index_arrays(keys, lengths, np.asarray(costs, dtype=np.int64))
+        return index
+
+    # ------------------------------------------------------------------------------
+    # VectorRouteIndex - Intended Private Methods
+    # ------------------------------------------------------------------------------
+
+    def _index_arrays(self, keys, lengths, costs):
+        """Sort routes by prefix length, key and cost, drop all but the
+        cheapest of each duplicate prefix and split them into one sorted
+        array per prefix length.
+        Runtime: Θ(n log n) Space: Θ(n)."""
+        routes = lengths > 1
+        keys, lengths, costs = keys[routes], lengths[routes], costs[routes]
+        order = np.lexsort((costs, keys, lengths))
+        keys, lengths, costs = keys[order], lengths[order], costs[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = (keys[1:] != keys[:-1]) | (lengths[1:] != lengths[:-1])
+        keys, lengths, costs = keys[first], lengths[first], costs[first]
+
+        # lengths is sorted longest first, and keys[i] and costs[i] are
+        # the sorted keys and matching costs of prefixes of lengths[i]
+        groups, starts = np.unique(lengths, return_index=True)
+        ends = np.append(starts[1:], len(keys))
+        self.lengths = groups.tolist()[::-1]
+        self.keys = [keys[start:end] for start, end
+                     in zip(starts.tolist(), ends.tolist())][::-1]
+        self.costs = [costs[start:end] for start, end
+                      in zip(starts.tolist(), ends.tolist())][::-1]
+
+    # ------------------------------------------------------------------------------
+    # VectorRouteIndex - Public Methods
+    # ------------------------------------------------------------------------------
+
+    def patched(self, changes):
+        """Return a new VectorRouteIndex with changes, a dictionary of
+        prefix to new cost in micro-dollars or None to remove the route,
+        applied. Only the sorted arrays of lengths that changed are copied,
+        with the changed keys deleted and inserted at their sorted
+        positions, so no Python object is made per unchanged route. Raise
+        ValueError if a changed prefix is longer than MAX_LENGTH.
+        Runtime: Θ(n + d log n) Space: Θ(n)."""
+        check_prefixes(changes)
+        groups = {}
+        for prefix, cost in changes.items():
+            if len(prefix) > 1:
+                groups.setdefault(len(prefix), {})[int(prefix[1:])] = cost
+        lengths = list(self.lengths)
+        keys = list(self.keys)
+        costs = list(self.costs)
+        for length, group in groups.items():
+            if length not in lengths:
+                # keep lengths longest first
+                position = sum(1 for other in lengths if other > length)
+                lengths.insert(position, length)
+                keys.insert(position, np.zeros(0, dtype=np.int64))
+                costs.insert(position, np.zeros(0, dtype=np.int64))
+            position = lengths.index(length)
+            group_keys, group_costs = keys[position], costs[position]
+
+            # drop every changed key present, then insert those that stay
+            changed = np.array(sorted(group), dtype=np.int64)
+            index = np.searchsorted(group_keys, changed)
+            present = index < len(group_keys)
+            present[present] = group_keys[index[present]] == \
+                changed[present]
+            group_keys = np.delete(group_keys, index[present])
+            group_costs = np.delete(group_costs, index[present])
+            added = [key for key in changed.tolist()
+                     if group[key] is not None]
+            added_keys = np.array(added, dtype=np.int64)
+            index = np.searchsorted(group_keys, added_keys)
+            keys[position] = np.insert(group_keys, index, added_keys)
+            costs[position] = np.insert(group_costs, index, np.array(
+                [group[key] for key in added], dtype=np.int64))
+        results = VectorRouteIndex.__new__(VectorRouteIndex)
+        results.lengths, results.keys, results.costs = lengths, keys, costs
+        return results
+
+    def lookup(self, numbers):
+        """Return an int64 array of the longest match cost in micro-dollars
+        of each number, NO_COST where no prefix matches.
+        Runtime: Θ(lm log n) Space: Θ(m).
+        Where l is the number of distinct prefix lengths."""
+        return self.lookup_encoded(*encode_numbers(numbers))
+
+    def lookup_encoded(self, digits, lengths):
+        """Return lookup's results for numbers already encoded by
+        encode_numbers, so a batch looked up in several indexes is only
+        encoded once.
+        Runtime: Θ(lm log n) Space: Θ(m)."""
+        results = np.full(len(digits), NO_COST, dtype=np.int64)
+        unresolved = np.ones(len(digits), dtype=bool)
+        for length, keys, costs in zip(self.lengths, self.keys, self.costs):
+            candidates = np.flatnonzero(unresolved & (lengths >= length))
+            if not len(candidates) or not len(keys):
+                continue
+            # truncate each number to this prefix length
+            prefixes = digits[candidates] // np.power(
+                np.int64(10), lengths[candidates] - length)
+            index = np.searchsorted(keys, prefixes)
+            index[index == len(keys)] = 0
+            hits = keys[index] == prefixes
+            results[candidates[hits]] = costs[index[hits]]
+            unresolved[candidates[hits]] = False
+        return results
+
+    def longest_match(self, number):
+        """Return the cost in micro-dollars of the longest route prefix of
+        number, or None if no route matches.
+        Runtime: Θ(l log n) Space: Θ(1)."""
+        cost = int(self.lookup([number])[0])
+        if cost == NO_COST:
+            return None
+        return cost
+
+    def longest_route(self, number):
+        """Return a tuple of the length of the longest route prefix of
+        number and its cost in micro-dollars, or None if no route matches.
+        Runtime: Θ(l log n) Space: Θ(1)."""
+        digits, size = encode_number(number)
+        for length, keys, costs in zip(self.lengths, self.keys, self.costs):
+            if length > size:
+                continue
+            prefix = digits // 10 ** (size - length)
+            index = int(np.searchsorted(keys, prefix))
+            if index < len(keys) and keys[index] == prefix:
+                return length, int(costs[index])
+        return None
+
+    def items(self):
+        """Yield (prefix, cost) for every route.
+        Runtime: Θ(n) Space: Θ(1)."""
+        for length, keys, costs in zip(self.lengths, self.keys, self.costs):
+            for key, cost in zip(keys.tolist(), costs.tolist()):
+                yield "+" + str(key).zfill(length - 1), cost
+
+    def columns(self):
+        """Return the routes as parallel int64 arrays of integer encoded
+        prefixes, prefix lengths and costs in micro-dollars, see
+        from_arrays.
+        Runtime: Θ(n) Space: Θ(n)."""
+        if not self.lengths:
+            return (np.zeros(0, dtype=np.int64),) * 3
+        return (np.concatenate(self.keys),
+                np.repeat(np.array(self.lengths, dtype=np.int64),
+                          [len(keys) for keys in self.keys]),
+                np.concatenate(self.costs))
+
+    def __len__(self):
+        """Return the number of routes in the index.
+        Runtime: Θ(l) Space: Θ(1)."""
+        return sum(len(keys) for keys in self.keys)
+
+
+# ----------------------------------------------------------------------------------
+# Encoding Functions
+# ----------------------------------------------------------------------------------
+def check_lengths(keys, lengths, file_name=None):
+    """Raise ValueError naming the first prefix of integer encoded keys
+    and prefix lengths, read from file_name if given, that is longer than
+    MAX_LENGTH, see check_prefixes.
+    Runtime: Θ(n) Space: Θ(1)."""
+    if len(lengths) and lengths.max() > MAX_LENGTH:
+        index = int(np.argmax(lengths > MAX_LENGTH))
+        check_prefixes(["+" + str(keys[index]).zfill(lengths[index] - 1)],
+                       file_name)
+
+
+def check_prefixes(prefixes, file_name=None):
+    """Raise ValueError naming the first of prefixes, read from file_name
+    if given, that is longer than MAX_LENGTH, as its digits do not fit in
+    an int64 key.
+    Runtime: Θ(n) Space: Θ(1)."""
+    if not prefixes or max(map(len, prefixes)) <= MAX_LENGTH:
+        return
+    prefix = next(prefix for prefix in prefixes if len(prefix) > MAX_LENGTH)
+    raise ValueError("prefix {}{} is longer than {} characters".format(
+        prefix, "" if file_name is None else " in {}".format(file_name),
+        MAX_LENGTH))
+
+
+def encode_number(number):
+    """Encode a normalized phone number as a tuple of the int64 digits and
+    string length of its '+' and leading digits, up to the first other
+    character, which is as much of it as any route prefix can match.
+    Those are cut to MAX_LENGTH, as no route is longer. A number that
+    does not start with a '+' and a digit is encoded as (0, 0), which no
+    route matches.
+    Runtime: Θ(k) Space: Θ(1)."""
+    match = LEADING_DIGITS.match(number)
+    if match is None:
+        return 0, 0
+    return int(match.group()[1:]), match.end()
+
+
+def encode_numbers(numbers):
+    """Encode normalized phone numbers as int64 digits and string lengths,
+    see encode_number. Numbers that are all digits after the '+', as
+    nearly all are, are encoded without the pattern match.
+    Runtime: Θ(m) Space: Θ(m)."""
+    cut = [number[1:MAX_LENGTH] if number[:1] == "+" else ""
+           for number in numbers]
+    valid = [number.isascii() and number.isdigit() for number in cut]
+    digits = np.array([int(number) if ok else 0
+                       for number, ok in zip(cut, valid)], dtype=np.int64)
+    lengths = np.array([len(number) + 1 if ok else 0
+                        for number, ok in zip(cut, valid)], dtype=np.int64)
+    for index in np.flatnonzero(~np.array(valid, dtype=bool)).tolist():
+        digits[index], lengths[index] = encode_number(numbers[index])
+    return digits, lengths
+
+
+# ----------------------------------------------------------------------------------
+# CallRoutes (Class)
+# ----------------------------------------------------------------------------------
+class CallRoutes(solution.CallRoutes):
+    """CallRoutes that stores each carrier's routes in a VectorRouteIndex
+    and resolves batches with np.searchsorted."""
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Intended Private Methods
+    # ------------------------------------------------------------------------------
+
+    def _read_route_costs(self, file_name):
+        """Read route costs file, a text or columnar route deck, into a
+        VectorRouteIndex and return the result. Raise ValueError if a
+        prefix is longer than MAX_LENGTH.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        if columnar_io.file_format(file_name) is not None:
+            keys, lengths, costs = columnar_io.read_deck_columns(file_name)
+            check_lengths(keys, lengths, file_name)
+            return VectorRouteIndex.from_arrays(keys, lengths, costs)
+        costs = {}
+        with open(solution.data_path(file_name)) as route_costs_file:
+            for line in route_costs_file:
+                prefix, cost = line.strip().split(',')
+                cost = solution.parse_cost(cost)
+                if prefix not in costs or cost < costs[prefix]:
+                    costs[prefix] = cost
+        check_prefixes(costs, file_name)
+        return VectorRouteIndex(costs)
+
+    def _build_index(self, costs_dict):
+        """Return a VectorRouteIndex built from a dictionary of prefix to
+        cost.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        return VectorRouteIndex(costs_dict)
+
+    def _read_route_delta(self, file_name):
+        """Read a route delta file, see solution.CallRoutes. Raise
+        ValueError if a prefix is longer than MAX_LENGTH.
+        Runtime: Θ(n) Space: Θ(n)"""
+        changes = solution.CallRoutes._read_route_delta(self, file_name)
+        check_prefixes(changes, file_name)
+        return changes
+
+    def _apply_delta(self, costs_index, changes):
+        """Return a new VectorRouteIndex with changes applied, see
+        VectorRouteIndex.patched.
+        Runtime: Θ(n + d log n) Space: Θ(n)"""
+        return costs_index.patched(changes)
+
+    def _match(self, costs_index, number):
+        """Return the cost of the longest prefix of number in costs_index,
+        or None if no prefix matches.
+        Runtime: Θ(l log n) Space: Θ(1)."""
+        return costs_index.longest_match(number)
+
+    def _match_route(self, costs_index, number):
+        """Return a tuple of the length of the longest prefix of number in
+        costs_index and its cost, or None if no prefix matches.
+        Runtime: Θ(l log n) Space: Θ(1)."""
+        return costs_index.longest_route(number)
+
+    def _probe(self, costs_index, number):
+        """Return a tuple of the cost of the longest prefix of number in
+        costs_index (or None) and None, as the index is searched a length
+        group at a time rather than prefix by prefix.
+        Runtime: Θ(l log n) Space: Θ(1)."""
+        return self._match(costs_index, number), None
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Public Methods
+    # ------------------------------------------------------------------------------
+
+    def lookup_many(self, numbers):
+        """Return a list of (number, cost) tuples in input order, where cost
+        is the least cost over all carriers or 0 if no carrier has a route.
+        Runtime: Θ(clm log n) Space: Θ(m)."""
+        best = np.full(len(numbers), np.iinfo(np.int64).max)
+        encoded = encode_numbers(numbers)
+        for costs_index in self.routes.values():
+            costs = costs_index.lookup_encoded(*encoded)
+            best = np.where((costs != NO_COST) & (costs < best), costs, best)
+        return [(number, 0 if cost == np.iinfo(np.int64).max
+                 else solution.cost_dollars(cost))
+                for number, cost in zip(numbers, best.tolist())]
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+if __name__ == '__main__':
+
+    # create new class instance and run the main menu
+    solution.run_menu(CallRoutes())
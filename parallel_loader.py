@@ -0,0 +1,120 @@
+# ==================================================================================
+# File: parallel_loader.py
+#
+# Desc: Call Routing project parallel route loader. Large carrier route files
+#       are split into byte ranges aligned on newlines and parsed in a process
+#       pool, with every carrier's chunks in flight at once. Workers send back
+#       compact columns, one string of prefixes and an array of int64 costs,
+#       rather than a pickled dictionary, and the parent merges them with
+#       whole dictionary operations keeping the lowest cost for duplicate
+#       prefixes, so it does no per route work in Python.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+import os
+import solution
+from prefix_filter import RouteDict
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# default size in bytes of each chunk handed to a worker
+CHUNK_SIZE = 32 << 20
+
+
+# ----------------------------------------------------------------------------------
+# Chunking Functions
+# ----------------------------------------------------------------------------------
+def chunk_ranges(file_name, chunk_size=CHUNK_SIZE):
+    """Split a file into (start, end) byte ranges of roughly chunk_size
+    bytes, each of which starts at the beginning of a line and ends just
+    after a newline or at the end of the file.
+    Runtime: Θ(n / chunk_size) Space: Θ(n / chunk_size)"""
+    size = os.path.getsize(file_name)
+    ranges = []
+    with open(file_name, 'rb') as f:
+        start = 0
+        while start < size:
+            # skip to the end of the line containing the nominal end
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(file_name, start, end):
+    """Parse the route costs between two line aligned byte offsets, keeping
+    the lowest cost for duplicate prefixes. Return a tuple of the prefixes
+    joined by newlines and an array of their int64 costs in micro-dollars,
+    which pickle as two objects however many routes they hold. Lines are
+    read as solution.CallRoutes reads them, so a blank line raises the
+    same IndexError.
+    Runtime: Θ(n) Space: Θ(n)"""
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).decode().splitlines()
+    parse_cost = solution.parse_cost
+    results = {}
+    for line in lines:
+        row = line.strip().split(',')
+        cost = parse_cost(row[1])
+        if row[0] not in results or cost < results[row[0]]:
+            results[row[0]] = cost
+    return "\n".join(results), array('q', results.values())
+
+
+def merge_costs(results, prefixes, costs, interned):
+    """Merge a chunk's prefixes and costs, as returned by parse_range, into
+    results in place, keeping the lowest cost for duplicate prefixes. Equal
+    costs share the int object in interned. Return results.
+    Runtime: Θ(n) Space: Θ(n)"""
+    if not costs:
+        return results
+    prefixes = prefixes.split("\n")
+    # only prefixes split across chunks need comparing, so just those
+    # are kept aside before the chunk is inserted over them
+    kept = {prefix: results[prefix]
+            for prefix in filter(results.__contains__, prefixes)}
+    results.update(zip(prefixes, map(interned.setdefault, costs, costs)))
+    for prefix, cost in kept.items():
+        if cost < results[prefix]:
+            results[prefix] = cost
+    return results
+
+
+# ----------------------------------------------------------------------------------
+# Parallel Loader Function
+# ----------------------------------------------------------------------------------
+def read_route_costs_parallel(carrier_route_costs, workers=None,
+                              chunk_size=CHUNK_SIZE):
+    """Read several carriers' route costs files concurrently.
+    carrier_route_costs is a list of ('carrier name', 'file name') tuples.
+    Return a dictionary mapping each carrier name to a RouteDict of prefix
+    to cost in micro-dollars.
+    Runtime: Θ(n / workers) Space: Θ(n)"""
+
+    # chunk every file up front so the pool stays busy across carriers
+    jobs = []
+    for carrier, file_name in carrier_route_costs:
+        path = solution.data_path(file_name)
+        for start, end in chunk_ranges(path, chunk_size):
+            jobs.append((carrier, path, start, end))
+
+    results = {carrier: RouteDict() for carrier, _ in carrier_route_costs}
+    interned = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(carrier, pool.submit(parse_range, path, start, end))
+                   for carrier, path, start, end in jobs]
+        for carrier, future in futures:
+            merge_costs(results[carrier], *future.result(), interned)
+    return results
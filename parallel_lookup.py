@@ -0,0 +1,130 @@
+# ==================================================================================
+# File: parallel_lookup.py
+#
+# Desc: Call Routing project multiprocess bulk lookup. Python lookups are bound
+#       to one core by the GIL, so batches of phone numbers are spread over a
+#       pool of worker processes instead. Every worker maps the same compiled
+#       binary snapshot, so the route index lives once in the page cache rather
+#       than once per process, and results come back in input order.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from multiprocessing import Pool
+import argparse
+import sys
+import time
+import os
+import solution
+import snapshot_solution
+import stream_lookup
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# number of phone numbers handed to a worker at a time
+BATCH_SIZE = 4096
+
+
+# ----------------------------------------------------------------------------------
+# Worker Functions
+# ----------------------------------------------------------------------------------
+
+# the snapshot mapped by this worker process, see _init_worker
+_calls = None
+
+
+def _init_worker(snapshot_file_name):
+    """Map the snapshot once when a worker process starts."""
+    global _calls
+    _calls = snapshot_solution.CallRoutes(snapshot_file_name)
+
+
+def _lookup_batch(numbers):
+    """Resolve a batch of numbers against the worker's snapshot."""
+    return _calls.lookup_many(numbers)
+
+
+# ----------------------------------------------------------------------------------
+# ParallelLookup (Class)
+# ----------------------------------------------------------------------------------
+class ParallelLookup(object):
+    """Bulk lookups over a compiled snapshot spread across worker
+    processes. Has the same lookup_many interface as the CallRoutes
+    solutions, so it can be handed to stream_lookup."""
+
+    def __init__(self, snapshot_file_name, workers=None,
+                 batch_size=BATCH_SIZE):
+        """Start workers processes (one per core by default), each mapping
+        snapshot_file_name, a snapshot produced by compile_snapshot."""
+        self.batch_size = batch_size
+        # workers may not inherit the data directory, so hand them the
+        # snapshot's absolute path
+        snapshot_file_name = os.path.abspath(
+            solution.data_path(snapshot_file_name))
+        self.pool = Pool(workers, _init_worker, (snapshot_file_name,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def lookup_many(self, numbers):
+        """Return a list of (number, cost) tuples in input order, where cost
+        is the least cost in dollars over all carriers or 0 if no carrier
+        has a route.
+        Runtime: Θ(mk log n / workers) Space: Θ(m)"""
+        results = []
+        for batch in self.pool.imap(_lookup_batch, self._batches(numbers)):
+            results.extend(batch)
+        return results
+
+    def _batches(self, numbers):
+        """Yield consecutive slices of numbers of up to batch_size."""
+        for start in range(0, len(numbers), self.batch_size):
+            yield numbers[start:start + self.batch_size]
+
+    def close(self):
+        """Stop the worker processes."""
+        self.pool.close()
+        self.pool.join()
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Resolve a phone numbers file over worker processes.")
+    parser.add_argument("--snapshot", required=True,
+                        help="snapshot file name in the data directory")
+    parser.add_argument("--carrier", action="append", default=[],
+                        metavar="NAME=FILE",
+                        help="compile the snapshot from these carrier route "
+                             "costs files first")
+    parser.add_argument("--numbers", required=True,
+                        help="phone numbers file, one number per line")
+    parser.add_argument("--out", required=True, help="output file")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="checkpoint file to resume an interrupted run")
+    parser.add_argument("--chunk-size", type=int,
+                        default=stream_lookup.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.carrier:
+        snapshot_solution.ensure_snapshot(
+            args.snapshot,
+            *[tuple(carrier.split("=", 1)) for carrier in args.carrier])
+    start = time.time()
+    with ParallelLookup(args.snapshot, args.workers) as calls:
+        count = stream_lookup.stream_to_file(
+            calls, args.numbers, args.out, args.checkpoint, args.chunk_size)
+    print("Wrote {:,} route costs in {} seconds.".format(
+        count, round(time.time()-start, 4)), file=sys.stderr)
@@ -0,0 +1,135 @@
+# ==================================================================================
+# File: prefix_filter.py
+#
+# Desc: Call Routing project prefix prefilters. Most carriers only have routes of
+#       a handful of prefix lengths, so each carrier index records which lengths
+#       exist and longest prefix searches only try those. Backends where a probe
+#       is expensive, such as a binary search of a mapped file, also keep a
+#       compact Bloom filter of their prefixes and skip any probe it rules out.
+#       Neither filter changes a result, they only skip work that cannot match.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from zlib import crc32
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# Bloom filter bits per prefix and hash functions, roughly a 1% false
+# positive rate
+BITS_PER_KEY = 10
+HASHES = 4
+
+# the shortest prefix length a longest prefix search tries
+MIN_PREFIX_LENGTH = 2
+
+
+# ----------------------------------------------------------------------------------
+# Length Mask Functions
+# ----------------------------------------------------------------------------------
+def length_mask(prefixes):
+    """Return an integer with bit l set for every prefix length l in
+    prefixes.
+    Runtime: Θ(n) Space: Θ(1)"""
+    mask = 0
+    for length in set(map(len, prefixes)):
+        mask |= 1 << length
+    return mask
+
+
+def mask_lengths(mask):
+    """Return the prefix lengths set in mask that a longest prefix search
+    tries, longest first.
+    Runtime: Θ(l) Space: Θ(l)"""
+    return tuple(length for length in range(mask.bit_length() - 1,
+                                            MIN_PREFIX_LENGTH - 1, -1)
+                 if mask >> length & 1)
+
+
+# ----------------------------------------------------------------------------------
+# RouteDict (Class)
+# ----------------------------------------------------------------------------------
+class RouteDict(dict):
+    """Dictionary of prefix to cost that also records the prefix lengths
+    it holds, longest first, in lengths. Call index_lengths after
+    changing the keys."""
+
+    __slots__ = ('lengths',)
+
+    def __init__(self, *args):
+        dict.__init__(self, *args)
+        self.lengths = ()
+
+    def __reduce__(self):
+        return (RouteDict, (dict(self),), self.lengths)
+
+    def __setstate__(self, lengths):
+        self.lengths = lengths
+
+    def index_lengths(self):
+        """Record the prefix lengths present in the dictionary. Return
+        self.
+        Runtime: Θ(n) Space: Θ(1)"""
+        self.lengths = mask_lengths(length_mask(self))
+        return self
+
+    def copy(self):
+        """Return a shallow copy that is also a RouteDict.
+        Runtime: Θ(n) Space: Θ(n)"""
+        result = RouteDict(self)
+        result.lengths = self.lengths
+        return result
+
+
+# ----------------------------------------------------------------------------------
+# BloomFilter (Class)
+# ----------------------------------------------------------------------------------
+class BloomFilter(object):
+    """Bloom filter of prefixes over any writable or read only buffer of
+    bytes. Hashing is crc32 based rather than the salted built in hash,
+    so a filter saved by one process is valid in every other."""
+
+    def __init__(self, bits):
+        """Wrap bits, a bytearray or memoryview of the filter's bytes.
+        Use BloomFilter.create for a new empty filter."""
+        self.bits = bits
+        self.size = len(bits) * 8
+
+    @classmethod
+    def create(cls, count, bits_per_key=BITS_PER_KEY):
+        """Return an empty filter sized for count prefixes.
+        Runtime: Θ(n) Space: Θ(n)"""
+        return cls(bytearray(max(1, (count * bits_per_key + 7) // 8)))
+
+    def _positions(self, key):
+        """Yield the bit positions of key, a bytes prefix, by double
+        hashing two crc32 values.
+        Runtime: Θ(k) Space: Θ(1)"""
+        h1 = crc32(key)
+        h2 = crc32(key, 0x9e3779b9) | 1
+        size = self.size
+        for i in range(HASHES):
+            yield (h1 + i * h2) % size
+
+    def add(self, key):
+        """Add key, a bytes prefix, to the filter.
+        Runtime: Θ(k) Space: Θ(1)"""
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        """Return False if key, a bytes prefix, was certainly never added,
+        True if it may have been.
+        Runtime: Θ(k) Space: Θ(1)"""
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] >> (position & 7) & 1:
+                return False
+        return True
@@ -0,0 +1,153 @@
+# ==================================================================================
+# File: route_cache.py
+#
+# Desc: Call Routing project lookup cache. A bounded LRU of fully resolved
+#       numbers sits in front of get_costs, and a second bounded LRU remembers
+#       the outcome of individual (carrier, prefix) probes, including misses,
+#       so numbers that share an area code share their probe work. Every
+#       operation holds a short lock, so one cache can serve reader threads,
+#       and a generation count keeps results computed against routes that
+#       were replaced mid-lookup out of the cache.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from collections import OrderedDict
+import threading
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# returned by the get methods when a key is not cached, as None is a valid
+# cached value (a prefix known not to match)
+MISSING = object()
+
+
+# ----------------------------------------------------------------------------------
+# LookupCache (Class)
+# ----------------------------------------------------------------------------------
+class LookupCache(object):
+
+    # ------------------------------------------------------------------------------
+    # LookupCache - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, size=100000, prefix_size=100000):
+        """Create a new LookupCache holding at most size resolved numbers
+        and prefix_size (carrier, prefix) probe results. A size of 0
+        disables that level.
+        Runtime: Θ(1) Space: Θ(1)"""
+        self.size = size
+        self.prefix_size = prefix_size
+        self.numbers = OrderedDict()
+        self.prefixes = OrderedDict()
+
+        # held by every operation, as an OrderedDict reordered by several
+        # threads at once can lose or double count entries
+        self.lock = threading.Lock()
+
+        # bumped by invalidate, see put_number
+        self.generation = 0
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self.prefix_evictions = 0
+
+    # ------------------------------------------------------------------------------
+    # LookupCache - Public Methods
+    # ------------------------------------------------------------------------------
+    def get_number(self, number):
+        """Return the cached result for number, or MISSING.
+        Runtime: Θ(1) Space: Θ(1)"""
+        with self.lock:
+            result = self.numbers.get(number, MISSING)
+            if result is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.numbers.move_to_end(number)
+            return result
+
+    def put_number(self, number, result, generation=None):
+        """Cache the result for number, evicting the least recently used
+        number if the cache is full. If generation is given, the result is
+        only cached if the cache has not been invalidated since generation
+        was read, so a lookup that raced a reload never caches a result
+        from the replaced routes.
+        Runtime: Θ(1) Space: Θ(1)"""
+        if not self.size:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.numbers[number] = result
+            if len(self.numbers) > self.size:
+                self.numbers.popitem(last=False)
+                self.evictions += 1
+
+    def get_prefix(self, carrier, prefix):
+        """Return the cached probe result for a carrier's prefix (a cost, or
+        None if the prefix is known not to be a route), or MISSING.
+        Runtime: Θ(1) Space: Θ(1)"""
+        key = (carrier, prefix)
+        with self.lock:
+            result = self.prefixes.get(key, MISSING)
+            if result is MISSING:
+                self.prefix_misses += 1
+            else:
+                self.prefix_hits += 1
+                self.prefixes.move_to_end(key)
+            return result
+
+    def put_prefix(self, carrier, prefix, result, generation=None):
+        """Cache the probe result for a carrier's prefix, evicting the least
+        recently used probe if the cache is full. See put_number for
+        generation.
+        Runtime: Θ(1) Space: Θ(1)"""
+        if not self.prefix_size:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.prefixes[(carrier, prefix)] = result
+            if len(self.prefixes) > self.prefix_size:
+                self.prefixes.popitem(last=False)
+                self.prefix_evictions += 1
+
+    def invalidate(self, carrier=None):
+        """Drop cached results affected by a change to carrier, or to every
+        carrier if carrier is None. Resolved numbers combine all carriers,
+        so they are always dropped.
+        Runtime: Θ(n) Space: Θ(n)"""
+        with self.lock:
+            self.generation += 1
+            self.numbers.clear()
+            if carrier is None:
+                self.prefixes.clear()
+            else:
+                self.prefixes = OrderedDict(
+                    (key, result) for key, result in self.prefixes.items()
+                    if key[0] != carrier)
+
+    def stats(self):
+        """Return a dictionary of cache sizes and counters.
+        Runtime: Θ(1) Space: Θ(1)"""
+        with self.lock:
+            return {
+                "numbers": len(self.numbers),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "prefixes": len(self.prefixes),
+                "prefix_hits": self.prefix_hits,
+                "prefix_misses": self.prefix_misses,
+                "prefix_evictions": self.prefix_evictions,
+            }
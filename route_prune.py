@@ -0,0 +1,54 @@
+# ==================================================================================
+# File: route_prune.py
+#
+# Desc: Call Routing project redundant route pruning. A route whose cost equals
+#       the cost of its nearest shorter route in the same carrier never changes
+#       a longest match cost: without it, the numbers it covers fall through to
+#       that ancestor at the same price. Pruning drops such routes at load or
+#       snapshot compile time, saving their memory and the probes that find
+#       them, with one sorted walk that keeps the chain of ancestors on a stack.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from prefix_filter import MIN_PREFIX_LENGTH
+
+
+# ----------------------------------------------------------------------------------
+# Pruning Functions
+# ----------------------------------------------------------------------------------
+def redundant_prefixes(costs):
+    """Return the prefixes in costs, a dictionary of prefix to cost, whose
+    cost equals that of their nearest ancestor prefix in costs. In sorted
+    order every ancestor of a prefix comes before it, so a stack of the
+    current prefix's ancestors finds each nearest ancestor in one pass.
+    Ancestors shorter than MIN_PREFIX_LENGTH are never matched by a
+    lookup, so they never make a route redundant.
+    Runtime: Θ(n log n) Space: Θ(n)"""
+    redundant = []
+    ancestors = []
+    for prefix in sorted(costs):
+        while ancestors and not prefix.startswith(ancestors[-1][0]):
+            ancestors.pop()
+        cost = costs[prefix]
+        if ancestors and ancestors[-1][1] == cost:
+            redundant.append(prefix)
+        # redundant prefixes stay on the stack: their children fall
+        # through to the same cost either way
+        if len(prefix) >= MIN_PREFIX_LENGTH:
+            ancestors.append((prefix, cost))
+    return redundant
+
+
+def prune_redundant(costs):
+    """Remove every redundant prefix (see redundant_prefixes) from costs,
+    a dictionary of prefix to cost, in place. Longest match costs of every
+    number are unchanged. Return the number of routes removed.
+    Runtime: Θ(n log n) Space: Θ(n)"""
+    redundant = redundant_prefixes(costs)
+    for prefix in redundant:
+        del costs[prefix]
+    return len(redundant)
@@ -0,0 +1,303 @@
+# ==================================================================================
+# File: route_stats.py
+#
+# Desc: Call Routing project hot path instrumentation. Counts the load rate of
+#       each carrier, a histogram of how many prefix probes each carrier lookup
+#       took, per carrier lookup latency, time spent in named stages such as
+#       formatting, redundant routes pruned, lookup and index cache hit
+#       counters and current memory. Everything is plain counters updated in
+#       place under one short lock, as lookups run from many threads, so it
+#       is cheap enough to leave switched on, and exports as a dictionary or
+#       in the Prometheus text format.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import tracemalloc
+import time
+import os
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# upper bounds in seconds of the per carrier lookup latency buckets
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4,
+                   5e-4, 1e-3, 1e-2)
+
+# probe depths above this are counted in the last bucket
+MAX_PROBE_DEPTH = 16
+
+# prefix of every exported Prometheus metric
+METRIC_PREFIX = "callroute_"
+
+
+# ----------------------------------------------------------------------------------
+# Prometheus Label Function
+# ----------------------------------------------------------------------------------
+def escape_label(value):
+    """Return value as a Prometheus label value, with backslashes, double
+    quotes and newlines escaped, as carrier names may hold any of them.
+    Runtime: Θ(k) Space: Θ(k)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+# ----------------------------------------------------------------------------------
+# Memory Function
+# ----------------------------------------------------------------------------------
+def current_memory():
+    """Return the current (not peak) memory use of this process in bytes,
+    read from /proc where available, otherwise the memory traced by
+    tracemalloc if it is running, otherwise None.
+    Runtime: Θ(1) Space: Θ(1)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return None
+
+
+# ----------------------------------------------------------------------------------
+# RouteStats (Class)
+# ----------------------------------------------------------------------------------
+class RouteStats(object):
+
+    # ------------------------------------------------------------------------------
+    # RouteStats - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self):
+        """Create a new RouteStats instance with every counter at zero.
+        Runtime: Θ(1) Space: Θ(1)"""
+
+        # carrier -> [routes loaded, seconds spent loading]
+        self.loads = {}
+
+        # probe_depths[d] counts carrier lookups that tried d prefixes
+        self.probe_depths = [0] * (MAX_PROBE_DEPTH + 1)
+
+        # carrier -> [lookups, total seconds, per bucket counts], the
+        # last bucket counting lookups slower than every bound
+        self.latency = {}
+
+        # stage name -> [calls, total seconds]
+        self.stages = {}
+
+        # carrier -> redundant routes pruned at load
+        self.pruned = {}
+
+        self.lookups = 0
+
+        # held by every update and export, so counters from concurrent
+        # lookups are never lost
+        self.lock = threading.Lock()
+
+    # ------------------------------------------------------------------------------
+    # RouteStats - Recording Methods
+    # ------------------------------------------------------------------------------
+    def record_load(self, carrier, routes, seconds):
+        """Record that routes routes were loaded for carrier in seconds.
+        Runtime: Θ(1) Space: Θ(1)"""
+        with self.lock:
+            load = self.loads.setdefault(carrier, [0, 0.0])
+            load[0] += routes
+            load[1] += seconds
+
+    def record_prune(self, carrier, routes):
+        """Record that routes redundant routes were pruned from carrier.
+        Runtime: Θ(1) Space: Θ(1)"""
+        with self.lock:
+            self.pruned[carrier] = self.pruned.get(carrier, 0) + routes
+
+    def record_number(self, lookups):
+        """Record one number resolved by lookups, a list of (carrier,
+        probes, seconds) tuples, see record_lookup, taking the lock once.
+        Runtime: Θ(c log b) Space: Θ(1)"""
+        with self.lock:
+            self.lookups += 1
+            for carrier, probes, seconds in lookups:
+                self._record_lookup(carrier, probes, seconds)
+
+    def record_lookup(self, carrier, probes, seconds):
+        """Record one carrier lookup that tried probes prefixes (or None if
+        the backend does not probe by prefix) and took seconds.
+        Runtime: Θ(log b) Space: Θ(1)"""
+        with self.lock:
+            self._record_lookup(carrier, probes, seconds)
+
+    def _record_lookup(self, carrier, probes, seconds):
+        """Record one carrier lookup, see record_lookup, with the lock
+        held.
+        Runtime: Θ(log b) Space: Θ(1)"""
+        if probes is not None:
+            self.probe_depths[min(probes, MAX_PROBE_DEPTH)] += 1
+        latency = self.latency.get(carrier)
+        if latency is None:
+            latency = self.latency[carrier] = [
+                0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+        latency[0] += 1
+        latency[1] += seconds
+        latency[2][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def record_stage(self, stage, seconds):
+        """Record one call of a named stage that took seconds.
+        Runtime: Θ(1) Space: Θ(1)"""
+        with self.lock:
+            totals = self.stages.setdefault(stage, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    @contextmanager
+    def stage(self, stage):
+        """Time the body of a with statement as a call of a named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start)
+
+    # ------------------------------------------------------------------------------
+    # RouteStats - Export Methods
+    # ------------------------------------------------------------------------------
+    def as_dict(self, cache=None, index_cache=None):
+        """Return every counter as a dictionary, including the stats of a
+        LookupCache and of an IndexCache if they are given.
+        Runtime: Θ(c) Space: Θ(c)"""
+        with self.lock:
+            results = {
+                "lookups": self.lookups,
+                "loads": {
+                    carrier: {
+                        "routes": routes,
+                        "seconds": round(seconds, 6),
+                        "routes_per_second": round(routes / seconds)
+                        if seconds else None,
+                    } for carrier, (routes, seconds) in self.loads.items()},
+                "pruned": dict(self.pruned),
+                "probe_depths": {str(depth): count for depth, count
+                                 in enumerate(self.probe_depths) if count},
+                "carrier_latency": {
+                    carrier: {
+                        "lookups": count,
+                        "mean_us": round(total / count * 1e6, 3),
+                        "buckets_us": {
+                            str(bound * 1e6): hits for bound, hits in zip(
+                                LATENCY_BUCKETS + (float("inf"),), buckets)},
+                    } for carrier, (count, total, buckets)
+                    in self.latency.items()},
+                "stages": {stage: {"calls": calls,
+                                   "seconds": round(seconds, 6)}
+                           for stage, (calls, seconds)
+                           in self.stages.items()},
+            }
+        results["cache"] = None if cache is None else cache.stats()
+        results["index_cache"] = None if index_cache is None \
+            else index_cache.stats()
+        results["memory_bytes"] = current_memory()
+        return results
+
+    def to_prometheus(self, cache=None, index_cache=None):
+        """Return every counter in the Prometheus text exposition format,
+        including the stats of a LookupCache and of an IndexCache if they
+        are given.
+        Runtime: Θ(c) Space: Θ(c)"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = METRIC_PREFIX + name
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, kind))
+            for suffix, labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(key, escape_label(
+                    label)) for key, label in labels)
+                lines.append("{}{}{} {}".format(
+                    name, suffix, "{" + label_text + "}" if labels else "",
+                    value))
+
+        with self.lock:
+            self._prometheus_counters(metric)
+
+        if cache is not None:
+            for key, value in cache.stats().items():
+                kind = "gauge" if key in ("numbers", "prefixes") else "counter"
+                metric("cache_" + key + ("" if kind == "gauge" else "_total"),
+                       kind, "Lookup cache " + key.replace("_", " ") + ".",
+                       [("", (), value)])
+
+        if index_cache is not None:
+            stats = index_cache.stats()
+            metric("index_cache_entries", "gauge",
+                   "Built indexes recorded in the index cache.",
+                   [("", (), stats["entries"])])
+            metric("index_cache_hits_total", "counter",
+                   "Carriers loaded from the index cache.",
+                   [("", (), stats["hits"])])
+            metric("index_cache_misses_total", "counter",
+                   "Carriers the index cache had no current index for.",
+                   [("", (), stats["misses"])])
+
+        memory = current_memory()
+        if memory is not None:
+            metric("memory_bytes", "gauge", "Current resident memory.",
+                   [("", (), memory)])
+        return "\n".join(lines) + "\n"
+
+    def _prometheus_counters(self, metric):
+        """Export this instance's own counters through metric, see
+        to_prometheus, with the lock held.
+        Runtime: Θ(c) Space: Θ(c)"""
+        metric("lookups_total", "counter",
+               "Numbers resolved against the route indexes.",
+               [("", (), self.lookups)])
+        metric("routes_loaded_total", "counter", "Routes loaded per carrier.",
+               [("", (("carrier", carrier),), routes)
+                for carrier, (routes, _) in self.loads.items()])
+        metric("load_seconds_total", "counter",
+               "Seconds spent loading routes per carrier.",
+               [("", (("carrier", carrier),), seconds)
+                for carrier, (_, seconds) in self.loads.items()])
+        metric("routes_pruned_total", "counter",
+               "Redundant routes pruned at load per carrier.",
+               [("", (("carrier", carrier),), routes)
+                for carrier, routes in self.pruned.items()])
+
+        samples = []
+        total = 0
+        for depth, count in enumerate(self.probe_depths):
+            total += count
+            bound = "+Inf" if depth == MAX_PROBE_DEPTH else str(depth)
+            samples.append(("_bucket", (("le", bound),), total))
+        samples.append(("_sum", (), sum(depth * count for depth, count
+                                        in enumerate(self.probe_depths))))
+        samples.append(("_count", (), total))
+        metric("probe_depth", "histogram",
+               "Prefixes probed per carrier lookup.", samples)
+
+        samples = []
+        for carrier, (count, seconds, buckets) in self.latency.items():
+            total = 0
+            for bound, hits in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                total += hits
+                samples.append(("_bucket", (("carrier", carrier),
+                                            ("le", str(bound))), total))
+            samples.append(("_sum", (("carrier", carrier),), seconds))
+            samples.append(("_count", (("carrier", carrier),), count))
+        metric("carrier_lookup_seconds", "histogram",
+               "Per carrier lookup latency.", samples)
+
+        metric("stage_seconds_total", "counter", "Seconds spent per stage.",
+               [("", (("stage", stage),), seconds)
+                for stage, (_, seconds) in self.stages.items()])
+        metric("stage_calls_total", "counter", "Calls per stage.",
+               [("", (("stage", stage),), calls)
+                for stage, (calls, _) in self.stages.items()])
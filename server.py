@@ -0,0 +1,356 @@
+# ==================================================================================
+# File: server.py
+#
+# Desc: Call Routing project lookup service. Keeps a CallRoutes instance in
+#       memory behind an asyncio TCP server. Concurrent requests are grouped into
+#       micro-batches which are resolved with a single lookup_many call, and
+#       request latency percentiles are tracked for the STATS command.
+#
+#       Protocol: one request per line, answered in order with one line.
+#         <number> [<number> ...]   ->  <number>,<cost> [<number>,<cost> ...]
+#         STATS                     ->  json latency and batching statistics
+#       A request that fails is answered with ERROR <reason>, and the
+#       connection keeps serving the requests after it.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from random import choice
+import multiprocessing
+import argparse
+import asyncio
+import json
+import time
+import solution
+import trie_solution
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# map of backend name to CallRoutes class
+BACKENDS = {
+    "dict": solution.CallRoutes,
+    "trie": trie_solution.CallRoutes,
+}
+
+
+# ----------------------------------------------------------------------------------
+# LatencyRecorder (Class)
+# ----------------------------------------------------------------------------------
+class LatencyRecorder(object):
+    """Ring buffer of the most recent request latencies."""
+
+    def __init__(self, size=100000):
+        """Create a new LatencyRecorder keeping the last size samples."""
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def record(self, seconds):
+        """Record a single latency sample.
+        Runtime: Θ(1) Space: Θ(1)"""
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentiles(self, points=(50, 90, 99, 99.9)):
+        """Return a dictionary of latency percentile to milliseconds over
+        the recorded samples.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        samples = sorted(self.samples)
+        if not samples:
+            return {}
+        return {"p{}".format(point): round(
+            samples[min(len(samples) - 1, int(len(samples) * point / 100))]
+            * 1000, 4) for point in points}
+
+
+# ----------------------------------------------------------------------------------
+# MicroBatcher (Class)
+# ----------------------------------------------------------------------------------
+class MicroBatcher(object):
+    """Groups concurrent lookups into batches for a bulk lookup function.
+    A batch is flushed once it holds max_batch numbers or max_delay seconds
+    after its first request, whichever comes first. With no delay, a batch
+    holds every request read in the same event loop iteration, which avoids
+    the millisecond granularity of the loop's timers. Batches are resolved
+    on a worker thread, so a large one never stalls the event loop, and
+    requests read meanwhile gather into the next batch."""
+
+    def __init__(self, lookup_many, max_batch=512, max_delay=0):
+        """Create a new MicroBatcher around lookup_many, a function taking
+        a list of numbers and returning a list of (number, cost) tuples."""
+        self.lookup_many = lookup_many
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = []
+        self.pending_numbers = 0
+        self.timer = None
+        self.batches = 0
+        self.batched_numbers = 0
+
+        # lookups may run off the event loop, see CallRoutes, and one
+        # thread resolves batches in the order they were flushed. Batches
+        # being resolved are held here so they are not collected
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.resolving = set()
+
+    async def lookup(self, numbers):
+        """Resolve a list of numbers as part of the next batch and return
+        their (number, cost) tuples.
+        Runtime: Θ(m) Space: Θ(m)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((numbers, future))
+        self.pending_numbers += len(numbers)
+        if self.pending_numbers >= self.max_batch:
+            self.flush()
+        elif self.timer is None and self.max_delay > 0:
+            self.timer = loop.call_later(self.max_delay, self.flush)
+        elif self.timer is None:
+            self.timer = loop.call_soon(self.flush)
+        return await future
+
+    def flush(self):
+        """Start resolving every pending request with one bulk lookup.
+        Runtime: Θ(1) Space: Θ(1)"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        pending, self.pending = self.pending, []
+        self.pending_numbers = 0
+        if pending:
+            task = asyncio.ensure_future(self._resolve(pending))
+            self.resolving.add(task)
+            task.add_done_callback(self.resolving.discard)
+
+    async def _resolve(self, pending):
+        """Resolve a batch of pending requests on the worker thread and
+        hand each its results, or the error the lookup raised.
+        Runtime: Θ(m) Space: Θ(m)"""
+        numbers = [number for request, _ in pending for number in request]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.lookup_many, numbers)
+        except Exception as error:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.batches += 1
+        self.batched_numbers += len(numbers)
+        position = 0
+        for request, future in pending:
+            if not future.done():
+                future.set_result(results[position:position + len(request)])
+            position += len(request)
+
+
+# ----------------------------------------------------------------------------------
+# RouteServer (Class)
+# ----------------------------------------------------------------------------------
+class RouteServer(object):
+
+    # ------------------------------------------------------------------------------
+    # RouteServer - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, calls, max_batch=512, max_delay=0):
+        """Create a new RouteServer for a CallRoutes instance that provides
+        lookup_many."""
+        self.calls = calls
+        self.batcher = MicroBatcher(calls.lookup_many, max_batch, max_delay)
+        self.latency = LatencyRecorder()
+        self.connections = set()
+
+    # ------------------------------------------------------------------------------
+    # RouteServer - Intended Private Methods
+    # ------------------------------------------------------------------------------
+    async def _respond(self, line):
+        """Return the response line for a single request line.
+        Runtime: Θ(m) Space: Θ(m)"""
+        start = time.perf_counter()
+        request = line.decode(errors="replace").split()
+        if request == ["STATS"]:
+            return json.dumps(self.stats())
+        if not request:
+            return ""
+        results = await self.batcher.lookup(request)
+        self.latency.record(time.perf_counter() - start)
+        return " ".join("{},{}".format(number, cost)
+                        for number, cost in results)
+
+    async def _write_responses(self, writer, responses):
+        """Write responses to a connection in request order. A request
+        that failed is answered with an error line rather than ending the
+        loop, which would leave every later request unanswered.
+        Runtime: Θ(1) per response Space: Θ(1)"""
+        while True:
+            response = await responses.get()
+            if response is None:
+                break
+            try:
+                text = await response
+            except Exception as error:
+                text = "ERROR {}".format(
+                    " ".join(str(error).split()) or type(error).__name__)
+            writer.write(text.encode() + b"\n")
+            await writer.drain()
+
+    async def _handle(self, reader, writer):
+        """Serve a single client connection. Requests are started as soon as
+        they are read, so pipelined requests share batches, and answered in
+        the order they arrived.
+        Runtime: Θ(1) per request Space: Θ(1)"""
+        self.connections.add(asyncio.current_task())
+        responses = asyncio.Queue()
+        writing = asyncio.ensure_future(
+            self._write_responses(writer, responses))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await responses.put(asyncio.ensure_future(
+                    self._respond(line)))
+        finally:
+            await responses.put(None)
+            await writing
+            writer.close()
+            self.connections.discard(asyncio.current_task())
+
+    # ------------------------------------------------------------------------------
+    # RouteServer - Public Methods
+    # ------------------------------------------------------------------------------
+    async def start(self, host="127.0.0.1", port=8400):
+        """Start listening and return the asyncio server.
+        Runtime: Θ(1) Space: Θ(1)"""
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def close(self, listener):
+        """Stop listening and wait for open connections to finish.
+        Runtime: Θ(1) Space: Θ(1)"""
+        listener.close()
+        await listener.wait_closed()
+        await asyncio.gather(*self.connections)
+
+    def stats(self):
+        """Return a dictionary of request latency and batching statistics.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        batches = self.batcher.batches
+        return {
+            "requests": self.latency.count,
+            "latency_ms": self.latency.percentiles(),
+            "batches": batches,
+            "mean_batch_size": round(
+                self.batcher.batched_numbers / batches, 2) if batches else 0,
+        }
+
+
+# ----------------------------------------------------------------------------------
+# Stand-in Client Function
+# ----------------------------------------------------------------------------------
+async def run_client(numbers, requests=10000, rate=5000, connections=16,
+                     host="127.0.0.1", port=8400):
+    """Send requests single number lookups at a steady aggregate rate per
+    second, spread over several pipelined connections, and return client
+    side latency percentiles and achieved throughput.
+    Runtime: Θ(n) Space: Θ(n)"""
+    latency = LatencyRecorder(requests)
+    interval = connections / float(rate)
+
+    async def connection(count):
+        reader, writer = await asyncio.open_connection(host, port)
+        sent = deque()
+
+        async def receive():
+            for _ in range(count):
+                await reader.readline()
+                latency.record(time.perf_counter() - sent.popleft())
+
+        receiving = asyncio.ensure_future(receive())
+        next_send = time.perf_counter()
+        for _ in range(count):
+            sent.append(time.perf_counter())
+            writer.write(choice(numbers).encode() + b"\n")
+            await writer.drain()
+            # open loop: keep to the schedule regardless of responses
+            next_send += interval
+            await asyncio.sleep(max(0, next_send - time.perf_counter()))
+        await receiving
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[connection(requests // connections)
+                           for _ in range(connections)])
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": latency.count,
+        "requests_per_second": round(latency.count / elapsed, 1),
+        "latency_ms": latency.percentiles(),
+    }
+
+
+def client_process(results, *args):
+    """Run the stand-in client in its own process, so it does not share
+    an event loop or the GIL with the server, and put its results on the
+    results queue."""
+    results.put(asyncio.run(run_client(*args)))
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+async def main(args):
+    """Load carriers, start the server and optionally run the stand-in
+    client against it."""
+    calls = BACKENDS[args.backend]()
+    for carrier in args.carrier:
+        name, file_name = carrier.split("=", 1)
+        calls.add_route_costs(name, file_name)
+    server = RouteServer(calls, args.max_batch, args.max_delay / 1e6)
+    listener = await server.start(args.host, args.port)
+    print("Serving {:,} route costs on {}:{}".format(
+        calls.route_costs, args.host, args.port))
+    if args.bench:
+        numbers = calls._read_phone_numbers(args.bench)
+        results = multiprocessing.Queue()
+        client = multiprocessing.Process(target=client_process, args=(
+            results, numbers, args.requests, args.rate, args.connections,
+            args.host, args.port))
+        client.start()
+        client_stats = await asyncio.get_running_loop().run_in_executor(
+            None, results.get)
+        client.join()
+        await server.close(listener)
+        print(json.dumps({"client": client_stats, "server": server.stats()},
+                         indent=2))
+        return
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve route cost lookups.")
+    parser.add_argument("--carrier", action="append", default=[],
+                        metavar="NAME=FILE", help="carrier route costs file")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="trie")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--max-batch", type=int, default=512)
+    parser.add_argument("--max-delay", type=float, default=0,
+                        help="micro-batch window in microseconds, 0 to batch "
+                             "requests read in the same loop iteration")
+    parser.add_argument("--bench", metavar="NUMBERS_FILE",
+                        help="run the stand-in client with numbers from "
+                             "this file, print statistics and exit")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--rate", type=int, default=5000,
+                        help="stand-in client requests per second")
+    parser.add_argument("--connections", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,423 @@
+# ==================================================================================
+# File: snapshot_solution.py
+#
+# Desc: Call Routing project binary snapshot solution file. Carrier route files
+#       are compiled once into a sorted, fixed-width binary snapshot which is
+#       then memory mapped and binary searched with zero parsing. Loading is
+#       near instant regardless of the number of routes, and every process
+#       that maps the same snapshot shares one copy in the page cache.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from bisect import bisect_left
+import heapq
+from random import randint
+import struct
+import time
+import os
+import mmap
+from mm_solution import get_mem
+from solution import parse_cost, cost_dollars, data_path, TOP_K
+import index_cache
+from route_prune import prune_redundant
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# snapshot header: magic, version, carrier count, record count, records offset
+HEADER = struct.Struct('<8sIIQQ')
+MAGIC = b'CRSNAP\x00\x00'
+VERSION = 3
+
+# length prefixed carrier name
+NAME = struct.Struct('<H')
+
+# fixed width record: nul padded prefix key, int64 cost in micro-dollars,
+# carrier id. Costs take 64 bits, as any cost the other backends accept
+# must fit, and 32 bits of micro-dollars stop at $2,147.48
+KEY_SIZE = 16
+RECORD = struct.Struct('<{}sqH6x'.format(KEY_SIZE))
+VALUE = struct.Struct('<qH')
+
+
+# ----------------------------------------------------------------------------------
+# Snapshot Compiler Function
+# ----------------------------------------------------------------------------------
+def compile_snapshot(snapshot_file_name, *carrier_route_costs, prune=False):
+    """Compile carrier route costs files into a binary snapshot.
+    carrier_route_costs is a variadic parameter, each of which should be a
+    tuple of ('carrier name', 'file name'). Duplicate prefixes within a
+    carrier keep the lowest cost. With prune, redundant routes are left out,
+    see route_prune. Return a tuple of the number of records written and
+    the number of redundant routes pruned.
+    Runtime: Θ(n log n) Space: Θ(n)"""
+    records = []
+    names = []
+    pruned = 0
+    for carrier_id, (carrier, file_name) in enumerate(carrier_route_costs):
+        names.append(carrier.encode())
+        costs = {}
+        with open(data_path(file_name)) as f:
+            for line in f:
+                prefix, cost = line.strip().split(',')
+                cost = parse_cost(cost)
+                if prefix not in costs or cost < costs[prefix]:
+                    costs[prefix] = cost
+        if prune:
+            pruned += prune_redundant(costs)
+        for prefix, cost in costs.items():
+            key = prefix.encode()
+            if len(key) > KEY_SIZE:
+                raise ValueError("prefix {} in {} is longer than {} "
+                                 "bytes".format(prefix, file_name, KEY_SIZE))
+            records.append((key.ljust(KEY_SIZE, b'\x00'), carrier_id, cost))
+
+    # records are sorted by key, then carrier id, so that every carrier's
+    # route for a prefix sits in one contiguous run
+    records.sort()
+
+    header_size = HEADER.size + sum(NAME.size + len(name) for name in names)
+    buf = bytearray(header_size + RECORD.size * len(records))
+    HEADER.pack_into(buf, 0, MAGIC, VERSION, len(names), len(records),
+                     header_size)
+    pos = HEADER.size
+    for name in names:
+        NAME.pack_into(buf, pos, len(name))
+        pos += NAME.size
+        buf[pos:pos + len(name)] = name
+        pos += len(name)
+    pack_into = RECORD.pack_into
+    for key, carrier_id, cost in records:
+        pack_into(buf, pos, key, cost, carrier_id)
+        pos += RECORD.size
+
+    # write to a temporary file and rename so readers never map a
+    # partially written snapshot
+    tmp_file_name = data_path(snapshot_file_name) + '.tmp'
+    with open(tmp_file_name, 'wb') as f:
+        f.write(buf)
+    os.replace(tmp_file_name, data_path(snapshot_file_name))
+    return len(records), pruned
+
+
+def ensure_snapshot(snapshot_file_name, *carrier_route_costs, force=False,
+                    prune=False):
+    """Compile carrier route costs files into a binary snapshot unless
+    snapshot_file_name was already compiled from exactly these carriers,
+    with the same prune setting and snapshot version, and none of their
+    files has changed since, as recorded in the index cache, or force is
+    set. Return the result of compile_snapshot if the snapshot was
+    compiled, otherwise None.
+    Runtime: Θ(c), or Θ(n log n) to compile Space: Θ(c), or Θ(n)"""
+    cache = index_cache.IndexCache()
+    options = {"prune": prune, "version": VERSION}
+    if not force and cache.is_current("snapshot", snapshot_file_name,
+                                      carrier_route_costs, options):
+        return None
+    # fingerprint the sources before compiling, so a file changed while
+    # compiling is picked up by the next call
+    sources = [index_cache.fingerprint(data_path(file_name))
+               for _, file_name in carrier_route_costs]
+    compiled = compile_snapshot(snapshot_file_name, *carrier_route_costs,
+                                prune=prune)
+    cache.record("snapshot", snapshot_file_name, carrier_route_costs, sources,
+                 options)
+    return compiled
+
+
+# ----------------------------------------------------------------------------------
+# SnapshotKeys (Class)
+# ----------------------------------------------------------------------------------
+class SnapshotKeys(object):
+    """Read only sequence view of the record keys in a mapped snapshot, so
+    that the bisect module can search it directly."""
+
+    def __init__(self, mm, offset, count):
+        """Create a view of count keys starting at offset in mm."""
+        self.mm = mm
+        self.offset = offset
+        self.count = count
+
+    def __getitem__(self, index):
+        """Return the key of record index.
+        Runtime: Θ(1) Space: Θ(1)"""
+        pos = self.offset + index * RECORD.size
+        return self.mm[pos:pos + KEY_SIZE]
+
+    def __len__(self):
+        """Return the number of records.
+        Runtime: Θ(1) Space: Θ(1)"""
+        return self.count
+
+
+# ----------------------------------------------------------------------------------
+# MappedSnapshot (Class)
+# ----------------------------------------------------------------------------------
+class MappedSnapshot(object):
+    """One mapped snapshot file. It never changes once mapped, so any
+    number of threads can search it without locking."""
+
+    # ------------------------------------------------------------------------------
+    # MappedSnapshot - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, snapshot_file_name):
+        """Map a snapshot produced by compile_snapshot, nothing is parsed.
+        Runtime: Θ(c) Space: Θ(c)"""
+        self.file = open(data_path(snapshot_file_name), 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, prot=mmap.PROT_READ)
+
+        # read the header and carrier names
+        magic, version, carrier_count, self.route_costs, offset = \
+            HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a version {} route snapshot".format(
+                snapshot_file_name, VERSION))
+        self.carriers = []
+        pos = HEADER.size
+        for _ in range(carrier_count):
+            (size,) = NAME.unpack_from(self.mm, pos)
+            pos += NAME.size
+            self.carriers.append(self.mm[pos:pos + size].decode())
+            pos += size
+
+        # records are addressed through a sorted key view
+        self.records_offset = offset
+        self.keys = SnapshotKeys(self.mm, offset, self.route_costs)
+
+    # ------------------------------------------------------------------------------
+    # MappedSnapshot - Public Methods
+    # ------------------------------------------------------------------------------
+    def longest_matches(self, phone_number):
+        """Return a dictionary mapping the id of each carrier with a route
+        for a number to a tuple of its longest match's cost in micro-dollars
+        and prefix length.
+        Runtime: Θ(k log n) Space: Θ(c)"""
+        keys = self.keys
+        mm = self.mm
+        offset = self.records_offset
+        found = {}
+        for i in range(min(len(phone_number), KEY_SIZE), 1, -1):
+            key = phone_number[:i].encode().ljust(KEY_SIZE, b'\x00')
+            index = bisect_left(keys, key)
+            while index < len(keys) and keys[index] == key:
+                cost, carrier_id = VALUE.unpack_from(
+                    mm, offset + index * RECORD.size + KEY_SIZE)
+                # longer prefixes are tried first, so the first route
+                # seen for a carrier is its longest match
+                if carrier_id not in found:
+                    found[carrier_id] = (cost, i)
+                index += 1
+            if len(found) == len(self.carriers):
+                break
+        return found
+
+    def close(self):
+        """Release the mapped snapshot and close its file.
+        Runtime: Θ(1) Space: Θ(1)"""
+        self.mm.close()
+        self.file.close()
+
+
+# ----------------------------------------------------------------------------------
+# CallRoutes (Class)
+# ----------------------------------------------------------------------------------
+class CallRoutes(object):
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, snapshot_file_name, numbers_file_name=None):
+        """Create a new CallRoutes instance by mapping a snapshot produced
+        by compile_snapshot. numbers_file_name optionally names a phone
+        numbers file to read. Lookups may be made from any number of
+        threads, see reload."""
+
+        # the snapshot lookups search, swapped whole by reload
+        self.snapshot_file_name = snapshot_file_name
+        self.mapped = MappedSnapshot(snapshot_file_name)
+
+        self.numbers = []
+        if numbers_file_name is not None:
+            self.numbers = self._read_numbers(numbers_file_name)
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Destructor
+    # ------------------------------------------------------------------------------
+    def __del__(self):
+        """Frees the mapped snapshot and closes the snapshot file before
+        instance destruction."""
+        if hasattr(self, 'mapped'):
+            self.mapped.close()
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Intended Private Methods
+    # ------------------------------------------------------------------------------
+    def _read_numbers(self, file_name):
+        """Read phone numbers into a list and return the result.
+        Runtime: Θ(n) Space: Θ(n)"""
+        with open(data_path(file_name)) as f:
+            return f.read().splitlines()
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Public Methods
+    # ------------------------------------------------------------------------------
+    def reload(self, snapshot_file_name=None):
+        """Map snapshot_file_name, or the snapshot this instance was created
+        with if None, and publish it to lookups in a single assignment.
+        compile_snapshot renames a finished snapshot over the old one, so
+        reloading after a recompile maps the new version, while lookups
+        still searching the previous mapping keep it until they finish and
+        the garbage collector releases it.
+        Runtime: Θ(c) Space: Θ(c)"""
+        if snapshot_file_name is None:
+            snapshot_file_name = self.snapshot_file_name
+        self.mapped = MappedSnapshot(snapshot_file_name)
+        self.snapshot_file_name = snapshot_file_name
+
+    def get_costs(self, phone_number):
+        """Return costs from each carrier for a number as a list of
+        (carrier, cost) tuples, or 0 if no carrier has a route.
+        Runtime: Θ(k log n) Space: Θ(c)"""
+        mapped = self.mapped
+        found = mapped.longest_matches(phone_number)
+        if not found:
+            return 0
+        return [(mapped.carriers[carrier_id],
+                 cost_dollars(found[carrier_id][0]))
+                for carrier_id in sorted(found)]
+
+    def get_top_routes(self, phone_number, k=TOP_K):
+        """Return a failover list of up to k (carrier, cost, prefix) tuples
+        for a number, cheapest first, where prefix is the carrier's own
+        longest matching route. The list is empty if no carrier has a route.
+        Runtime: Θ(k log n + c log k) Space: Θ(c)"""
+        mapped = self.mapped
+        found = mapped.longest_matches(phone_number)
+        ranked = heapq.nsmallest(k, ((cost, carrier_id, length) for
+                                     carrier_id, (cost, length) in
+                                     found.items()))
+        return [(mapped.carriers[carrier_id], cost_dollars(cost),
+                 phone_number[:length])
+                for cost, carrier_id, length in ranked]
+
+    def get_best_route(self, phone_number):
+        """Return (carrier, cost) of the least cost route for a number,
+        or 0 if no carrier has a route for it.
+        Runtime: Θ(k log n) Space: Θ(c)"""
+        costs = self.get_costs(phone_number)
+        if costs == 0:
+            return 0
+        return min(costs, key=lambda route: route[1])
+
+    def lookup_many(self, numbers):
+        """Return a list of (number, cost) tuples in input order, where cost
+        is the least cost in dollars over all carriers or 0 if no carrier
+        has a route. The whole batch searches the same mapped snapshot.
+        Runtime: Θ(mk log n) Space: Θ(m)"""
+        mapped = self.mapped
+        results = []
+        for number in numbers:
+            found = mapped.longest_matches(number)
+            results.append((number, cost_dollars(min(
+                cost for cost, _ in found.values())) if found else 0))
+        return results
+
+    def yield_costs(self):
+        """Return an iterator to iterate over each phone number in costs.
+        Runtime: Θ(1) Space: Θ(1)"""
+        for number in self.numbers:
+            yield "{} : {}".format(number, self.get_costs(number))
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Public Properties
+    # ------------------------------------------------------------------------------
+
+    @property
+    def carriers(self):
+        """Returns the carrier names in the mapped snapshot.
+        Runtime: Θ(1) Space: Θ(1)"""
+        return self.mapped.carriers
+
+    @property
+    def route_costs(self):
+        """Returns the number of route costs in the mapped snapshot.
+        Runtime: Θ(1) Space: Θ(1)"""
+        return self.mapped.route_costs
+
+
+# ------------------------------------------------------------------------------
+# Main Entry Point
+# ------------------------------------------------------------------------------
+if __name__ == '__main__':
+    start = time.time()
+    print("\nChecking snapshot please wait...")
+    if ensure_snapshot("routes.snap",
+                       ("carrierA", "route-costs-3.txt"),
+                       ("carrierB", "route-costs-10.txt"),
+                       ("carrierC", "route-costs-100.txt"),
+                       ("carrierD", "route-costs-600.txt"),
+                       ("carrierE", "route-costs-35000.txt"),
+                       ("carrierF", "route-costs-106000.txt"),
+                       ("carrierG", "route-costs-1000000.txt"),
+                       ("carrierH", "route-costs-10000000.txt")):
+        print("Compiled in {} seconds.".format(round(time.time()-start, 4)))
+    start = time.time()
+    print("\nInitializing please wait...")
+    calls = CallRoutes("routes.snap", "phone-numbers-10000.txt")
+    load_time = round(time.time()-start, 4)
+    print("\nInitialized {:,} route costs in {} seconds.".format(
+        calls.route_costs, load_time))
+    get_mem()
+    while(True):
+        print("\n==========================================")
+        print("|              Main Menu                 |")
+        print("==========================================")
+        print("\nPlease select an option below:")
+        print("1. Print results for 5 random numbers.")
+        print("2. Get results for a new number.")
+        print("3. Iterate over results one-by-one.")
+        print("4. Display load time and memory statistics.")
+        print("5. Exit the program.")
+        choice = input("\nPlease enter a number: ")
+        try:
+            choice = int(choice)
+        except Exception:
+            break
+        if choice == 1:
+            start = time.time()
+            for _ in range(5):
+                idx = randint(0, len(calls.numbers)-1)
+                print("\n{} : {}".format(
+                    calls.numbers[idx], calls.get_costs(calls.numbers[idx])))
+            complete_time = round(time.time()-start, 4)
+            print("\nCompleted in {} seconds.".format(
+                complete_time))
+            print("Average lookup time per entry: {} seconds.".format(
+                round(complete_time/5, 4)))
+
+        elif choice == 2:
+            new_number = input("\nEnter full number with prefix: ")
+            print("\n{} : {}".format(
+                new_number, calls.get_costs(new_number)))
+        elif choice == 3:
+            costs_gen = calls.yield_costs()
+            while(True):
+                opt = input(
+                    "\nPress any key to get the next result or q to go back to main menu: ")
+                if opt == "q":
+                    break
+                print("\n{}".format(next(costs_gen)))
+        elif choice == 4:
+            print("\n{:,} route costs were loaded in {} seconds.".format(
+                calls.route_costs, load_time))
+            get_mem()
+        else:
+            break
+    print("\nGoodbye!")
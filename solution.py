@@ -6,17 +6,73 @@
 #       a realistic scenario, the server would stay running with the route costs
 #       in memory so this tradoff would be unnoticed by the end-user.
 #
+#       Lookups may run from many threads at once without locking. Every index
+#       is immutable once published: writers build a carrier's new index beside
+#       the live one and publish it by swapping in a new routes dictionary, so
+#       a lookup that read self.routes once works on a consistent snapshot
+#       however many reloads happen meanwhile.
+#
 # Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
 # ==================================================================================
 
 # ----------------------------------------------------------------------------------
 # Imports
 # ----------------------------------------------------------------------------------
+from bisect import bisect_left, bisect_right
+import heapq
 from random import randint
 import time
 import resource
 import platform
 import os
+import threading
+import parallel_loader
+import index_cache
+from route_cache import LookupCache, MISSING
+from route_stats import RouteStats
+from prefix_filter import RouteDict, MIN_PREFIX_LENGTH
+from route_prune import prune_redundant
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# costs are held as integer micro-dollars, so that comparisons are exact and
+# each distinct cost needs only one small int object
+MICROS = 1000000
+
+# default number of carriers in a ranked failover list, see get_top_routes
+TOP_K = 3
+
+# directory that relative route costs and phone numbers file names are
+# resolved against, overridden by the CALLROUTE_DATA environment variable
+DATA_DIR = os.environ.get('CALLROUTE_DATA', 'data')
+
+
+# ----------------------------------------------------------------------------------
+# Path Functions
+# ----------------------------------------------------------------------------------
+def data_path(file_name):
+    """Return the path of file_name in the data directory. Absolute file
+    names are returned unchanged.
+    Runtime: Θ(1) Space: Θ(1)."""
+    return os.path.join(DATA_DIR, file_name)
+
+
+# ----------------------------------------------------------------------------------
+# Cost Conversion Functions
+# ----------------------------------------------------------------------------------
+def parse_cost(text):
+    """Parse a cost in dollars into integer micro-dollars.
+    Runtime: Θ(1) Space: Θ(1)."""
+    return int(round(float(text) * MICROS))
+
+
+def cost_dollars(micros):
+    """Return integer micro-dollars as a float number of dollars.
+    Runtime: Θ(1) Space: Θ(1)."""
+    return micros / MICROS
 
 
 # ----------------------------------------------------------------------------------
@@ -32,52 +88,249 @@ class CallRoutes(object):
         """Create a new CallRoutes instance.
         Runtime: Θ(1) Space: Θ(1)."""
 
-        # total number of route costs
-        self.route_costs = 0
-
         # routes is a dictionary of dictionaries mapping carrier names
-        # to a costs dictionary for that carrier
+        # to a costs dictionary for that carrier. It is never changed once
+        # published, see _set_route_costs
         self.routes = {}
 
+        # held by writers publishing routes, never by lookups
+        self._write_lock = threading.RLock()
+
+        # (index, prefixes, costs) per carrier for bulk lookups, where
+        # prefixes and costs are the index's routes as sorted lists,
+        # built on first use
+        self.sorted_routes = {}
+
+        # optional cache of resolved numbers, see enable_cache
+        self.cache = None
+
+        # optional hot path instrumentation, see enable_stats
+        self.stats = None
+
+        # optional persistent cache of built indexes, see
+        # enable_index_cache
+        self.index_cache = None
+
+        # whether redundant routes are pruned at load, and how many were
+        # pruned per carrier, see enable_pruning
+        self.prune = False
+        self.pruned_routes = {}
+
     # ------------------------------------------------------------------------------
     # CallRoutes - Intended Private Methods
     # ------------------------------------------------------------------------------
 
     def _read_route_costs(self, file_name):
-        """Read route costs file into a dictionary and return the result.
+        """Read route costs file into a RouteDict of prefix to cost in
+        micro-dollars and return the result.
         Runtime: Θ(n) Space: Θ(n)"""
 
         # create a results dictionary
-        results = {}
+        results = RouteDict()
+
+        # distinct costs, so every route with the same cost shares
+        # one int object
+        interned = {}
 
         # open the specified file
-        with open('data/' + file_name) as route_costs_file:
+        with open(data_path(file_name)) as route_costs_file:
 
             # iterate over each line in the open file
             for line in route_costs_file:
                 # strip the line of \n characters and split
                 # the line by commas into a list
                 row = line.strip().split(',')
-                # if the route is already in dictionary
-                # and the current route has a lower price,
-                # or if the route is not in dictionary
-                if (row[0] in results and results[row[0]] > row[1]) \
-                        or (row[0] not in results):
-                    # only increment route_costs for new entries
-                    if row[0] not in results:
-                        self.route_costs += 1
-                    # update/insert the route cost
-                    results[row[0]] = row[1]
-
-        # return the results dictionary
+                cost = parse_cost(row[1])
+                cost = interned.setdefault(cost, cost)
+                # insert new routes, or keep the lower price
+                # of a duplicate route
+                if row[0] not in results or cost < results[row[0]]:
+                    results[row[0]] = cost
+
+        # return the results dictionary, recording its prefix lengths
+        return results.index_lengths()
+
+    def _read_index(self, file_name):
+        """Read a route costs file into this backend's index. Return a
+        tuple of the index and the number of redundant routes pruned from
+        it, which is 0 unless pruning is enabled.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        costs_index = self._read_route_costs(file_name)
+        if not self.prune:
+            return costs_index, 0
+        costs = costs_index if isinstance(costs_index, dict) \
+            else dict(costs_index.items())
+        pruned = prune_redundant(costs)
+        return self._build_index(costs), pruned
+
+    def _load_route_costs(self, file_name):
+        """Return a tuple of the index for a route costs file and the number
+        of redundant routes pruned from it, from the index cache if it holds
+        one built from the file as it is now, otherwise read from the file
+        and saved to the cache.
+        Runtime: Θ(n) Space: Θ(n)"""
+        cache = self.index_cache
+        if cache is None:
+            return self._read_index(file_name)
+        kind = self._index_kind()
+        loaded = cache.load(kind, file_name)
+        if loaded is not None:
+            return loaded
+        source = index_cache.fingerprint(data_path(file_name))
+        loaded = self._read_index(file_name)
+        cache.save(kind, file_name, loaded, source)
+        return loaded
+
+    def _index_kind(self):
+        """Return the name index caches file this backend's indexes under,
+        as pruned and unpruned indexes differ.
+        Runtime: Θ(1) Space: Θ(1)."""
+        return "{}.{}{}".format(type(self).__module__, type(self).__name__,
+                                ":pruned" if self.prune else "")
+
+    def _record_pruned(self, carrier, pruned):
+        """Record that pruned redundant routes were dropped from a carrier
+        at load, if pruning is enabled.
+        Runtime: Θ(1) Space: Θ(1)."""
+        if not self.prune:
+            return
+        self.pruned_routes[carrier] = pruned
+        if self.stats is not None:
+            self.stats.record_prune(carrier, pruned)
+
+    def _build_index(self, costs_dict):
+        """Return the index for a carrier from a dictionary of prefix to
+        cost in micro-dollars. A RouteDict recording its prefix lengths is
+        the index for this backend.
+        Runtime: Θ(n) Space: Θ(1)."""
+        if not isinstance(costs_dict, RouteDict):
+            costs_dict = RouteDict(costs_dict)
+        return costs_dict.index_lengths()
+
+    def _set_route_costs(self, carrier, costs_index, changes=None):
+        """Replace the routes of a carrier with costs_index. A new routes
+        dictionary is swapped in with a single assignment, so lookups
+        iterating the old one are never disturbed, and writers publish one
+        at a time so no carrier is lost between two swaps. Sorted routes
+        in use for the carrier are rebuilt first, so bulk lookups do not
+        all stall sorting them after the swap. changes, given when a delta
+        is applied, maps each prefix that differs from the carrier's
+        previous index to its new cost or None, so backends may patch
+        indexes derived from it rather than build them again.
+        Runtime: Θ(c), or Θ(n log n) with sorted routes Space: Θ(c)."""
+        with self._write_lock:
+            if carrier in self.sorted_routes:
+                self._sorted_routes(carrier, costs_index)
+            routes = dict(self.routes)
+            routes[carrier] = costs_index
+            self.routes = routes
+            if self.cache is not None:
+                self.cache.invalidate(carrier)
+
+    def _read_route_delta(self, file_name):
+        """Read a route delta file into a dictionary mapping each changed
+        prefix to its new cost in micro-dollars, or to None if the route is
+        removed. Each line is either 'prefix,cost' to add or change a
+        route, or 'prefix,-' to remove it. Later lines win.
+        Runtime: Θ(n) Space: Θ(n)."""
+        changes = {}
+        with open(data_path(file_name)) as delta_file:
+            for line in delta_file:
+                row = line.strip().split(',')
+                if len(row) != 2:
+                    continue
+                changes[row[0]] = None if row[1] == '-' \
+                    else parse_cost(row[1])
+        return changes
+
+    def _apply_delta(self, costs_dict, changes):
+        """Return a copy of costs_dict with changes applied. The original
+        is left untouched for lookups still using it.
+        Runtime: Θ(n + d) Space: Θ(n)."""
+        results = RouteDict(costs_dict)
+        for prefix, cost in changes.items():
+            if cost is None:
+                results.pop(prefix, None)
+            else:
+                results[prefix] = cost
+        return results.index_lengths()
+
+    def _match(self, costs_dict, number):
+        """Return the cost of the longest prefix of number in costs_dict,
+        or None if no prefix matches.
+        Runtime: Θ(k) Space: Θ(1)."""
+
+        # trim numbers off the right side of the prefix until
+        # we find a match, only trying lengths the carrier has
+        size = len(number)
+        for index in costs_dict.lengths:
+            # if the trimmed number is in the costs dictionary
+            # we found the longest matching prefix
+            if index <= size and number[:index] in costs_dict:
+                return costs_dict[number[:index]]
+        return None
+
+    def _match_route(self, costs_dict, number):
+        """Return a tuple of the length of the longest prefix of number in
+        costs_dict and its cost, or None if no prefix matches.
+        Runtime: Θ(k) Space: Θ(1)."""
+        size = len(number)
+        for index in costs_dict.lengths:
+            if index <= size and number[:index] in costs_dict:
+                return index, costs_dict[number[:index]]
+        return None
+
+    def _probe(self, costs_dict, number):
+        """Return a tuple of the cost of the longest prefix of number in
+        costs_dict (or None) and the number of prefixes probed, or None
+        for the count if the backend does not probe prefix by prefix.
+        Runtime: Θ(k) Space: Θ(1)."""
+        size = len(number)
+        probes = 0
+        for index in costs_dict.lengths:
+            if index <= size:
+                probes += 1
+                if number[:index] in costs_dict:
+                    return costs_dict[number[:index]], probes
+        return None, probes
+
+    def _get_costs_instrumented(self, routes, number):
+        """Return the (carrier, cost) results of get_costs for a number in
+        a routes snapshot, recording probe depth and latency per carrier in
+        self.stats.
+        Runtime: Θ(nk) Space: Θ(n)."""
+        clock = time.perf_counter
+        results = []
+        lookups = []
+        for carrierName, costsIndex in routes.items():
+            start = clock()
+            cost, probes = self._probe(costsIndex, number)
+            lookups.append((carrierName, probes, clock() - start))
+            if cost is not None:
+                results.append((carrierName, cost_dollars(cost)))
+        self.stats.record_number(lookups)
         return results
 
+    def _sorted_routes(self, carrier, costs_index):
+        """Return parallel (prefixes, costs) lists of the routes in a
+        carrier's costs_index sorted by prefix, building them on first use.
+        Lists built from an index that has since been replaced are never
+        returned, even if a lookup that raced the reload stored them.
+        Runtime: Θ(n log n) Space: Θ(n)."""
+        entry = self.sorted_routes.get(carrier)
+        if entry is None or entry[0] is not costs_index:
+            routes = sorted(costs_index.items())
+            entry = (costs_index, [route[0] for route in routes],
+                     [route[1] for route in routes])
+            self.sorted_routes[carrier] = entry
+        return entry[1], entry[2]
+
     def _read_phone_numbers(self, file_name):
         """Read phone numbers into a list and return the result.
         Runtime: Θ(n) Space: Θ(1)"""
 
         # open the specified file
-        with open('data/'+file_name) as phone_numbers_file:
+        with open(data_path(file_name)) as phone_numbers_file:
             # return a list of lines in the file,
             # excluding the \n character
             return phone_numbers_file.read().splitlines()
@@ -89,7 +342,7 @@ class CallRoutes(object):
 
         # get list of files in data dir that match filter
         files = [fileName for fileName in os.listdir(
-            "data/") if filter in fileName]
+            DATA_DIR) if filter in fileName]
 
         print("\n\x1b[0;32m{:=^50}".format("="))
         print("|\x1b[0;36m{:^48}\x1b[0;32m|".format("Load a File"))
@@ -125,24 +378,35 @@ class CallRoutes(object):
         iterations needed to find a match from trimming off 
         the end."""
 
+        # serve repeated numbers from the cache, noting its generation
+        # before reading routes so a result from replaced routes is
+        # never cached
+        cache = self.cache
+        if cache is not None:
+            cached = cache.get_number(number)
+            if cached is not MISSING:
+                return list(cached) if cached else 0
+            generation = cache.generation
+
         # create a results list
         results = []
+        routes = self.routes
+
+        if self.stats is not None:
+            results = self._get_costs_instrumented(routes, number)
 
         # iterate for each carrier in routes dictionary
-        for carrierName, costsDict in self.routes.items():
-            # trim numbers off the right side of the prefix until
-            # we find a match
-            for index in range(len(number), 1, -1):
-                # if the trimmed number is in current carrier's
-                # costs dictionary
-                if number[:index] in costsDict:
-                    # append a tuple of (carrier, cost) to result
-                    # list
-                    results.append((carrierName, costsDict[number[:index]]))
-                    # we found the longest matching prefix,
-                    # break from inner loop and restart the
-                    # process for the next carrier
-                    break
+        else:
+            for carrierName, costsIndex in routes.items():
+                # find the longest matching prefix for this carrier
+                cost = self._match(costsIndex, number)
+                if cost is not None:
+                    # append a tuple of (carrier, cost in dollars)
+                    # to result list
+                    results.append((carrierName, cost_dollars(cost)))
+
+        if cache is not None:
+            cache.put_number(number, tuple(results), generation)
 
         # if prefix was not found for any carriers, return 0
         if len(results) == 0:
@@ -151,6 +415,208 @@ class CallRoutes(object):
         # return the results list
         return results
 
+    def get_top_routes(self, number, k=TOP_K):
+        """Return a failover list of up to k (carrier, cost, prefix) tuples
+        for a number, cheapest first, where prefix is the carrier's own
+        longest matching route. The list is empty if no carrier has a
+        route. Matches stream through a heap of the k cheapest, rather than
+        sorting every carrier's result.
+        Runtime: Θ(ck + c log k) Space: Θ(k)."""
+        matches = ((match[1], carrier_id, carrier, match[0])
+                   for carrier_id, (carrier, match) in enumerate(
+                       (carrier, self._match_route(costs_index, number))
+                       for carrier, costs_index in self.routes.items())
+                   if match is not None)
+        return [(carrier, cost_dollars(cost), number[:length])
+                for cost, _, carrier, length in heapq.nsmallest(k, matches)]
+
+    def enable_cache(self, size=100000):
+        """Cache up to size resolved numbers in front of get_costs. The
+        cache is invalidated whenever a carrier is (re)loaded.
+        Runtime: Θ(1) Space: Θ(size)."""
+        self.cache = LookupCache(size, prefix_size=0)
+
+    def enable_index_cache(self, cache_dir=index_cache.CACHE_DIR):
+        """Persist each carrier's built index in cache_dir, in the data
+        directory, keyed on its route costs file's size, mtime and content
+        hash. Carriers whose files are unchanged then load from the cache
+        rather than being parsed again. Return the IndexCache.
+        Runtime: Θ(e) Space: Θ(e)."""
+        self.index_cache = index_cache.IndexCache(cache_dir)
+        return self.index_cache
+
+    def enable_pruning(self):
+        """Prune redundant routes, those costing the same as their nearest
+        shorter route, from carriers loaded from now on. Costs returned
+        for every number are unchanged, though get_top_routes reports the
+        shorter route a pruned one fell through to. Pruned carriers cannot
+        take route deltas, as a delta to an ancestor would also reprice
+        its pruned routes; reload them instead. See get_pruned.
+        Runtime: Θ(1) Space: Θ(1)."""
+        self.prune = True
+
+    def get_pruned(self):
+        """Return a dictionary of the number of redundant routes pruned
+        per carrier and in total, or None if pruning is not enabled.
+        Runtime: Θ(c) Space: Θ(c)."""
+        if not self.prune:
+            return None
+        return {"carriers": dict(self.pruned_routes),
+                "total": sum(self.pruned_routes.values())}
+
+    def enable_stats(self):
+        """Start recording load rates, probe depths, per carrier lookup
+        latency and stage timings, see get_stats. Return the RouteStats.
+        Runtime: Θ(1) Space: Θ(1)."""
+        self.stats = RouteStats()
+        return self.stats
+
+    def get_stats(self):
+        """Return recorded stats, lookup and index cache stats and current
+        memory as a dictionary, or None if stats are not enabled.
+        Runtime: Θ(n) Space: Θ(n)."""
+        if self.stats is None:
+            return None
+        return self.stats.as_dict(self.cache, self.index_cache)
+
+    def get_stats_prometheus(self):
+        """Return recorded stats in the Prometheus text format, or None
+        if stats are not enabled.
+        Runtime: Θ(n) Space: Θ(n)."""
+        if self.stats is None:
+            return None
+        return self.stats.to_prometheus(self.cache, self.index_cache)
+
+    def get_best_route(self, number):
+        """Return (carrier, cost) of the least cost route for a number,
+        or 0 if no carrier has a route for it.
+        Runtime: Θ(nk) Space: Θ(n)."""
+        costs = self.get_costs(number)
+        if costs == 0:
+            return 0
+        return min(costs, key=lambda route: route[1])
+
+    def add_route_costs(self, carrier, file_name):
+        """Loads route costs from file_name into memory under carrier,
+        replacing any routes previously loaded for that carrier.
+        Runtime: Θ(n) Space: Θ(n)."""
+        start = time.perf_counter()
+        costs_index, pruned = self._load_route_costs(file_name)
+        if self.stats is not None:
+            self.stats.record_load(carrier, len(costs_index),
+                                   time.perf_counter() - start)
+        self._record_pruned(carrier, pruned)
+        self._set_route_costs(carrier, costs_index)
+
+    def apply_route_delta(self, carrier, file_name):
+        """Apply a route delta file (see _read_route_delta) to a loaded
+        carrier. The new version of the carrier's index is built beside
+        the live one and swapped in at once, so lookups keep running and
+        never see a partially applied delta. Return the number of
+        changed prefixes. Raise ValueError if redundant routes were pruned
+        from the carrier, see enable_pruning.
+        Runtime: Θ(n + d) Space: Θ(n)."""
+        if self.pruned_routes.get(carrier):
+            raise ValueError("redundant routes were pruned from {}, reload "
+                             "it rather than applying a delta".format(carrier))
+        changes = self._read_route_delta(file_name)
+        # the delta must apply to the latest index, not one another
+        # writer replaces before this one publishes
+        with self._write_lock:
+            updated = self._apply_delta(self.routes[carrier], changes)
+            self._set_route_costs(carrier, updated, changes)
+        return len(changes)
+
+    def add_route_costs_parallel(self, carrier_route_costs, workers=None):
+        """Loads several carriers' route costs files concurrently, each
+        split into chunks parsed in a pool of worker processes.
+        carrier_route_costs is a list of ('carrier name', 'file name')
+        tuples.
+        Runtime: Θ(n / workers) Space: Θ(n)."""
+        start = time.perf_counter()
+
+        # carriers unchanged since they were cached skip parsing
+        cache = self.index_cache
+        missing = carrier_route_costs
+        sources = {}
+        if cache is not None:
+            kind = self._index_kind()
+            missing = []
+            for carrier, file_name in carrier_route_costs:
+                loaded = cache.load(kind, file_name)
+                if loaded is None:
+                    missing.append((carrier, file_name))
+                    sources[carrier] = index_cache.fingerprint(
+                        data_path(file_name))
+                else:
+                    self._record_pruned(carrier, loaded[1])
+                    self._set_route_costs(carrier, loaded[0])
+
+        results = parallel_loader.read_route_costs_parallel(missing, workers)
+        file_names = dict(missing)
+        for carrier, costs in results.items():
+            pruned = prune_redundant(costs) if self.prune else 0
+            costs_index = self._build_index(costs)
+            if cache is not None:
+                cache.save(kind, file_names[carrier], (costs_index, pruned),
+                           sources[carrier])
+            self._record_pruned(carrier, pruned)
+            self._set_route_costs(carrier, costs_index)
+        if self.stats is not None:
+            # carriers load concurrently, so share the elapsed time out
+            # by route count
+            elapsed = time.perf_counter() - start
+            total = sum(len(costs) for costs in results.values()) or 1
+            for carrier, costs in results.items():
+                self.stats.record_load(carrier, len(costs),
+                                       elapsed * len(costs) / total)
+
+    def lookup_many(self, numbers):
+        """Return a list of (number, cost) tuples in input order, where cost
+        is the least cost in dollars over all carriers or 0 if no carrier
+        has a route. The batch is sorted once and merged against each
+        carrier's sorted routes, so neighbouring numbers share their prefix
+        work.
+        Runtime: Θ(cm log n) Space: Θ(m).
+        Where c is the number of carriers and m the number of numbers."""
+
+        # sort the batch, remembering each number's input position
+        order = sorted(range(len(numbers)), key=numbers.__getitem__)
+        sorted_numbers = [numbers[index] for index in order]
+
+        # resolve the whole batch against each carrier, keeping the
+        # cheapest cost per number
+        best = [None] * len(numbers)
+        for carrier, costs_index in self.routes.items():
+            prefixes, costs = self._sorted_routes(carrier, costs_index)
+            matches = merge_longest_matches(prefixes, sorted_numbers)
+            for index, match in zip(order, matches):
+                if match is not None and (best[index] is None or
+                                          costs[match] < best[index]):
+                    best[index] = costs[match]
+
+        return [(number, 0 if cost is None else cost_dollars(cost))
+                for number, cost in zip(numbers, best)]
+
+    def write_route_costs(self, numbers, file_name):
+        """Look up numbers in bulk and write number,cost lines to file_name
+        in a single buffered write.
+        Runtime: Θ(cm log n) Space: Θ(m)."""
+        if self.stats is None:
+            lines = ["{},{}\n".format(number, cost)
+                     for number, cost in self.lookup_many(numbers)]
+            with open(file_name, 'w') as route_costs_file:
+                route_costs_file.write("".join(lines))
+            return
+        with self.stats.stage("lookup_many"):
+            results = self.lookup_many(numbers)
+        with self.stats.stage("format"):
+            lines = ["{},{}\n".format(number, cost)
+                     for number, cost in results]
+        with self.stats.stage("write"):
+            with open(file_name, 'w') as route_costs_file:
+                route_costs_file.write("".join(lines))
+
     def load_route_costs(self):
         """Loads route costs from selected file into memory.
         Runtime: Θ(n) Space: Θ(1)."""
@@ -168,7 +634,7 @@ class CallRoutes(object):
         start = time.time()
 
         # load selected route-costs file into self.routes
-        self.routes[carrier] = self._read_route_costs(fileName)
+        self.add_route_costs(carrier, fileName)
 
         # print function run time
         print("\n\x1b[0;33mCompleted in {} seconds.".format(
@@ -190,7 +656,7 @@ class CallRoutes(object):
         # print costs for selected phone-numbers file
         for phone_number in self._read_phone_numbers(fileName):
             print("\n\x1b[1;35m{} \x1b[0;37m: \x1b[1;34m{}".format(
-                phone_number, calls.get_costs(phone_number)))
+                phone_number, self.get_costs(phone_number)))
 
         # print function run time
         print("\n\x1b[0;33mCompleted in {} seconds.".format(
@@ -206,6 +672,56 @@ class CallRoutes(object):
         Runtime: Θ(n) Space: Θ(1)."""
         return len(self.routes.keys())
 
+    @property
+    def route_costs(self):
+        """Returns the total number of route costs in the published routes,
+        so it never counts a carrier that is still loading.
+        Runtime: Θ(n) Space: Θ(1)."""
+        return sum(len(costs_index) for costs_index in self.routes.values())
+
+
+# ----------------------------------------------------------------------------------
+# Bulk Lookup Function
+# ----------------------------------------------------------------------------------
+def merge_longest_matches(prefixes, numbers, max_walk=32):
+    """Return, for each number in sorted numbers, the index in sorted
+    prefixes of its longest matching prefix, or None if none matches.
+    Both lists are merged in one pass keeping a stack of the routes that
+    are prefixes of the current position. Gaps longer than max_walk routes
+    are skipped with a binary search and the stack is rebuilt by searching
+    for each prefix of the number. Either way, as in _match, prefixes
+    shorter than MIN_PREFIX_LENGTH never match.
+    Runtime: Θ(m log n + min(n, mk)) Space: Θ(m)."""
+    results = []
+    stack = []
+    position = 0
+    for number in numbers:
+        end = bisect_right(prefixes, number, position)
+        if end - position <= max_walk:
+            # walk the routes between the previous number and this one
+            for index in range(position, end):
+                prefix = prefixes[index]
+                if len(prefix) < MIN_PREFIX_LENGTH:
+                    continue
+                while stack and not prefix.startswith(prefixes[stack[-1]]):
+                    stack.pop()
+                stack.append(index)
+        else:
+            # too far to walk, search for each prefix of the number
+            stack = []
+            low = 0
+            for length in range(MIN_PREFIX_LENGTH, len(number) + 1):
+                low = bisect_left(prefixes, number[:length], low, end)
+                if low < end and prefixes[low] == number[:length]:
+                    stack.append(low)
+        position = end
+        # discard routes that are not a prefix of this number, the
+        # innermost remaining route is the longest match
+        while stack and not number.startswith(prefixes[stack[-1]]):
+            stack.pop()
+        results.append(stack[-1] if stack else None)
+    return results
+
 
 # ----------------------------------------------------------------------------------
 # Memory Usage Function
@@ -220,12 +736,11 @@ def get_mem():
 
 
 # ----------------------------------------------------------------------------------
-# Main Entry Point
+# Main Menu Function
 # ----------------------------------------------------------------------------------
-if __name__ == '__main__':
-
-    # create new class instance
-    calls = CallRoutes()
+def run_menu(calls):
+    """Run the interactive main menu loop against a CallRoutes instance.
+    Runtime: Θ(1) Space: Θ(1)."""
 
     # Main Menu Loop
     while(True):
@@ -280,3 +795,12 @@ if __name__ == '__main__':
 
     # cheerio
     print("\n\x1b[1;32mGoodbye!")
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+if __name__ == '__main__':
+
+    # create new class instance and run the main menu
+    run_menu(CallRoutes())
@@ -1,8 +1,12 @@
 # ==================================================================================
 # File: sqlite_solution.py
 #
-# Desc: Call Routing project sqlite solution file. This method is terribly slow
-#       and should not be used.
+# Desc: Call Routing project sqlite solution file. Routes are kept in a typed,
+#       primary key indexed table so the data persists between runs, and each
+#       lookup is a single indexed query over all of a number's prefixes.
+#       sqlite connections cannot be shared between threads, so lookups run on
+#       a per-thread connection lent from a pool, and the database's WAL
+#       journal lets them all read while another connection writes.
 #
 # Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
 # ==================================================================================
@@ -10,13 +14,157 @@
 # ----------------------------------------------------------------------------------
 # Imports
 # ----------------------------------------------------------------------------------
-import csv
 from random import randint
 import time
 import os
 import resource
 import platform
 import sqlite3
+import threading
+import parallel_loader
+import index_cache
+from solution import cost_dollars, data_path, TOP_K
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# typed route table keyed on (prefix, carrier), so every lookup is an index
+# seek, plus a table recording which carrier files have been loaded and the
+# size, mtime and content hash they had when they were
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS routes (
+    prefix TEXT NOT NULL,
+    carrier TEXT NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (prefix, carrier)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS carriers (
+    name TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# longest match per carrier among a number's candidate prefixes, cheapest
+# first (sqlite takes the bare columns from the row holding the MAX)
+LONGEST_MATCH_QUERY = """
+SELECT carrier, prefix, cost, MAX(LENGTH(prefix))
+FROM routes WHERE prefix IN ({})
+GROUP BY carrier ORDER BY cost, carrier
+"""
+
+# the k cheapest of those longest matches, for failover lists
+TOP_ROUTES_QUERY = LONGEST_MATCH_QUERY + "LIMIT ?"
+
+# least cost per number of a batch held in temp.numbers: every candidate
+# prefix of two or more characters, as in get_costs, is generated in sql
+# and joined against the primary key
+BATCH_QUERY = """
+WITH RECURSIVE candidates(pos, prefix) AS (
+    SELECT pos, number FROM temp.numbers WHERE LENGTH(number) > 1
+    UNION ALL
+    SELECT pos, SUBSTR(prefix, 1, LENGTH(prefix) - 1) FROM candidates
+    WHERE LENGTH(prefix) > 2
+), matches AS (
+    SELECT c.pos, r.cost, LENGTH(r.prefix) AS length,
+           MAX(LENGTH(r.prefix))
+               OVER (PARTITION BY c.pos, r.carrier) AS longest
+    FROM candidates c JOIN routes r ON r.prefix = c.prefix
+)
+SELECT pos, MIN(cost) FROM matches WHERE length = longest GROUP BY pos
+"""
+
+
+# ----------------------------------------------------------------------------------
+# ConnectionPool (Class)
+# ----------------------------------------------------------------------------------
+class ConnectionPool(object):
+    """Connections to a database for lookups, one per thread. A thread keeps
+    the connection it was lent until it exits, when the connection goes
+    back to the pool for the next new thread, so a thread pool of w
+    workers opens at most w connections however many tasks it runs."""
+
+    # ------------------------------------------------------------------------------
+    # ConnectionPool - Constructor
+    # ------------------------------------------------------------------------------
+    def __init__(self, db_path):
+        """Create a new ConnectionPool of connections to db_path.
+        Runtime: Θ(1) Space: Θ(1)"""
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connections = []
+        self.idle = []
+        self.closed = False
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------------------
+    # ConnectionPool - Intended Private Methods
+    # ------------------------------------------------------------------------------
+    def _acquire(self):
+        """Return an idle connection, opening a new one if there is none.
+        Runtime: Θ(1) Space: Θ(1)"""
+        with self.lock:
+            if self.closed:
+                raise sqlite3.ProgrammingError(
+                    "Cannot operate on a closed connection pool.")
+            if self.idle:
+                return self.idle.pop()
+            # only ever used by one thread at a time, but returned
+            # to the pool from the thread that exits
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connections.append(conn)
+            return conn
+
+    def _release(self, conn):
+        """Return a connection to the pool.
+        Runtime: Θ(1) Space: Θ(1)"""
+        with self.lock:
+            if not self.closed:
+                self.idle.append(conn)
+
+    # ------------------------------------------------------------------------------
+    # ConnectionPool - Public Methods
+    # ------------------------------------------------------------------------------
+    def cursor(self):
+        """Return the calling thread's cursor, lending the thread a
+        connection on its first call.
+        Runtime: Θ(1) Space: Θ(1)"""
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            lease = self._local.lease = _Lease(self, self._acquire())
+        return lease.cursor
+
+    def close(self):
+        """Close every connection the pool has opened.
+        Runtime: Θ(w) Space: Θ(1)"""
+        with self.lock:
+            self.closed = True
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+            self.idle = []
+
+
+class _Lease(object):
+    """A pooled connection lent to one thread, held in the pool's thread
+    local storage so it is returned when the thread exits."""
+
+    def __init__(self, pool, conn):
+        """Lend conn from pool.
+        Runtime: Θ(1) Space: Θ(1)"""
+        self.pool = pool
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+    def __del__(self):
+        """Return the connection to the pool.
+        Runtime: Θ(1) Space: Θ(1)"""
+        self.pool._release(self.conn)
 
 
 # ----------------------------------------------------------------------------------
@@ -27,66 +175,179 @@ class CallRoutes(object):
     # ------------------------------------------------------------------------------
     # CallRoutes - Constructor
     # ------------------------------------------------------------------------------
-    def __init__(self, numbers_file_name, *carrier_route_costs):
-        """Create a new CallRoutes instance. numbers_file_name should be
-        a fully qualified file name. carrier_route_costs is a variadic parameter,
-        each of which should be a tuple of ('carrier name', 'file name')."""
+    def __init__(self, numbers_file_name, *carrier_route_costs,
+                 db_file_name='costs_data.db'):
+        """Create a new CallRoutes instance. numbers_file_name optionally
+        names a phone numbers file to read, or is None. carrier_route_costs
+        is a variadic parameter, each of which should be a tuple of
+        ('carrier name', 'file name').
+        db_file_name names the database file in the data directory.
+        Lookups may be made from any number of threads."""
 
-        self.db, self.db_conn = self._init_db(carrier_route_costs)
+        self.db, self.db_conn = self._init_db(carrier_route_costs,
+                                              db_file_name)
+
+        # per-thread connections for lookups, see ConnectionPool
+        self.pool = ConnectionPool(data_path(db_file_name))
 
         # set numbers to list of numbers from specified file
         # **this is an expensive operation** but it's the best we can do
-        self.numbers = self._read_numbers(numbers_file_name)
+        self.numbers = []
+        if numbers_file_name is not None:
+            self.numbers = self._read_numbers(numbers_file_name)
 
     # ------------------------------------------------------------------------------
     # CallRoutes - Destructor
     # ------------------------------------------------------------------------------
     def __del__(self):
-        """Close sqlite3 db file."""
+        """Close sqlite3 db file and every pooled connection."""
+        self.pool.close()
         self.db_conn.close()
 
     # ------------------------------------------------------------------------------
     # CallRoutes - Intended Private Methods
     # ------------------------------------------------------------------------------
-    def _init_db(self, carrier_route_costs):
-        exists = os.path.isfile('data/' + 'costs_data.db')
-        conn = sqlite3.connect('data/' + 'costs_data.db')
+    def _init_db(self, carrier_route_costs, db_file_name):
+        """Open the route database, creating the schema if needed, and
+        bring it in line with carrier_route_costs: carriers that are not
+        stored, or whose file has changed since it was loaded, are
+        (re)loaded, and stored carriers that are not listed are dropped.
+        With no carriers listed the stored ones are used as they are.
+        Return a tuple of cursor and connection.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        conn = sqlite3.connect(data_path(db_file_name))
         cur = conn.cursor()
-        if not exists:
-            # create table
-            cur.execute(
-                "CREATE TABLE costs (carrier, prefix, cost);")
-            conn.commit()
-            # create table for each carrier
-            for carrier in carrier_route_costs:
-                records = []
-                with open('data/' + carrier[1]) as f:
-                    for line in f:
-                        line = line.strip().split(',')
-                        records.append((carrier[0], line[0], line[1]))
-                cur.executemany("INSERT INTO costs VALUES (?, ?, ?)", records)
-                conn.commit()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA user_version")
+        if cur.fetchone()[0] != SCHEMA_VERSION:
+            # older databases did not record where routes came from, and
+            # the first kept them in an untyped costs table
+            cur.executescript("DROP TABLE IF EXISTS costs;"
+                              "DROP TABLE IF EXISTS routes;"
+                              "DROP TABLE IF EXISTS carriers;")
+            cur.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+        cur.executescript(SCHEMA)
+        if not carrier_route_costs:
+            return cur, conn
 
+        # only load carriers that are missing or out of date
+        cur.execute("SELECT name, file_name, size, mtime_ns, hash "
+                    "FROM carriers")
+        stored = {row[0]: row[1:] for row in cur.fetchall()}
+        stale = []
+        touched = []
+        for carrier, file_name in carrier_route_costs:
+            row = stored.pop(carrier, None)
+            if row is None or row[0] != file_name or \
+                    not index_cache.is_unchanged(data_path(file_name), {
+                        "size": row[1], "mtime_ns": row[2], "hash": row[3]}):
+                stale.append((carrier, file_name))
+                continue
+            mtime_ns = os.stat(data_path(file_name)).st_mtime_ns
+            if mtime_ns != row[2]:
+                # touched but unchanged, remember the new mtime so the
+                # next start does not hash the file again
+                touched.append((mtime_ns, carrier))
+        with conn:
+            cur.executemany("UPDATE carriers SET mtime_ns = ? WHERE name = ?",
+                            touched)
+            for carrier in [carrier for carrier, _ in stale] + list(stored):
+                cur.execute("DELETE FROM routes WHERE carrier = ?",
+                            (carrier,))
+                cur.execute("DELETE FROM carriers WHERE name = ?", (carrier,))
+        if stale:
+            self._bulk_load(conn, stale)
         return cur, conn
 
+    def _bulk_load(self, conn, carrier_route_costs):
+        """Parse carrier files in parallel and insert their routes in one
+        transaction, with syncing turned off for the duration of the load.
+        Runtime: Θ(n log n) Space: Θ(n)"""
+        cur = conn.cursor()
+        cur.execute("PRAGMA synchronous=OFF")
+        sources = [index_cache.fingerprint(data_path(file_name))
+                   for _, file_name in carrier_route_costs]
+        results = parallel_loader.read_route_costs_parallel(
+            carrier_route_costs)
+        with conn:
+            for (carrier, file_name), source in zip(carrier_route_costs,
+                                                    sources):
+                # inserting in key order keeps b-tree page splits cheap
+                cur.executemany(
+                    "INSERT OR REPLACE INTO routes VALUES (?, ?, ?)",
+                    ((prefix, carrier, cost_dollars(cost)) for prefix, cost
+                     in sorted(results[carrier].items())))
+                cur.execute(
+                    "INSERT OR REPLACE INTO carriers VALUES (?, ?, ?, ?, ?)",
+                    (carrier, file_name, source["size"], source["mtime_ns"],
+                     source["hash"]))
+        cur.execute("PRAGMA synchronous=NORMAL")
+
     def _read_numbers(self, file_name):
         """Read phone numbers into a list and return the result.
         Runtime: Θ(n) Space: Θ(n)"""
-        with open('data/'+file_name) as f:
+        with open(data_path(file_name)) as f:
             return f.read().splitlines()
 
     # ------------------------------------------------------------------------------
     # CallRoutes - Public Methods
     # ------------------------------------------------------------------------------
     def get_costs(self, phone_number):
-        """Return the carrier costs for a specified phone number.
-        Runtime: Θ(1) Space: Θ(1)"""
-        for i in range(len(phone_number), 1, -1):
-            t = (phone_number[:i],)
-            self.db.execute('SELECT * FROM costs WHERE prefix=?', t)
-            result = self.db.fetchall()
-            if len(result) > 0:
-                return result
+        """Return the longest matching route of each carrier for a specified
+        phone number as (carrier, prefix, cost) rows, cheapest first, in a
+        single query, or 0 if no carrier has a route for it, as in every
+        other backend.
+        Runtime: Θ(k log n) Space: Θ(c)"""
+        prefixes = [phone_number[:i] for i in range(len(phone_number), 1, -1)]
+        cur = self.pool.cursor()
+        cur.execute(
+            LONGEST_MATCH_QUERY.format(",".join("?" * len(prefixes))),
+            prefixes)
+        results = [row[:3] for row in cur.fetchall()]
+        if not results:
+            return 0
+        return results
+
+    def get_best_route(self, phone_number):
+        """Return (carrier, cost) of the least cost route for a specified
+        phone number, or 0 if no carrier has a route for it.
+        Runtime: Θ(k log n) Space: Θ(c)"""
+        costs = self.get_costs(phone_number)
+        if not costs:
+            return 0
+        return costs[0][0], costs[0][2]
+
+    def get_top_routes(self, phone_number, k=TOP_K):
+        """Return a failover list of up to k (carrier, cost, prefix) tuples
+        for a phone number, cheapest first, where prefix is the carrier's
+        own longest matching route. The list is empty if no carrier has a
+        route. sqlite ranks and limits the rows, so only k are fetched.
+        Runtime: Θ(k log n + c log c) Space: Θ(c)"""
+        prefixes = [phone_number[:i] for i in range(len(phone_number), 1, -1)]
+        cur = self.pool.cursor()
+        cur.execute(
+            TOP_ROUTES_QUERY.format(",".join("?" * len(prefixes))),
+            prefixes + [k])
+        return [(carrier, cost, prefix)
+                for carrier, prefix, cost, _ in cur.fetchall()]
+
+    def lookup_many(self, numbers):
+        """Return a list of (number, cost) tuples in input order, where cost
+        is the least cost over all carriers or 0 if no carrier has a route.
+        The batch is resolved in one query joining a temp table of numbers,
+        which is private to the calling thread's connection.
+        Runtime: Θ(mk log n) Space: Θ(m)"""
+        cur = self.pool.cursor()
+        cur.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS numbers "
+            "(pos INTEGER PRIMARY KEY, number TEXT NOT NULL)")
+        cur.execute("DELETE FROM temp.numbers")
+        cur.executemany("INSERT INTO temp.numbers VALUES (?, ?)",
+                        enumerate(numbers))
+        cur.execute(BATCH_QUERY)
+        costs = dict(cur.fetchall())
+        return [(number, costs.get(pos, 0))
+                for pos, number in enumerate(numbers)]
 
     def yield_costs(self):
         """Return an iterator to iterate over each phone number in costs.
@@ -0,0 +1,175 @@
+# ==================================================================================
+# File: stream_lookup.py
+#
+# Desc: Call Routing project streaming bulk lookup. Phone numbers files larger
+#       than memory are read in large buffered blocks, resolved in bounded
+#       chunks with lookup_many and written out as number,cost lines as they
+#       go, so memory stays constant however large the input. A checkpoint file
+#       records the input and output byte offsets after every written chunk, so
+#       an interrupted run resumes where it stopped instead of starting over.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import argparse
+import sys
+import os
+import time
+import solution
+import trie_solution
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# map of backend name to CallRoutes class
+BACKENDS = {
+    "dict": solution.CallRoutes,
+    "trie": trie_solution.CallRoutes,
+}
+
+# size in bytes of each buffered read from the numbers file
+BLOCK_SIZE = 1 << 20
+
+# number of phone numbers resolved per lookup_many call
+CHUNK_SIZE = 65536
+
+
+# ----------------------------------------------------------------------------------
+# Streaming Functions
+# ----------------------------------------------------------------------------------
+def read_number_chunks(file_name, start=0, chunk_size=CHUNK_SIZE,
+                       block_size=BLOCK_SIZE):
+    """Yield (offset, numbers) tuples of up to chunk_size phone numbers
+    read from file_name starting at byte offset start, where offset is the
+    byte offset just after the last line in the chunk. A run can be resumed
+    by passing a yielded offset back as start. Blank lines are skipped.
+    Runtime: Θ(n) Space: Θ(chunk_size + block_size)"""
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        offset = start
+        numbers = []
+        tail = b''
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines = (tail + block).split(b'\n')
+            # the last piece is a partial line until the next block
+            tail = lines.pop()
+            for line in lines:
+                offset += len(line) + 1
+                number = line.strip()
+                if number:
+                    numbers.append(number.decode())
+                if len(numbers) == chunk_size:
+                    yield offset, numbers
+                    numbers = []
+        # a final line without a trailing newline
+        offset += len(tail)
+        number = tail.strip()
+        if number:
+            numbers.append(number.decode())
+        if numbers:
+            yield offset, numbers
+
+
+def stream_costs(calls, file_name, start=0, chunk_size=CHUNK_SIZE):
+    """Yield (offset, results) tuples where results is a list of
+    (number, cost) tuples for each chunk of file_name, resolved with
+    calls.lookup_many. offset is the resume offset of the next chunk.
+    Runtime: Θ(n) Space: Θ(chunk_size)"""
+    for offset, numbers in read_number_chunks(file_name, start, chunk_size):
+        yield offset, calls.lookup_many(numbers)
+
+
+def read_checkpoint(checkpoint_file_name):
+    """Return the (input offset, output offset) tuple recorded in a
+    checkpoint file, or (0, 0) if there is none.
+    Runtime: Θ(1) Space: Θ(1)"""
+    try:
+        with open(checkpoint_file_name) as f:
+            start, written = f.read().split()
+    except (OSError, ValueError):
+        return 0, 0
+    return int(start), int(written)
+
+
+def write_checkpoint(checkpoint_file_name, start, written):
+    """Record the input and output offsets of the last written chunk,
+    replacing the checkpoint file atomically.
+    Runtime: Θ(1) Space: Θ(1)"""
+    tmp_file_name = checkpoint_file_name + '.tmp'
+    with open(tmp_file_name, 'w') as f:
+        f.write("{} {}\n".format(start, written))
+    os.replace(tmp_file_name, checkpoint_file_name)
+
+
+def stream_to_file(calls, numbers_file_name, out_file_name,
+                   checkpoint_file_name=None, chunk_size=CHUNK_SIZE):
+    """Resolve every number in numbers_file_name and write number,cost
+    lines to out_file_name one chunk at a time. With a checkpoint file,
+    output is flushed and the checkpoint advanced after every chunk, a
+    previous interrupted run is resumed from its last checkpoint, and the
+    checkpoint is removed once the whole file is written. A checkpoint
+    whose output file is missing or shorter than it records is ignored,
+    and the run starts over. Return the number of lines written by this
+    call.
+    Runtime: Θ(n) Space: Θ(chunk_size)"""
+    start, written = 0, 0
+    if checkpoint_file_name is not None:
+        start, written = read_checkpoint(checkpoint_file_name)
+    if written and not (os.path.isfile(out_file_name) and
+                        os.path.getsize(out_file_name) >= written):
+        # the output the checkpoint vouches for is gone
+        start, written = 0, 0
+    count = 0
+    with open(out_file_name, 'r+b' if written else 'wb') as out:
+        # drop anything written after the last checkpoint
+        out.truncate(written)
+        out.seek(written)
+        for offset, results in stream_costs(calls, numbers_file_name, start,
+                                            chunk_size):
+            out.write("".join("{},{}\n".format(number, cost)
+                              for number, cost in results).encode())
+            count += len(results)
+            if checkpoint_file_name is not None:
+                out.flush()
+                os.fsync(out.fileno())
+                write_checkpoint(checkpoint_file_name, offset, out.tell())
+    if checkpoint_file_name is not None and os.path.isfile(
+            checkpoint_file_name):
+        os.remove(checkpoint_file_name)
+    return count
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Stream number,cost lines for a phone numbers file.")
+    parser.add_argument("--carrier", action="append", default=[],
+                        metavar="NAME=FILE", help="carrier route costs file")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="trie")
+    parser.add_argument("--numbers", required=True,
+                        help="phone numbers file, one number per line")
+    parser.add_argument("--out", required=True, help="output file")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="checkpoint file to resume an interrupted run")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    calls = BACKENDS[args.backend]()
+    for carrier in args.carrier:
+        name, file_name = carrier.split("=", 1)
+        calls.add_route_costs(name, file_name)
+    start = time.time()
+    count = stream_to_file(calls, args.numbers, args.out, args.checkpoint,
+                           args.chunk_size)
+    print("Wrote {:,} route costs in {} seconds.".format(
+        count, round(time.time()-start, 4)), file=sys.stderr)
@@ -0,0 +1,63 @@
+# ==================================================================================
+# File: tests/conftest.py
+#
+# Desc: Call Routing project test fixtures. Every test runs against small route
+#       costs files written to a temporary data directory, so no test depends
+#       on the downloaded rate decks or leaves files in the data directory.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import solution
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# route costs of each carrier in the fixture. A has a '+' route, too short
+# to ever match, and the carriers overlap on +1 and +4420
+ROUTE_COSTS = {
+    "A": "+,0.01\n+1,0.5\n+14,0.4\n+1415,0.2\n+44,1.1\n+4420,0.9\n",
+    "B": "+1,0.45\n+141,0.3\n+49,2.0\n+4420,0.95\n",
+}
+
+# numbers covering longest matches, ties between carriers, no match, a
+# number too short to match, invalid numbers and numbers whose leading
+# digits still match a route
+NUMBERS = ["+14155550000", "+14", "+1", "+4420123", "+4930", "+9999", "+",
+           "", "abc", "14155", "+1" + "1" * 24, "+12x3", "+1 2", "+1415-55"]
+
+
+# ----------------------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------------------
+def write_data(data_dir, file_name, text):
+    """Write text to file_name in data_dir and return file_name."""
+    with open(os.path.join(str(data_dir), file_name), 'w') as data_file:
+        data_file.write(text)
+    return file_name
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Point the data directory at an empty temporary directory."""
+    monkeypatch.setattr(solution, "DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def carrier_route_costs(data_dir):
+    """Write the fixture's route costs files and return a list of
+    ('carrier name', 'file name') tuples."""
+    return [(carrier, write_data(data_dir, "route-costs-{}.txt".format(
+        carrier.lower()), text)) for carrier, text in ROUTE_COSTS.items()]
@@ -0,0 +1,103 @@
+# ==================================================================================
+# File: tests/test_backends.py
+#
+# Desc: Call Routing project cross backend tests. Every backend must answer every
+#       number exactly as the dictionary solution does.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import pytest
+import solution
+import trie_solution
+import frontcoded_solution
+import callroute
+from conftest import NUMBERS
+try:
+    import numpy_solution
+except ImportError:
+    numpy_solution = None
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# backends loaded a carrier at a time through add_route_costs
+LOADED_BACKENDS = [trie_solution.CallRoutes, frontcoded_solution.CallRoutes]
+if numpy_solution is not None:
+    LOADED_BACKENDS.append(numpy_solution.CallRoutes)
+
+
+# ----------------------------------------------------------------------------------
+# Helper Functions
+# ----------------------------------------------------------------------------------
+def load(cls, carrier_route_costs):
+    """Return a new cls instance loaded with carrier_route_costs."""
+    calls = cls()
+    for carrier, file_name in carrier_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    return calls
+
+
+def module_name(cls):
+    """Return the module a backend is defined in, to name its tests."""
+    return cls.__module__
+
+
+def best_cost(calls, number):
+    """Return the least cost get_costs reports for number, or 0, the cost
+    lookup_many reports."""
+    costs = calls.get_costs(number)
+    return min(cost for _, cost in costs) if costs else 0
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_dict_longest_match(carrier_route_costs):
+    calls = load(solution.CallRoutes, carrier_route_costs)
+    assert calls.get_costs("+14155550000") == [("A", 0.2), ("B", 0.3)]
+    assert calls.get_costs("+4930") == [("B", 2.0)]
+    assert calls.get_costs("+9999") == 0
+    assert calls.get_best_route("+4420123") == ("A", 0.9)
+
+
+@pytest.mark.parametrize("cls", LOADED_BACKENDS, ids=module_name)
+def test_backend_matches_dict(carrier_route_costs, cls):
+    expected = load(solution.CallRoutes, carrier_route_costs)
+    calls = load(cls, carrier_route_costs)
+    for number in NUMBERS:
+        assert calls.get_costs(number) == expected.get_costs(number)
+        assert calls.get_best_route(number) == \
+            expected.get_best_route(number)
+        assert calls.get_top_routes(number) == \
+            expected.get_top_routes(number)
+    assert calls.lookup_many(NUMBERS) == expected.lookup_many(NUMBERS)
+
+
+@pytest.mark.parametrize("backend", callroute.BACKENDS)
+def test_open_routes_matches_dict(carrier_route_costs, backend):
+    expected = load(solution.CallRoutes, carrier_route_costs)
+    calls = callroute.open_routes(carrier_route_costs, backend)
+    for number in NUMBERS:
+        assert calls.get_best_route(number) == \
+            expected.get_best_route(number), number
+    assert calls.lookup_many(NUMBERS) == expected.lookup_many(NUMBERS)
+
+
+@pytest.mark.parametrize("max_walk", [0, 1, 32])
+def test_merge_longest_matches_skips_short_prefixes(max_walk):
+    prefixes = ["+", "+1", "+14", "+44"]
+    numbers = ["+1415", "+4420", "+9999"]
+    assert solution.merge_longest_matches(prefixes, numbers, max_walk) == \
+        [2, 3, None]
+
+
+def test_dict_lookup_many_matches_get_costs(carrier_route_costs):
+    calls = load(solution.CallRoutes, carrier_route_costs)
+    assert calls.lookup_many(NUMBERS) == [(number, best_cost(calls, number))
+                                          for number in NUMBERS]
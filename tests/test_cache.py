@@ -0,0 +1,112 @@
+# ==================================================================================
+# File: tests/test_cache.py
+#
+# Desc: Call Routing project lookup cache tests. The cache must evict least
+#       recently used entries at its bounds, drop results when routes change,
+#       never cache a result from replaced routes and remember probe misses.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import solution
+import mm_solution
+from route_cache import LookupCache, MISSING
+from conftest import write_data
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_numbers_evicted_least_recently_used():
+    cache = LookupCache(size=2, prefix_size=0)
+    cache.put_number("+1", ("A",))
+    cache.put_number("+2", ("B",))
+    assert cache.get_number("+1") == ("A",)
+    cache.put_number("+3", ())
+    assert cache.get_number("+2") is MISSING
+    assert cache.get_number("+1") == ("A",)
+    assert cache.get_number("+3") == ()
+    stats = cache.stats()
+    assert stats["numbers"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_prefixes_evicted_least_recently_used():
+    cache = LookupCache(size=0, prefix_size=2)
+    cache.put_prefix("A", "+1", 5)
+    cache.put_prefix("A", "+2", None)
+    assert cache.get_prefix("A", "+1") == 5
+    cache.put_prefix("B", "+1", 7)
+    assert cache.get_prefix("A", "+2") is MISSING
+    assert cache.stats()["prefix_evictions"] == 1
+
+    # a size of 0 disables a level
+    cache.put_number("+1", ("A",))
+    assert cache.get_number("+1") is MISSING
+
+
+def test_negative_prefix_result_is_cached():
+    cache = LookupCache()
+    cache.put_prefix("A", "+99", None)
+    assert cache.get_prefix("A", "+99") is None
+    assert cache.get_prefix("A", "+98") is MISSING
+
+
+def test_invalidate_drops_carrier_and_stale_puts():
+    cache = LookupCache()
+    cache.put_number("+1", ("A",))
+    cache.put_prefix("A", "+1", 5)
+    cache.put_prefix("B", "+1", 7)
+    generation = cache.generation
+    cache.invalidate("A")
+    assert cache.get_number("+1") is MISSING
+    assert cache.get_prefix("A", "+1") is MISSING
+    assert cache.get_prefix("B", "+1") == 7
+
+    # a result computed before the invalidation is not cached
+    cache.put_number("+1", ("A",), generation)
+    cache.put_prefix("A", "+1", 5, generation)
+    assert cache.get_number("+1") is MISSING
+    assert cache.get_prefix("A", "+1") is MISSING
+    cache.put_number("+1", ("A",), cache.generation)
+    assert cache.get_number("+1") == ("A",)
+
+
+def test_delta_and_reload_invalidate(data_dir, carrier_route_costs):
+    calls = solution.CallRoutes()
+    calls.enable_cache()
+    for carrier, file_name in carrier_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    assert calls.get_best_route("+14155550000") == ("A", 0.2)
+    assert calls.get_best_route("+14155550000") == ("A", 0.2)
+    assert calls.cache.stats()["hits"] == 1
+
+    calls.apply_route_delta("B", write_data(data_dir, "delta-b.txt",
+                                            "+1415,0.1\n"))
+    assert calls.get_best_route("+14155550000") == ("B", 0.1)
+
+    calls.add_route_costs("B", write_data(data_dir, "route-costs-c.txt",
+                                          "+1,0.01\n"))
+    assert calls.get_best_route("+14155550000") == ("B", 0.01)
+
+
+def test_missing_prefix_not_probed_again(carrier_route_costs, monkeypatch):
+    calls = mm_solution.CallRoutes(None, *carrier_route_costs)
+    calls.enable_cache(size=0)
+    probes = []
+    find = mm_solution.RouteFile.find
+
+    def counted_find(self, prefix):
+        probes.append(prefix)
+        return find(self, prefix)
+
+    monkeypatch.setattr(mm_solution.RouteFile, "find", counted_find)
+    assert calls.get_costs("+9999") == {}
+    assert probes
+    del probes[:]
+    assert calls.get_costs("+9999") == {}
+    assert probes == []
+    assert calls.cache.stats()["prefix_hits"] > 0
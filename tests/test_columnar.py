@@ -0,0 +1,76 @@
+# ==================================================================================
+# File: tests/test_columnar.py
+#
+# Desc: Call Routing project columnar route deck tests. A deck exported to any
+#       columnar format and imported again must answer every number as the
+#       text deck does, and integer prefixes without a length column must be
+#       counted to their exact number of digits.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import os
+import pytest
+from conftest import NUMBERS, write_data
+
+np = pytest.importorskip("numpy")
+numpy_solution = pytest.importorskip("numpy_solution")
+import columnar_io
+import callroute
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# a deck with a route of the longest prefix a key holds, all nines, just
+# below a power of ten
+LONG_PREFIX = "+" + "9" * 18
+ROUTE_COSTS = "+1,0.5\n+14,0.4\n+4420,0.9\n{},0.3\n".format(LONG_PREFIX)
+
+# formats that only need numpy, then those that need pyarrow
+FORMATS = [".npy", ".npz"] + [pytest.param(
+    extension, marks=pytest.mark.skipif(columnar_io.pa is None,
+                                        reason="needs pyarrow"))
+    for extension in (".parquet", ".arrow")]
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+@pytest.mark.parametrize("extension", FORMATS)
+def test_deck_round_trip(data_dir, extension):
+    text_file_name = write_data(data_dir, "route-costs-a.txt", ROUTE_COSTS)
+    deck_file_name = "route-costs-a" + extension
+    assert callroute.convert_deck(text_file_name, deck_file_name) == 4
+
+    expected = numpy_solution.CallRoutes()
+    expected.add_route_costs("A", text_file_name)
+    calls = numpy_solution.CallRoutes()
+    calls.add_route_costs("A", deck_file_name)
+    numbers = NUMBERS + [LONG_PREFIX + "1", LONG_PREFIX[:-1]]
+    assert calls.lookup_many(numbers) == expected.lookup_many(numbers)
+    assert calls.get_best_route(LONG_PREFIX) == ("A", 0.3)
+    assert sorted(calls.routes["A"].items()) == \
+        sorted(expected.routes["A"].items())
+
+
+def test_key_digits_counted_exactly(data_dir):
+    keys = [1, 9, 10, 99, 100, int("9" * 15), int("9" * 18)]
+    with open(os.path.join(str(data_dir), "route-costs-a.npz"), 'wb') as f:
+        np.savez(f, prefix=np.array(keys, dtype=np.int64),
+                 cost_micros=np.arange(len(keys), dtype=np.int64))
+    _, lengths, _ = columnar_io.read_deck_columns("route-costs-a.npz")
+    assert lengths.tolist() == [len(str(key)) + 1 for key in keys]
+
+
+def test_deck_prefix_too_long(data_dir):
+    with open(os.path.join(str(data_dir), "route-costs-a.npz"), 'wb') as f:
+        np.savez(f, prefix=np.array([1, 10 ** 18], dtype=np.int64),
+                 cost_micros=np.array([1, 2], dtype=np.int64))
+    calls = numpy_solution.CallRoutes()
+    with pytest.raises(ValueError, match="in route-costs-a.npz"):
+        calls.add_route_costs("A", "route-costs-a.npz")
@@ -0,0 +1,117 @@
+# ==================================================================================
+# File: tests/test_concurrency.py
+#
+# Desc: Call Routing project concurrency tests. Lookups running while deltas are
+#       applied must each see the carrier's routes entirely before or entirely
+#       after a delta, never a mix, and never fail.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import sys
+import threading
+import time
+import pytest
+import solution
+import trie_solution
+import frontcoded_solution
+from conftest import write_data
+try:
+    import numpy_solution
+except ImportError:
+    numpy_solution = None
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# backends that take route deltas
+BACKENDS = [solution.CallRoutes, trie_solution.CallRoutes,
+            frontcoded_solution.CallRoutes]
+if numpy_solution is not None:
+    BACKENDS.append(numpy_solution.CallRoutes)
+
+# the carriers before the deltas
+ROUTE_COSTS = {
+    "A": "+1,0.5\n+14,0.4\n+1415,0.2\n+44,1.1\n+4420,0.9\n",
+    "B": "+1,0.45\n+141,0.3\n+49,2.0\n",
+}
+
+# a delta that removes a route and reprices its ancestors, so a half
+# applied delta answers with a cost neither version has, and its reverse
+DELTA = "+1415,-\n+14,0.35\n+1,0.6\n+4420,-\n+44,1.0\n"
+REVERSE = "+1415,0.2\n+14,0.4\n+1,0.5\n+4420,0.9\n+44,1.1\n"
+
+NUMBERS = ["+14155550000", "+14000", "+1000", "+4420123", "+4400", "+4930"]
+
+
+# ----------------------------------------------------------------------------------
+# Helper Functions
+# ----------------------------------------------------------------------------------
+def module_name(cls):
+    """Return the module a backend is defined in, to name its tests."""
+    return cls.__module__
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+@pytest.mark.parametrize("cls", BACKENDS, ids=module_name)
+def test_lookups_see_whole_deltas(data_dir, cls):
+    calls = cls()
+    for carrier, text in ROUTE_COSTS.items():
+        calls.add_route_costs(carrier, write_data(
+            data_dir, "route-costs-{}.txt".format(carrier.lower()), text))
+    delta = write_data(data_dir, "delta.txt", DELTA)
+    reverse = write_data(data_dir, "reverse.txt", REVERSE)
+
+    # the answers of the two versions, found before any thread starts
+    versions = []
+    for file_name in (delta, reverse):
+        versions.append(({number: calls.get_costs(number)
+                          for number in NUMBERS},
+                         calls.lookup_many(NUMBERS)))
+        calls.apply_route_delta("A", file_name)
+    assert versions[0] != versions[1]
+
+    # switch threads often, so lookups interleave with the swaps
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    failures = []
+    done = threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                costs = {number: calls.get_costs(number)
+                         for number in NUMBERS}
+                for number, cost in costs.items():
+                    if all(cost != version[0][number]
+                           for version in versions):
+                        failures.append((number, cost))
+                batch = calls.lookup_many(NUMBERS)
+                if all(batch != version[1] for version in versions):
+                    failures.append(batch)
+        except Exception as error:
+            failures.append(error)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    try:
+        for reader in readers:
+            reader.start()
+        deadline = time.perf_counter() + 0.5
+        applied = 0
+        while time.perf_counter() < deadline:
+            calls.apply_route_delta("A", (delta, reverse)[applied % 2])
+            applied += 1
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+        sys.setswitchinterval(interval)
+    assert applied > 1
+    assert failures == []
@@ -0,0 +1,134 @@
+# ==================================================================================
+# File: tests/test_delta.py
+#
+# Desc: Call Routing project route delta tests. Applying a delta must give the
+#       same answers as loading the changed routes from scratch, in every
+#       backend and in indexes patched rather than rebuilt.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from random import Random
+import pytest
+import solution
+import trie_solution
+import frontcoded_solution
+from conftest import write_data
+
+numpy_solution = pytest.importorskip("numpy_solution")
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# backends that take route deltas
+BACKENDS = [solution.CallRoutes, trie_solution.CallRoutes,
+            frontcoded_solution.CallRoutes, numpy_solution.CallRoutes]
+
+
+# ----------------------------------------------------------------------------------
+# Helper Functions
+# ----------------------------------------------------------------------------------
+def random_routes(rng, count):
+    """Return a dictionary of count random short prefixes to costs."""
+    return {"+" + "".join(rng.choice("0123") for _ in range(
+        rng.randint(1, 4))): rng.randint(1, 9) * 10000 for _ in range(count)}
+
+
+def deck(routes):
+    """Return the text of a route costs file for a dictionary of routes."""
+    return "".join("{},{}\n".format(prefix, solution.cost_dollars(cost))
+                   for prefix, cost in sorted(routes.items()))
+
+
+def all_numbers():
+    """Return every number of up to five digits over the digits used."""
+    numbers = ["+"]
+    for _ in range(5):
+        numbers += [number + digit for number in numbers
+                    if len(number) == len(numbers[-1]) for digit in "0123"]
+    return numbers
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+@pytest.mark.parametrize("cls", BACKENDS)
+def test_apply_route_delta(data_dir, cls):
+    write_data(data_dir, "a.txt", "+1,0.5\n+14,0.4\n+44,1.1\n")
+    write_data(data_dir, "b.txt", "+1,0.45\n+141,0.3\n")
+    write_data(data_dir, "delta.txt", "+14,0.1\n+44,-\n+49,2.0\n+1,0.6\n")
+    calls = cls()
+    calls.add_route_costs("A", "a.txt")
+    calls.add_route_costs("B", "b.txt")
+    assert calls.get_best_route("+1415") == ("B", 0.3)
+    assert calls.apply_route_delta("A", "delta.txt") == 4
+    assert calls.get_costs("+1415") == [("A", 0.1), ("B", 0.3)]
+    assert calls.get_costs("+1999") == [("A", 0.6), ("B", 0.45)]
+    assert calls.get_costs("+4420") == 0
+    assert calls.get_costs("+4930") == [("A", 2.0)]
+    assert calls.lookup_many(["+1415", "+4420", "+4930"]) == \
+        [("+1415", 0.1), ("+4420", 0), ("+4930", 2.0)]
+    assert calls.route_costs == 5
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("max_k,prune", [(0, False), (0, True), (3, False)])
+def test_patched_merged_trie_matches_build(seed, max_k, prune):
+    rng = Random(seed)
+    tries = {}
+    for carrier in "ABC":
+        tries[carrier] = trie_solution.RouteTrie()
+        for prefix, cost in random_routes(rng, 30).items():
+            tries[carrier].insert(prefix, cost)
+    merged = trie_solution.MergedRouteTrie(tries, max_k, prune)
+
+    carrier = rng.choice("ABC")
+    changes = random_routes(rng, 8)
+    for prefix, _ in list(tries[carrier].items()):
+        if rng.random() < 0.2:
+            changes[prefix] = None
+    previous = tries[carrier]
+    tries[carrier] = previous.copy()
+    for prefix, cost in changes.items():
+        if cost is None:
+            tries[carrier].remove(prefix)
+        else:
+            tries[carrier].insert(prefix, cost, replace=True)
+
+    patched = merged.patched(tries, carrier, previous, changes)
+    expected = trie_solution.MergedRouteTrie(tries, max_k, prune)
+    assert len(patched) == len(expected)
+    assert patched.pruned == expected.pruned
+    for number in all_numbers():
+        assert patched.best_match(number) == expected.best_match(number)
+        if max_k:
+            assert patched.top_routes(number, max_k) == \
+                expected.top_routes(number, max_k)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_patched_vector_index_matches_build(seed):
+    rng = Random(seed)
+    routes = random_routes(rng, 40)
+    changes = random_routes(rng, 10)
+    for prefix in routes:
+        if rng.random() < 0.2:
+            changes[prefix] = None
+    updated = dict(routes)
+    for prefix, cost in changes.items():
+        if cost is None:
+            updated.pop(prefix, None)
+        else:
+            updated[prefix] = cost
+
+    patched = numpy_solution.VectorRouteIndex(routes).patched(changes)
+    expected = numpy_solution.VectorRouteIndex(updated)
+    assert sorted(patched.items()) == sorted(expected.items())
+    numbers = all_numbers()
+    assert patched.lookup(numbers).tolist() == \
+        expected.lookup(numbers).tolist()
@@ -0,0 +1,74 @@
+# ==================================================================================
+# File: tests/test_index_cache.py
+#
+# Desc: Call Routing project index cache tests. A carrier whose route costs
+#       file is unchanged, even if touched, must load from the cache, and one
+#       whose content changed must be parsed again and answer from the new
+#       routes.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import os
+import pytest
+import solution
+import trie_solution
+from conftest import ROUTE_COSTS, write_data
+
+
+# ----------------------------------------------------------------------------------
+# Helper Functions
+# ----------------------------------------------------------------------------------
+def load(cls, carrier_route_costs):
+    """Return a new cls instance with an index cache, loaded with
+    carrier_route_costs."""
+    calls = cls()
+    calls.enable_index_cache()
+    for carrier, file_name in carrier_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    return calls
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+@pytest.mark.parametrize("cls", [solution.CallRoutes,
+                                 trie_solution.CallRoutes])
+def test_unchanged_carrier_loads_from_cache(carrier_route_costs, cls):
+    first = load(cls, carrier_route_costs)
+    assert first.index_cache.stats()["misses"] == 2
+
+    second = load(cls, carrier_route_costs)
+    assert second.index_cache.stats()["hits"] == 2
+    assert second.get_costs("+14155550000") == \
+        first.get_costs("+14155550000")
+
+
+def test_touched_carrier_loads_from_cache(carrier_route_costs):
+    load(trie_solution.CallRoutes, carrier_route_costs)
+    path = solution.data_path(carrier_route_costs[0][1])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    calls = load(trie_solution.CallRoutes, carrier_route_costs)
+    assert calls.index_cache.stats()["hits"] == 2
+
+
+def test_changed_carrier_invalidates_cache(data_dir, carrier_route_costs):
+    load(trie_solution.CallRoutes, carrier_route_costs)
+    path = solution.data_path(carrier_route_costs[0][1])
+    stat = os.stat(path)
+
+    # same size, so only the content hash tells the files apart
+    write_data(data_dir, carrier_route_costs[0][1],
+               ROUTE_COSTS["A"].replace("+1415,0.2", "+1415,0.1"))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert os.path.getsize(path) == stat.st_size
+
+    calls = load(trie_solution.CallRoutes, carrier_route_costs)
+    assert calls.index_cache.stats()["hits"] == 1
+    assert calls.index_cache.stats()["misses"] == 1
+    assert calls.get_best_route("+14155550000") == ("A", 0.1)
@@ -0,0 +1,66 @@
+# ==================================================================================
+# File: tests/test_lazy.py
+#
+# Desc: Call Routing project lazy shard tests. Carriers loaded one at a time or
+#       in parallel must read no shard until a number in it is looked up, give
+#       the same answers as the dict backend and stay within the memory budget
+#       by evicting least recently used shards.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import solution
+import lazy_solution
+from conftest import NUMBERS
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_parallel_load_is_lazy(carrier_route_costs):
+    calls = lazy_solution.CallRoutes()
+    calls.add_route_costs_parallel(carrier_route_costs)
+    assert all(isinstance(costs_index, lazy_solution.ShardedRoutes)
+               for costs_index in calls.routes.values())
+    assert calls.get_shard_stats()["loads"] == 0
+
+    expected = solution.CallRoutes()
+    for carrier, file_name in carrier_route_costs:
+        expected.add_route_costs(carrier, file_name)
+    for number in NUMBERS:
+        assert calls.get_costs(number) == expected.get_costs(number), number
+    assert calls.lookup_many(NUMBERS) == expected.lookup_many(NUMBERS)
+
+
+def test_shard_loaded_on_first_lookup(carrier_route_costs):
+    calls = lazy_solution.CallRoutes()
+    for carrier, file_name in carrier_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    assert calls.get_shard_stats()["loads"] == 0
+
+    calls.get_costs("+14155550000")
+    loads = calls.get_shard_stats()["loads"]
+    assert loads > 0
+    calls.get_costs("+14155550001")
+    stats = calls.get_shard_stats()
+    assert stats["loads"] == loads
+    assert stats["hits"] > 0
+
+
+def test_shards_evicted_over_budget(carrier_route_costs):
+    calls = lazy_solution.CallRoutes(memory_budget=1)
+    for carrier, file_name in carrier_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    expected = calls.get_costs("+14155550000")
+    calls.get_costs("+4420123")
+    calls.get_costs("+4930")
+    stats = calls.get_shard_stats()
+    assert stats["shards"] == 1
+    assert stats["evictions"] == stats["loads"] - 1
+
+    # both carriers' evicted +1 shards are simply read again
+    assert calls.get_costs("+14155550000") == expected
+    assert calls.get_shard_stats()["loads"] == stats["loads"] + 2
@@ -0,0 +1,73 @@
+# ==================================================================================
+# File: tests/test_mmap.py
+#
+# Desc: Call Routing project memory map solution tests. A route file's sidecar
+#       index must be rebuilt whenever the file changes or the index is damaged,
+#       and prefixes must only match whole route prefixes at line starts.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import os
+import solution
+import mm_solution
+from conftest import write_data
+
+
+# ----------------------------------------------------------------------------------
+# Helper Functions
+# ----------------------------------------------------------------------------------
+def find_all(path, prefixes):
+    """Return the cost of each of prefixes in the route file at path, and
+    close it."""
+    routes = mm_solution.RouteFile(path)
+    try:
+        return [routes.find(prefix) for prefix in prefixes]
+    finally:
+        routes.close()
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_stale_index_rebuilt(data_dir):
+    path = solution.data_path(write_data(data_dir, "route-costs-a.txt",
+                                         "+1,0.5\n+44,1.1\n"))
+    assert find_all(path, ["+1", "+44", "+49"]) == [500000, 1100000, None]
+    index_file_name = path + mm_solution.INDEX_SUFFIX
+    assert os.path.isfile(index_file_name)
+
+    # a different size
+    write_data(data_dir, "route-costs-a.txt", "+1,0.5\n+49,2.0\n+44,1.2\n")
+    assert find_all(path, ["+1", "+44", "+49"]) == [500000, 1200000, 2000000]
+
+    # the same size, told apart by mtime
+    stat = os.stat(path)
+    write_data(data_dir, "route-costs-a.txt", "+1,0.5\n+49,2.0\n+44,1.3\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert find_all(path, ["+44"]) == [1300000]
+
+
+def test_damaged_index_rebuilt(data_dir):
+    path = solution.data_path(write_data(data_dir, "route-costs-a.txt",
+                                         "+1,0.5\n+44,1.1\n"))
+    find_all(path, ["+1"])
+    with open(path + mm_solution.INDEX_SUFFIX, 'wb') as index_file:
+        index_file.write(b"CRIDX")
+    assert find_all(path, ["+1", "+44"]) == [500000, 1100000]
+
+
+def test_prefix_anchored_at_line_start(data_dir):
+    path = solution.data_path(write_data(
+        data_dir, "route-costs-a.txt", "+14,0.5\n+144,0.4\n+1,0.9\n"))
+    assert find_all(path, ["+4", "+44", "+14", "+1", "+144"]) == \
+        [None, None, 500000, 900000, 400000]
+
+
+def test_duplicate_prefix_keeps_lowest_cost(data_dir):
+    path = solution.data_path(write_data(
+        data_dir, "route-costs-a.txt", "+1,0.5\n+14,0.4\n+1,0.3\n+1,0.7"))
+    assert find_all(path, ["+1", "+14"]) == [300000, 400000]
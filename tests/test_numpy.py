@@ -0,0 +1,53 @@
+# ==================================================================================
+# File: tests/test_numpy.py
+#
+# Desc: Call Routing project vectorized backend tests. Numbers are encoded from
+#       their '+' and leading digits, as the other backends match them, and
+#       route prefixes too long for an int64 key are rejected by name.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import pytest
+from conftest import write_data
+
+numpy_solution = pytest.importorskip("numpy_solution")
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_encode_leading_digits():
+    numbers = ["+14155", "+12x3", "+1 2", "+", "abc", "14155", "+١٢",
+               "+1" + "2" * 30]
+    expected = [(14155, 6), (12, 3), (1, 2), (0, 0), (0, 0), (0, 0), (0, 0),
+                (int("1" + "2" * 17), 19)]
+    assert [numpy_solution.encode_number(number) for number in numbers] == \
+        expected
+    digits, lengths = numpy_solution.encode_numbers(numbers)
+    assert list(zip(digits.tolist(), lengths.tolist())) == expected
+
+
+def test_long_prefix_rejected(data_dir):
+    prefix = "+1" + "2" * 18
+    file_name = write_data(data_dir, "route-costs-long.txt",
+                           "+1,0.5\n{},0.1\n".format(prefix))
+    calls = numpy_solution.CallRoutes()
+    with pytest.raises(ValueError, match=r"\+12+ in route-costs-long.txt"):
+        calls.add_route_costs("A", file_name)
+    with pytest.raises(ValueError, match=r"\+12+ is longer"):
+        numpy_solution.VectorRouteIndex({prefix: 1})
+
+
+def test_long_delta_prefix_rejected(data_dir):
+    calls = numpy_solution.CallRoutes()
+    calls.add_route_costs("A", write_data(data_dir, "route-costs-a.txt",
+                                          "+1,0.5\n"))
+    file_name = write_data(data_dir, "delta-a.txt",
+                           "+1{},0.1\n".format("2" * 18))
+    with pytest.raises(ValueError, match="in delta-a.txt"):
+        calls.apply_route_delta("A", file_name)
+    assert calls.get_best_route("+12") == ("A", 0.5)
@@ -0,0 +1,65 @@
+# ==================================================================================
+# File: tests/test_parallel.py
+#
+# Desc: Call Routing project parallel loader tests. However a route costs file
+#       is chunked, the parallel loader must read the same routes, keeping the
+#       lowest cost of duplicates, as the sequential loader does.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import pytest
+import solution
+import parallel_loader
+from conftest import NUMBERS, write_data
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# routes with duplicates both cheaper and dearer than the first, spread so
+# that small chunks split them across chunks
+ROUTE_COSTS = ("+1,0.5\n+14,0.4\n+1415,0.2\n+44,1.1\n+1,0.45\n+4420,0.9\n"
+               "+14,0.41\n+49,2.0\n+1415,0.15\n+4420,0.95\n")
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+@pytest.mark.parametrize("chunk_size", [1, 5, 13, 40, 1 << 20])
+def test_parallel_matches_sequential(data_dir, chunk_size):
+    file_name = write_data(data_dir, "route-costs-a.txt", ROUTE_COSTS)
+    path = solution.data_path(file_name)
+    ranges = parallel_loader.chunk_ranges(path, chunk_size)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(ROUTE_COSTS)
+    assert all(end == start for (_, end), (start, _)
+               in zip(ranges, ranges[1:]))
+
+    results = parallel_loader.read_route_costs_parallel(
+        [("A", file_name)], workers=2, chunk_size=chunk_size)
+    expected = solution.CallRoutes()._read_route_costs(file_name)
+    assert results["A"] == expected
+    assert results["A"]["+1415"] == 150000
+
+
+def test_parallel_load_matches_sequential(carrier_route_costs):
+    calls = solution.CallRoutes()
+    calls.add_route_costs_parallel(carrier_route_costs, workers=2)
+    expected = solution.CallRoutes()
+    for carrier, file_name in carrier_route_costs:
+        expected.add_route_costs(carrier, file_name)
+    assert calls.lookup_many(NUMBERS) == expected.lookup_many(NUMBERS)
+
+
+def test_blank_line_rejected_like_sequential(data_dir):
+    file_name = write_data(data_dir, "route-costs-a.txt",
+                           "+1,0.5\n\n+14,0.4\n")
+    with pytest.raises(IndexError):
+        solution.CallRoutes()._read_route_costs(file_name)
+    with pytest.raises(IndexError):
+        parallel_loader.read_route_costs_parallel([("A", file_name)],
+                                                  workers=1)
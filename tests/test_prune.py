@@ -0,0 +1,90 @@
+# ==================================================================================
+# File: tests/test_prune.py
+#
+# Desc: Call Routing project redundant route pruning tests. Pruning must drop
+#       exactly the routes that cost the same as their nearest matchable
+#       ancestor and leave every backend's answers unchanged.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import pytest
+import solution
+import callroute
+import snapshot_solution
+from route_prune import redundant_prefixes, prune_redundant
+from conftest import NUMBERS, write_data
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# a deck whose redundant routes are A's +14 (as +1), +1415 (as +141) and
+# +23 (as +2), and B's +141 (as +1) and +4420 (as +44). A's +14155 differs
+# from +1415, which it still falls through to, and A's +2 is not redundant
+# as '+' is too short to ever match
+ROUTE_COSTS = {
+    "A": "+1,0.5\n+14,0.5\n+141,0.4\n+1415,0.4\n+14155,0.5\n+,0.3\n+2,0.3\n"
+         "+23,0.3\n",
+    "B": "+1,0.45\n+141,0.45\n+4420,0.95\n+44,0.95\n",
+}
+
+# numbers covering every route of the deck and the fixture's numbers
+PRUNE_NUMBERS = NUMBERS + ["+14", "+1410", "+14150", "+141550", "+2",
+                           "+230", "+44201"]
+
+# backends open_routes can prune
+PRUNING_BACKENDS = [backend for backend in callroute.BACKENDS
+                    if backend not in ("mmap", "sqlite", "lazy")]
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_redundant_prefixes():
+    costs = {"+1": 5, "+14": 5, "+141": 4, "+1415": 4, "+14155": 5,
+             "+": 3, "+2": 3, "+23": 3}
+    assert sorted(redundant_prefixes(costs)) == ["+14", "+1415", "+23"]
+    assert prune_redundant(costs) == 3
+    assert sorted(costs) == ["+", "+1", "+141", "+14155", "+2"]
+
+
+@pytest.fixture
+def prune_route_costs(data_dir):
+    """Write the pruning deck's route costs files and return a list of
+    ('carrier name', 'file name') tuples."""
+    return [(carrier, write_data(data_dir, "route-costs-{}.txt".format(
+        carrier.lower()), text)) for carrier, text in ROUTE_COSTS.items()]
+
+
+@pytest.mark.parametrize("backend", PRUNING_BACKENDS)
+def test_pruned_open_routes_unchanged(prune_route_costs, backend):
+    expected = callroute.open_routes(prune_route_costs, "dict")
+    calls = callroute.open_routes(prune_route_costs, backend, prune=True)
+    for number in PRUNE_NUMBERS:
+        assert calls.get_best_route(number) == \
+            expected.get_best_route(number), number
+    assert calls.lookup_many(PRUNE_NUMBERS) == \
+        expected.lookup_many(PRUNE_NUMBERS)
+
+
+def test_pruned_counts(prune_route_costs):
+    calls = solution.CallRoutes()
+    calls.enable_pruning()
+    for carrier, file_name in prune_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    assert calls.get_pruned() == {"carriers": {"A": 3, "B": 2}, "total": 5}
+    assert len(calls.routes["A"]) == 5
+
+    assert snapshot_solution.compile_snapshot(
+        "routes.snap", *prune_route_costs, prune=True) == (7, 5)
+
+
+@pytest.mark.parametrize("backend", ["mmap", "sqlite", "lazy"])
+def test_backends_without_pruning_reject_it(prune_route_costs, backend):
+    with pytest.raises(ValueError):
+        callroute.open_routes(prune_route_costs, backend, prune=True)
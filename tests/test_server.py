@@ -0,0 +1,69 @@
+# ==================================================================================
+# File: tests/test_server.py
+#
+# Desc: Call Routing project lookup service tests. A failed request must be
+#       answered with an error line and must not stop the connection serving.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import asyncio
+import solution
+import server
+
+
+# ----------------------------------------------------------------------------------
+# Helper Functions
+# ----------------------------------------------------------------------------------
+def exchange(calls, lines):
+    """Serve calls, send lines over one connection and return the lines
+    answered."""
+
+    async def run():
+        routes = server.RouteServer(calls)
+        listener = await routes.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"".join(line + b"\n" for line in lines))
+        answers = [await asyncio.wait_for(reader.readline(), 5)
+                   for _ in lines]
+        writer.close()
+        await routes.close(listener)
+        return [answer.decode().rstrip("\n") for answer in answers]
+
+    return asyncio.run(run())
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_lookup(carrier_route_costs):
+    calls = solution.CallRoutes()
+    for carrier, file_name in carrier_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    assert exchange(calls, [b"+14155550000 +9999"]) == \
+        ["+14155550000,0.2 +9999,0"]
+
+
+def test_undecodable_request_is_answered(carrier_route_costs):
+    calls = solution.CallRoutes()
+    for carrier, file_name in carrier_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    answers = exchange(calls, [b"\xff\xfe", b"+4930"])
+    assert answers[0] == "��,0"
+    assert answers[1] == "+4930,2.0"
+
+
+def test_failed_lookup_keeps_connection_serving():
+    class Failing(solution.CallRoutes):
+        def lookup_many(self, numbers):
+            if "+0" in numbers:
+                raise ValueError("bad\nbatch")
+            return solution.CallRoutes.lookup_many(self, numbers)
+
+    answers = exchange(Failing(), [b"+0", b"STATS"])
+    assert answers[0] == "ERROR bad batch"
+    assert answers[1].startswith("{")
@@ -0,0 +1,43 @@
+# ==================================================================================
+# File: tests/test_snapshot.py
+#
+# Desc: Call Routing project binary snapshot tests.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import snapshot_solution
+from conftest import write_data
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_snapshot_matches_loaded_routes(carrier_route_costs):
+    snapshot_solution.compile_snapshot("routes.snap", *carrier_route_costs)
+    calls = snapshot_solution.CallRoutes("routes.snap")
+    assert calls.get_costs("+14155550000") == [("A", 0.2), ("B", 0.3)]
+    assert calls.get_costs("+9999") == 0
+    assert calls.get_best_route("+4930") == ("B", 2.0)
+
+
+def test_snapshot_holds_large_costs(data_dir):
+    write_data(data_dir, "a.txt", "+44,3000.5\n+4420,9000000.25\n")
+    snapshot_solution.compile_snapshot("routes.snap", ("A", "a.txt"))
+    calls = snapshot_solution.CallRoutes("routes.snap")
+    assert calls.get_costs("+4410") == [("A", 3000.5)]
+    assert calls.lookup_many(["+4420"]) == [("+4420", 9000000.25)]
+
+
+def test_stale_snapshot_version_is_compiled_again(carrier_route_costs,
+                                                  monkeypatch):
+    snapshot_solution.ensure_snapshot("routes.snap", *carrier_route_costs)
+    assert snapshot_solution.ensure_snapshot(
+        "routes.snap", *carrier_route_costs) is None
+    monkeypatch.setattr(snapshot_solution, "VERSION",
+                        snapshot_solution.VERSION + 1)
+    assert snapshot_solution.ensure_snapshot(
+        "routes.snap", *carrier_route_costs) is not None
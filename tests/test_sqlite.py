@@ -0,0 +1,51 @@
+# ==================================================================================
+# File: tests/test_sqlite.py
+#
+# Desc: Call Routing project sqlite solution tests.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import os
+import sqlite3
+import sqlite_solution
+from conftest import NUMBERS
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_get_costs(carrier_route_costs):
+    calls = sqlite_solution.CallRoutes(None, *carrier_route_costs,
+                                       db_file_name="routes.db")
+    assert calls.get_costs("+14155550000") == [("A", "+1415", 0.2),
+                                               ("B", "+141", 0.3)]
+    assert calls.get_costs("+9999") == 0
+    assert calls.get_best_route("+9999") == 0
+    assert calls.get_best_route("+4930") == ("B", 2.0)
+
+
+def test_lookup_many_matches_get_costs(carrier_route_costs):
+    calls = sqlite_solution.CallRoutes(None, *carrier_route_costs,
+                                       db_file_name="routes.db")
+    expected = []
+    for number in NUMBERS:
+        costs = calls.get_costs(number)
+        expected.append((number, costs[0][2] if costs else 0))
+    assert calls.lookup_many(NUMBERS) == expected
+    assert calls.lookup_many(["+"]) == [("+", 0)]
+
+
+def test_old_schema_is_dropped(carrier_route_costs, data_dir):
+    conn = sqlite3.connect(os.path.join(str(data_dir), "routes.db"))
+    conn.execute("CREATE TABLE costs (carrier, prefix, cost)")
+    conn.commit()
+    conn.close()
+    calls = sqlite_solution.CallRoutes(None, *carrier_route_costs,
+                                       db_file_name="routes.db")
+    cur = calls.pool.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    assert sorted(row[0] for row in cur.fetchall()) == ["carriers", "routes"]
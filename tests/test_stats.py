@@ -0,0 +1,63 @@
+# ==================================================================================
+# File: tests/test_stats.py
+#
+# Desc: Call Routing project hot path instrumentation tests.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import threading
+import solution
+from route_stats import RouteStats, escape_label
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_escape_label():
+    assert escape_label('a\\b"c\nd') == 'a\\\\b\\"c\\nd'
+
+
+def test_prometheus_escapes_carrier_names():
+    stats = RouteStats()
+    stats.record_load('new\n"line"', 10, 0.5)
+    text = stats.to_prometheus()
+    assert 'callroute_routes_loaded_total{carrier="new\\n\\"line\\""} 10' \
+        in text.splitlines()
+
+
+def test_index_cache_stats_exported(carrier_route_costs):
+    for _ in range(2):
+        calls = solution.CallRoutes()
+        calls.enable_index_cache()
+        calls.enable_stats()
+        for carrier, file_name in carrier_route_costs:
+            calls.add_route_costs(carrier, file_name)
+    assert calls.get_stats()["index_cache"] == \
+        {"entries": 2, "hits": 2, "misses": 0}
+    lines = calls.get_stats_prometheus().splitlines()
+    assert "callroute_index_cache_hits_total 2" in lines
+    assert "callroute_index_cache_misses_total 0" in lines
+
+
+def test_counters_from_concurrent_lookups(carrier_route_costs):
+    calls = solution.CallRoutes()
+    for carrier, file_name in carrier_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    calls.enable_stats()
+
+    def lookups():
+        for _ in range(2000):
+            calls.get_costs("+14155550000")
+
+    threads = [threading.Thread(target=lookups) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = calls.get_stats()
+    assert stats["lookups"] == 8000
+    assert stats["carrier_latency"]["A"]["lookups"] == 8000
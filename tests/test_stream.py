@@ -0,0 +1,101 @@
+# ==================================================================================
+# File: tests/test_stream.py
+#
+# Desc: Call Routing project streaming bulk lookup tests. A resumed run must
+#       write exactly what an uninterrupted run does.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+import os
+import pytest
+import solution
+import stream_lookup
+from conftest import write_data
+
+
+# ----------------------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------------------
+@pytest.fixture
+def calls(carrier_route_costs):
+    """Return a dict backend loaded with the fixture's carriers."""
+    calls = solution.CallRoutes()
+    for carrier, file_name in carrier_route_costs:
+        calls.add_route_costs(carrier, file_name)
+    return calls
+
+
+@pytest.fixture
+def numbers_file_name(data_dir):
+    """Write a phone numbers file of 100 numbers and return its path."""
+    write_data(data_dir, "numbers.txt", "".join(
+        "+14{}\n+44{}\n".format(index, index) for index in range(50)))
+    return solution.data_path("numbers.txt")
+
+
+class Interrupt(Exception):
+    pass
+
+
+class Interrupted(object):
+    """Wraps calls, raising Interrupt from the chunk after the first
+    chunks."""
+
+    def __init__(self, calls, chunks):
+        self.calls = calls
+        self.chunks = chunks
+
+    def lookup_many(self, numbers):
+        if not self.chunks:
+            raise Interrupt()
+        self.chunks -= 1
+        return self.calls.lookup_many(numbers)
+
+
+def read(file_name):
+    with open(file_name) as f:
+        return f.read()
+
+
+# ----------------------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------------------
+def test_resume_after_interrupt(calls, numbers_file_name, tmp_path):
+    expected = str(tmp_path / "expected.txt")
+    out = str(tmp_path / "out.txt")
+    checkpoint = str(tmp_path / "out.ckpt")
+    assert stream_lookup.stream_to_file(calls, numbers_file_name, expected,
+                                        chunk_size=7) == 100
+    with pytest.raises(Interrupt):
+        stream_lookup.stream_to_file(Interrupted(calls, 3), numbers_file_name,
+                                     out, checkpoint, chunk_size=7)
+    assert stream_lookup.read_checkpoint(checkpoint)[1] == \
+        os.path.getsize(out)
+    assert stream_lookup.stream_to_file(calls, numbers_file_name, out,
+                                        checkpoint, chunk_size=7) == 79
+    assert read(out) == read(expected)
+    assert not os.path.exists(checkpoint)
+
+
+@pytest.mark.parametrize("damage", ["remove", "truncate"])
+def test_resume_without_output_starts_over(calls, numbers_file_name,
+                                           tmp_path, damage):
+    expected = str(tmp_path / "expected.txt")
+    out = str(tmp_path / "out.txt")
+    checkpoint = str(tmp_path / "out.ckpt")
+    stream_lookup.stream_to_file(calls, numbers_file_name, expected)
+    with pytest.raises(Interrupt):
+        stream_lookup.stream_to_file(Interrupted(calls, 2), numbers_file_name,
+                                     out, checkpoint, chunk_size=7)
+    if damage == "remove":
+        os.remove(out)
+    else:
+        with open(out, 'r+b') as f:
+            f.truncate(5)
+    assert stream_lookup.stream_to_file(calls, numbers_file_name, out,
+                                        checkpoint, chunk_size=7) == 100
+    assert read(out) == read(expected)
@@ -0,0 +1,702 @@
+# ==================================================================================
+# File: trie_solution.py
+#
+# Desc: Call Routing Project digit trie solution file. Route prefixes are stored
+#       in a compact trie backed by flat arrays instead of a dictionary of
+#       strings, so memory per route is a handful of machine words and a single
+#       walk down the trie finds the longest matching prefix without slicing
+#       the phone number once per length.
+#
+# Copyright © 2019 Edwin Cloud and Asim Zaidi. All rights reserved.
+# ==================================================================================
+
+# ----------------------------------------------------------------------------------
+# Imports
+# ----------------------------------------------------------------------------------
+from array import array
+import solution
+from prefix_filter import MIN_PREFIX_LENGTH
+
+
+# ----------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------
+
+# symbols that may appear in a normalized phone number or route prefix, in
+# sorted order so that a depth first walk yields prefixes in sorted order
+SYMBOLS = "+0123456789"
+
+# map of symbol to child slot
+SYMBOL_INDEX = {symbol: index for index, symbol in enumerate(SYMBOLS)}
+
+# number of child slots per trie node
+FANOUT = len(SYMBOLS)
+
+# cost stored for nodes that do not terminate a route
+NO_COST = -1
+
+
+# ----------------------------------------------------------------------------------
+# RouteTrie (Class)
+# ----------------------------------------------------------------------------------
+class RouteTrie(object):
+
+    # ------------------------------------------------------------------------------
+    # RouteTrie - Constructor
+    # ------------------------------------------------------------------------------
+
+    def __init__(self):
+        """Create a new, empty RouteTrie. Node 0 is the root.
+        Runtime: Θ(1) Space: Θ(1)."""
+
+        # children holds FANOUT child node ids per node, 0 meaning no child
+        # (the root can never be a child, so 0 is a safe sentinel)
+        self._children = array('i', bytes(4 * FANOUT))
+
+        # costs holds the route cost of each node in micro-dollars,
+        # or NO_COST
+        self._costs = array('l', [NO_COST])
+
+        # number of routes stored in the trie
+        self._size = 0
+
+    # ------------------------------------------------------------------------------
+    # RouteTrie - Intended Private Methods
+    # ------------------------------------------------------------------------------
+
+    def _new_node(self):
+        """Allocate a new node and return its id.
+        Runtime: Θ(1) amortized Space: Θ(1)."""
+        self._children.extend(_EMPTY_BLOCK)
+        self._costs.append(NO_COST)
+        return len(self._costs) - 1
+
+    def _node(self, prefix):
+        """Return the node for prefix, or 0 if there is none.
+        Runtime: Θ(k) Space: Θ(1)."""
+        children = self._children
+        node = 0
+        for symbol in prefix:
+            node = children[node * FANOUT + SYMBOL_INDEX[symbol]]
+            if not node:
+                return 0
+        return node
+
+    # ------------------------------------------------------------------------------
+    # RouteTrie - Public Methods
+    # ------------------------------------------------------------------------------
+
+    def insert(self, prefix, cost, replace=False):
+        """Insert a route, keeping the lowest cost if prefix is already
+        present, or the new cost if replace is True. Return True if prefix
+        was not present before.
+        Runtime: Θ(k) Space: Θ(k).
+        Where k is the length of prefix."""
+        children = self._children
+        node = 0
+        for symbol in prefix:
+            slot = node * FANOUT + SYMBOL_INDEX[symbol]
+            child = children[slot]
+            if not child:
+                child = self._new_node()
+                children[slot] = child
+            node = child
+
+        current = self._costs[node]
+        if current == NO_COST:
+            self._costs[node] = cost
+            self._size += 1
+            return True
+        if replace or cost < current:
+            self._costs[node] = cost
+        return False
+
+    def remove(self, prefix):
+        """Remove a route. Its nodes are kept, as they may lead to other
+        routes. Return True if prefix was present.
+        Runtime: Θ(k) Space: Θ(1)."""
+        children = self._children
+        node = 0
+        for symbol in prefix:
+            node = children[node * FANOUT + SYMBOL_INDEX[symbol]]
+            if not node:
+                return False
+        if self._costs[node] == NO_COST:
+            return False
+        self._costs[node] = NO_COST
+        self._size -= 1
+        return True
+
+    def copy(self):
+        """Return an independent copy of the trie.
+        Runtime: Θ(n) Space: Θ(n)."""
+        results = RouteTrie()
+        results._children = array('i', self._children)
+        results._costs = array('l', self._costs)
+        results._size = self._size
+        return results
+
+    def longest_match(self, number):
+        """Return the cost in micro-dollars of the longest route prefix of
+        number, or None if no route matches. As in every backend, prefixes
+        shorter than MIN_PREFIX_LENGTH never match.
+        Runtime: Θ(k) Space: Θ(1).
+        Where k is the length of number."""
+        children = self._children
+        costs = self._costs
+        node = 0
+        best = None
+        for depth, symbol in enumerate(number, 1):
+            symbol = SYMBOL_INDEX.get(symbol)
+            if symbol is None:
+                break
+            node = children[node * FANOUT + symbol]
+            if not node:
+                break
+            if costs[node] != NO_COST and depth >= MIN_PREFIX_LENGTH:
+                best = costs[node]
+        return best
+
+    def longest_route(self, number):
+        """Return a tuple of the length of the longest route prefix of
+        number and its cost in micro-dollars, or None if no route matches,
+        see longest_match.
+        Runtime: Θ(k) Space: Θ(1)."""
+        children = self._children
+        costs = self._costs
+        node = 0
+        best = None
+        for depth, symbol in enumerate(number, 1):
+            symbol = SYMBOL_INDEX.get(symbol)
+            if symbol is None:
+                break
+            node = children[node * FANOUT + symbol]
+            if not node:
+                break
+            if costs[node] != NO_COST and depth >= MIN_PREFIX_LENGTH:
+                best = (depth, costs[node])
+        return best
+
+    def items(self):
+        """Yield (prefix, cost) for every route in sorted prefix order.
+        Runtime: Θ(n) Space: Θ(k)."""
+        children = self._children
+        costs = self._costs
+        stack = [(0, "")]
+        while stack:
+            node, prefix = stack.pop()
+            if costs[node] != NO_COST:
+                yield prefix, costs[node]
+            base = node * FANOUT
+            # push in reverse so the smallest symbol is popped first
+            for symbol in range(FANOUT - 1, -1, -1):
+                child = children[base + symbol]
+                if child:
+                    stack.append((child, prefix + SYMBOLS[symbol]))
+
+    def __len__(self):
+        """Return the number of routes stored in the trie.
+        Runtime: Θ(1) Space: Θ(1)."""
+        return self._size
+
+    # ------------------------------------------------------------------------------
+    # RouteTrie - Public Properties
+    # ------------------------------------------------------------------------------
+
+    @property
+    def nodes(self):
+        """Returns the number of allocated trie nodes.
+        Runtime: Θ(1) Space: Θ(1)."""
+        return len(self._costs)
+
+    @property
+    def nbytes(self):
+        """Returns the number of bytes held by the trie arrays.
+        Runtime: Θ(1) Space: Θ(1)."""
+        return (self._children.itemsize * len(self._children) +
+                self._costs.itemsize * len(self._costs))
+
+
+# a block of FANOUT empty child slots, used to allocate new nodes
+_EMPTY_BLOCK = array('i', bytes(4 * FANOUT))
+
+
+# ----------------------------------------------------------------------------------
+# MergedRouteTrie (Class)
+# ----------------------------------------------------------------------------------
+class MergedRouteTrie(RouteTrie):
+    """A single trie over the routes of every carrier. Each node that ends a
+    route for any carrier stores the cheapest (carrier, cost) among every
+    carrier's longest match at that node, so one walk answers least cost
+    routing for all carriers at once. With max_k set, each such node also
+    stores its max_k cheapest carriers in rank order, so failover lists are
+    read straight from the index. With prune set, nodes whose cheapest
+    route is the same as at their nearest route ancestor are dropped from
+    this least cost view, as a walk ending at the ancestor answers the
+    same."""
+
+    # ------------------------------------------------------------------------------
+    # MergedRouteTrie - Constructor
+    # ------------------------------------------------------------------------------
+
+    def __init__(self, carrier_tries, max_k=0, prune=False):
+        """Create a new MergedRouteTrie from a dictionary mapping carrier
+        names to their RouteTrie, ranking up to max_k carriers per node.
+        prune drops redundant nodes, and is ignored if max_k is set, as
+        rankings also report each carrier's matched prefix.
+        Runtime: Θ(nk + nc log c) Space: Θ(nk + n max_k).
+        Where n is the total number of routes across all carriers."""
+        RouteTrie.__init__(self)
+
+        # carrier names indexed by carrier id
+        self.carriers = list(carrier_tries)
+
+        # carrier id of the cheapest route at each node
+        self._carriers = array('h', [-1])
+
+        # rank block of each node that ends a route, and max_k ranked
+        # carrier ids, costs and matched prefix lengths per block,
+        # padded with carrier id -1
+        self.max_k = max_k
+        self._ranks = array('i')
+        self._rank_carriers = array('h')
+        self._rank_costs = array('l')
+        self._rank_lengths = array('B')
+
+        # number of redundant nodes dropped from the least cost view
+        self.prune = prune and not max_k
+        self.pruned = 0
+
+        # per carrier costs at each node, only needed while building.
+        # Routes too short to ever match are left out
+        node_costs = {}
+        for carrier_id, carrier in enumerate(self.carriers):
+            for prefix, cost in carrier_tries[carrier].items():
+                if len(prefix) < MIN_PREFIX_LENGTH:
+                    continue
+                node = self._insert_node(prefix)
+                node_costs.setdefault(node, []).append((carrier_id, cost))
+
+        self._finalize(node_costs)
+
+    # ------------------------------------------------------------------------------
+    # MergedRouteTrie - Intended Private Methods
+    # ------------------------------------------------------------------------------
+
+    def _new_node(self):
+        """Allocate a new node and return its id.
+        Runtime: Θ(1) amortized Space: Θ(1)."""
+        self._carriers.append(-1)
+        return RouteTrie._new_node(self)
+
+    def _insert_node(self, prefix):
+        """Return the node for prefix, allocating nodes as needed.
+        Runtime: Θ(k) Space: Θ(k)."""
+        children = self._children
+        node = 0
+        for symbol in prefix:
+            slot = node * FANOUT + SYMBOL_INDEX[symbol]
+            child = children[slot]
+            if not child:
+                child = self._new_node()
+                children[slot] = child
+            node = child
+        return node
+
+    def _finalize(self, node_costs):
+        """Walk the trie carrying each carrier's longest match so far and
+        store the cheapest routes at every node that ends a route, see
+        _store.
+        Runtime: Θ(nc log c) Space: Θ(kc).
+        Where c is the number of carriers."""
+        children = self._children
+        if self.max_k:
+            self._ranks = array('i', [-1]) * len(self._costs)
+        # (node, depth, each carrier's longest match so far, cheapest
+        # (cost, carrier id) at the nearest route ancestor)
+        stack = [(0, 0, (None,) * len(self.carriers), None)]
+        while stack:
+            node, depth, inherited, above = stack.pop()
+            if node in node_costs:
+                inherited, above = self._store(node, depth, inherited, above,
+                                               node_costs[node])
+            base = node * FANOUT
+            for symbol in range(FANOUT):
+                child = children[base + symbol]
+                if child:
+                    stack.append((child, depth + 1, inherited, above))
+
+    def _store(self, node, depth, inherited, above, routes):
+        """Store the cheapest route, and the max_k cheapest ranked, at a
+        node where routes, a list of (carrier id, cost), end, unless
+        pruning and it matches above, the cheapest route of the nearest
+        such ancestor. Return the (inherited, above) of the node's
+        children.
+        Runtime: Θ(c log c) Space: Θ(c)."""
+        inherited = list(inherited)
+        for carrier_id, cost in routes:
+            inherited[carrier_id] = (cost, depth)
+        # (cost, carrier id, prefix length), ties go to the carrier
+        # added first
+        ranked = sorted((match[0], carrier_id, match[1])
+                        for carrier_id, match in enumerate(inherited)
+                        if match is not None)
+        if self.prune and ranked[0][:2] == above:
+            self.pruned += 1
+        else:
+            above = ranked[0][:2]
+            self._costs[node], self._carriers[node] = above
+            self._size += 1
+        max_k = self.max_k
+        if max_k:
+            self._ranks[node] = len(self._rank_costs) // max_k
+            padding = [(NO_COST, -1, 0)] * max_k
+            for cost, carrier_id, length in (ranked + padding)[:max_k]:
+                self._rank_carriers.append(carrier_id)
+                self._rank_costs.append(cost)
+                self._rank_lengths.append(length)
+        return inherited, above
+
+    def _patch_subtree(self, node, prefix, tries, target, previous,
+                       changed):
+        """Store the routes again at node, prefix's node, and below it
+        down to the nodes where the changed carrier, the one with id
+        target, has a route of its own, from tries, every carrier's
+        RouteTrie in carrier id order. previous is the changed carrier's
+        RouteTrie before the change, and changed the nodes of every
+        changed prefix, which are left to their own patch. Below a route
+        of the changed carrier every carrier's longest match, and the
+        cheapest at the nearest route ancestor, are what they were
+        before, so nothing there changes.
+        Runtime: Θ(sc log c) Space: Θ(kc).
+        Where s is the number of nodes patched."""
+        children = self._children
+        costs = self._costs
+
+        # each carrier's longest match above prefix, and the cheapest of
+        # them, is what the walk from the root would carry to prefix
+        inherited = []
+        for trie in tries:
+            match = trie.longest_route(prefix[:-1])
+            inherited.append(None if match is None else (match[1], match[0]))
+        matches = [(match[0], carrier_id)
+                   for carrier_id, match in enumerate(inherited)
+                   if match is not None]
+        above = min(matches) if matches else None
+
+        # as in _finalize, also carrying each carrier's node, and the
+        # changed carrier's node before the change, 0 once off its trie
+        stack = [(node, len(prefix), inherited, above,
+                  [trie._node(prefix) for trie in tries],
+                  previous._node(prefix))]
+        while stack:
+            node, depth, inherited, above, nodes, before = stack.pop()
+            routes = [(carrier_id, trie._costs[at]) for carrier_id, (trie, at)
+                      in enumerate(zip(tries, nodes))
+                      if at and trie._costs[at] != NO_COST]
+
+            # take back what the node held before the change
+            if costs[node] != NO_COST:
+                self._size -= 1
+            elif self.prune and (before and previous._costs[before] !=
+                                 NO_COST or any(carrier_id != target
+                                                for carrier_id, _ in routes)):
+                self.pruned -= 1
+            costs[node] = NO_COST
+            self._carriers[node] = -1
+            if self.max_k:
+                self._ranks[node] = -1
+
+            if routes:
+                inherited, above = self._store(node, depth, inherited, above,
+                                               routes)
+                if depth > len(prefix) and any(carrier_id == target
+                                               for carrier_id, _ in routes):
+                    continue
+            base = node * FANOUT
+            for symbol in range(FANOUT):
+                child = children[base + symbol]
+                if child and child not in changed:
+                    stack.append((
+                        child, depth + 1, inherited, above,
+                        [trie._children[at * FANOUT + symbol] if at else 0
+                         for trie, at in zip(tries, nodes)],
+                        previous._children[before * FANOUT + symbol]
+                        if before else 0))
+
+    def _deepest_route(self, number):
+        """Return the deepest node on number's path that ends a route for
+        any carrier, or 0 if there is none. Every carrier's longest match
+        for number ends at or above it.
+        Runtime: Θ(k) Space: Θ(1)."""
+        children = self._children
+        costs = self._costs
+        node = 0
+        best = 0
+        for symbol in number:
+            symbol = SYMBOL_INDEX.get(symbol)
+            if symbol is None:
+                break
+            node = children[node * FANOUT + symbol]
+            if not node:
+                break
+            if costs[node] != NO_COST:
+                best = node
+        return best
+
+    # ------------------------------------------------------------------------------
+    # MergedRouteTrie - Public Methods
+    # ------------------------------------------------------------------------------
+
+    def patched(self, carrier_tries, carrier, previous, changes):
+        """Return a copy of the index with changes, a dictionary of a
+        carrier's changed prefixes, applied. carrier_tries maps every
+        carrier name to its RouteTrie after the change, in the order the
+        index was built from, and previous is the changed carrier's
+        RouteTrie before it. Only the nodes whose longest match for the
+        carrier is a changed prefix are walked again, see _patch_subtree,
+        rather than every route of every carrier. Rank blocks of patched
+        nodes are appended, the blocks they replace are left unused until
+        the index is next built in full.
+        Runtime: Θ(n + sc log c) Space: Θ(n).
+        Where s is the number of nodes patched."""
+        results = MergedRouteTrie.__new__(MergedRouteTrie)
+        results.__dict__.update(self.__dict__)
+        for name in ("_children", "_costs", "_carriers", "_ranks",
+                     "_rank_carriers", "_rank_costs", "_rank_lengths"):
+            setattr(results, name, getattr(self, name)[:])
+
+        # allocate nodes for added routes
+        for prefix, cost in changes.items():
+            if cost is not None and len(prefix) >= MIN_PREFIX_LENGTH:
+                results._insert_node(prefix)
+        if self.max_k:
+            results._ranks.extend(array('i', [-1]) * (
+                len(results._costs) - len(results._ranks)))
+
+        # patch below each changed prefix with a node, as a removed
+        # route that was never there has none
+        tries = [carrier_tries[name] for name in self.carriers]
+        target = self.carriers.index(carrier)
+        changed = {}
+        for prefix in changes:
+            if len(prefix) >= MIN_PREFIX_LENGTH:
+                node = results._node(prefix)
+                if node:
+                    changed[node] = prefix
+        for node, prefix in changed.items():
+            results._patch_subtree(node, prefix, tries, target, previous,
+                                   changed)
+        return results
+
+    def best_match(self, number):
+        """Return (carrier, cost in dollars) of the least cost route for
+        number, or None if no carrier has a route for it.
+        Runtime: Θ(k) Space: Θ(1)."""
+        best = self._deepest_route(number)
+        if not best:
+            return None
+        return self.carriers[self._carriers[best]], \
+            solution.cost_dollars(self._costs[best])
+
+    def top_routes(self, number, k):
+        """Return up to k (carrier, cost in dollars, prefix) tuples for
+        number, cheapest first, read from the ranks stored at build time.
+        k may not exceed max_k.
+        Runtime: Θ(k) Space: Θ(k)."""
+        if k > self.max_k:
+            raise ValueError("ranked up to {} carriers, asked for {}".format(
+                self.max_k, k))
+        best = self._deepest_route(number)
+        results = []
+        if not best:
+            return results
+        start = self._ranks[best] * self.max_k
+        for index in range(start, start + k):
+            carrier_id = self._rank_carriers[index]
+            if carrier_id == -1:
+                break
+            results.append((self.carriers[carrier_id],
+                            solution.cost_dollars(self._rank_costs[index]),
+                            number[:self._rank_lengths[index]]))
+        return results
+
+
+# ----------------------------------------------------------------------------------
+# CallRoutes (Class)
+# ----------------------------------------------------------------------------------
+class CallRoutes(solution.CallRoutes):
+    """CallRoutes that stores each carrier's routes in a RouteTrie and
+    answers least cost routing from a MergedRouteTrie over all carriers."""
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Constructor
+    # ------------------------------------------------------------------------------
+
+    def __init__(self):
+        """Create a new CallRoutes instance.
+        Runtime: Θ(1) Space: Θ(1)."""
+        solution.CallRoutes.__init__(self)
+
+        # merged index over all carriers, built on first use
+        self.merged = None
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Intended Private Methods
+    # ------------------------------------------------------------------------------
+
+    def _read_route_costs(self, file_name):
+        """Read route costs file into a RouteTrie and return the result.
+        Runtime: Θ(nk) Space: Θ(nk)"""
+
+        # create a results trie
+        results = RouteTrie()
+
+        # open the specified file
+        with open(solution.data_path(file_name)) as route_costs_file:
+
+            # iterate over each line in the open file
+            for line in route_costs_file:
+                # strip the line of \n characters and split
+                # the line by commas into a list
+                row = line.strip().split(',')
+                # insert the route, keeping the lower price of a
+                # duplicate route
+                results.insert(row[0], solution.parse_cost(row[1]))
+
+        # return the results trie
+        return results
+
+    def _build_index(self, costs_dict):
+        """Return a RouteTrie built from a dictionary of prefix to cost.
+        Runtime: Θ(nk) Space: Θ(nk)"""
+        results = RouteTrie()
+        for prefix, cost in costs_dict.items():
+            results.insert(prefix, cost)
+        return results
+
+    def _apply_delta(self, costs_trie, changes):
+        """Return a copy of costs_trie with changes applied. Copying the
+        flat arrays is far cheaper than re-reading the carrier's file.
+        Runtime: Θ(n + dk) Space: Θ(n)"""
+        results = costs_trie.copy()
+        for prefix, cost in changes.items():
+            if cost is None:
+                results.remove(prefix)
+            else:
+                results.insert(prefix, cost, replace=True)
+        return results
+
+    def _set_route_costs(self, carrier, costs_trie, changes=None):
+        """Replace the routes of a carrier with costs_trie. If a merged
+        index is in use its replacement is made here, by the writer, and
+        lookups keep using the previous one, a consistent view of the
+        routes before the swap, until it is published. A delta's changes
+        are patched into a copy of the merged index, see
+        MergedRouteTrie.patched, while loading a carrier builds it again
+        from every carrier's routes.
+        Runtime: Θ(c), Θ(n + sc log c) to patch a merged index, or
+        Θ(nk + nc log c) to build one Space: Θ(c), or Θ(nk)."""
+        with self._write_lock:
+            merged = self.merged
+            previous = self.routes.get(carrier)
+            solution.CallRoutes._set_route_costs(self, carrier, costs_trie)
+            if merged is None:
+                return
+            if changes is not None and previous is not None:
+                self.merged = merged.patched(self.routes, carrier, previous,
+                                             changes)
+            else:
+                self.merged = MergedRouteTrie(self.routes, merged.max_k,
+                                              prune=self.prune)
+
+    def _match(self, costs_trie, number):
+        """Return the cost of the longest prefix of number in costs_trie,
+        or None if no prefix matches.
+        Runtime: Θ(k) Space: Θ(1)."""
+        return costs_trie.longest_match(number)
+
+    def _match_route(self, costs_trie, number):
+        """Return a tuple of the length of the longest prefix of number in
+        costs_trie and its cost, or None if no prefix matches.
+        Runtime: Θ(k) Space: Θ(1)."""
+        return costs_trie.longest_route(number)
+
+    def _probe(self, costs_trie, number):
+        """Return a tuple of the cost of the longest prefix of number in
+        costs_trie (or None) and None, as the trie is walked once rather
+        than probed prefix by prefix.
+        Runtime: Θ(k) Space: Θ(1)."""
+        return self._match(costs_trie, number), None
+
+    def _merged_routes(self, k=0):
+        """Return the merged index, ranking at least k carriers per node,
+        building it if there is none or it ranks fewer carriers. Builds
+        hold the write lock, so concurrent lookups build it once and a
+        reload never has its merge replaced by one of older routes.
+        Runtime: Θ(1), or Θ(nk + nc log c) to build Space: Θ(1)."""
+        merged = self.merged
+        if merged is None or merged.max_k < k:
+            with self._write_lock:
+                merged = self.merged
+                if merged is None or merged.max_k < k:
+                    merged = self.merged = MergedRouteTrie(
+                        self.routes, max(k, solution.TOP_K) if k else 0,
+                        prune=self.prune)
+        return merged
+
+    # ------------------------------------------------------------------------------
+    # CallRoutes - Public Methods
+    # ------------------------------------------------------------------------------
+
+    def get_best_route(self, number):
+        """Return (carrier, cost) of the least cost route for a number,
+        or 0 if no carrier has a route for it.
+        Runtime: Θ(k) Space: Θ(1)."""
+        best = self._merged_routes().best_match(number)
+        if best is None:
+            return 0
+        return best
+
+    def get_pruned(self):
+        """Return a dictionary of the number of redundant routes pruned
+        per carrier, in total and from the merged least cost view (None
+        until it is built), or None if pruning is not enabled.
+        Runtime: Θ(c) Space: Θ(c)."""
+        pruned = solution.CallRoutes.get_pruned(self)
+        if pruned is not None:
+            merged = self.merged
+            pruned["merged"] = merged.pruned if merged is not None and \
+                merged.prune else None
+        return pruned
+
+    def get_top_routes(self, number, k=solution.TOP_K):
+        """Return a failover list of up to k (carrier, cost, prefix) tuples
+        for a number, cheapest first, where prefix is the carrier's own
+        longest matching route. The list is empty if no carrier has a
+        route. Rankings are precomputed in the merged index, which is
+        rebuilt to rank more carriers if k exceeds what it holds.
+        Runtime: Θ(k) Space: Θ(k)."""
+        return self._merged_routes(k).top_routes(number, k)
+
+    def lookup_many(self, numbers):
+        """Return a list of (number, cost) tuples in input order, where cost
+        is the least cost over all carriers or 0 if no carrier has a route.
+        The merged index already answers every carrier in one walk, so no
+        sorting is needed, and the whole batch reads the same one.
+        Runtime: Θ(mk) Space: Θ(m)."""
+        merged = self._merged_routes()
+        results = []
+        for number in numbers:
+            best = merged.best_match(number)
+            results.append((number, best[1] if best else 0))
+        return results
+
+
+# ----------------------------------------------------------------------------------
+# Main Entry Point
+# ----------------------------------------------------------------------------------
+if __name__ == '__main__':
+
+    # create new class instance and run the main menu
+    solution.run_menu(CallRoutes())